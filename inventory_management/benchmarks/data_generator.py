@@ -0,0 +1,230 @@
+"""Generate a reproducible stock dataset: items, a warehouse tree and posted Stock Entries.
+
+    bench --site <site> execute inventory_management.benchmarks.data_generator.generate --kwargs "{'rows': 100000}"
+    bench --site <site> execute inventory_management.benchmarks.data_generator.cleanup
+
+Everything is named after ``prefix``, so a dataset can be removed again with ``cleanup``.
+Stock Entries are written as submitted documents and posted through ``make_sl_entries``
+in batches, so the ledger, bins, item totals and the documents agree as they would after
+real submits. Entries are spread over ``days`` in date order, except for a ``backdated``
+share that is posted later with an earlier date; the reposts those queue are run before
+``generate`` returns. The same arguments and ``seed`` give the same dataset.
+"""
+
+import random
+
+import frappe
+from frappe.utils import add_days, getdate, now, today
+
+from inventory_management.inventory_management.doctype.stock_repost.stock_repost import process_repost_queue
+from inventory_management.inventory_management.doctype.warehouse.warehouse import rebuild_warehouse_tree
+from inventory_management.inventory_management.master_cache import clear_items
+from inventory_management.inventory_management.stock_ledger import make_sl_entries, set_stock_qty
+from inventory_management.inventory_management.stock_projection import get_projection_key
+
+DATA_PREFIX = "_Bench Data"
+POSTING_BATCH_ROWS = 5000
+INSERT_CHUNK_SIZE = 10000
+ENTRY_TYPES = (("Receive", 0.5), ("Issue", 0.35), ("Transfer", 0.15))
+MAX_LINES = 50
+
+
+def generate(
+    rows=100000,
+    items=1000,
+    warehouse_groups=4,
+    warehouses_per_group=5,
+    days=365,
+    backdated=0.05,
+    fifo_share=0.2,
+    seed=0,
+    prefix=DATA_PREFIX,
+):
+    """Add Stock Entries until they have posted at least ``rows`` ledger rows; returns the dataset's counts."""
+    rng = random.Random(seed)
+    item_codes = make_items(items, fifo_share, prefix, rng)
+    leaves = make_warehouse_tree(warehouse_groups, warehouses_per_group, prefix)
+    frappe.db.commit()
+
+    entries, posted = [], 0
+    while posted < rows:
+        entry = make_entry(len(entries), item_codes, leaves, prefix, rng)
+        entries.append(entry)
+        posted += len(entry["stock_entry_details"]) * (2 if entry["stock_entry_type"] == "Transfer" else 1)
+
+    # dates follow the order of the entries, the backdated ones are moved to the end and back in time
+    first_day = getdate(add_days(today(), -days))
+    for idx, entry in enumerate(entries):
+        entry["posting_date"] = add_days(first_day, idx * days // len(entries))
+    in_order, late = [], []
+    for entry in entries:
+        if rng.random() < backdated:
+            entry["posting_date"] = max(add_days(entry["posting_date"], -rng.randint(1, 30)), first_day)
+            late.append(entry)
+        else:
+            in_order.append(entry)
+
+    post_entries(in_order + late)
+    process_repost_queue()
+    return {
+        "items": len(item_codes),
+        "warehouses": len(leaves),
+        "stock_entries": len(entries),
+        "backdated_entries": len(late),
+        "ledger_rows": posted,
+    }
+
+
+def make_items(items, fifo_share, prefix, rng):
+    item_groups = {method: f"{prefix} {method} Group" for method in ("Moving Average", "FIFO")}
+    for method, item_group in item_groups.items():
+        if not frappe.db.exists("Item Group", item_group):
+            frappe.get_doc({"doctype": "Item Group", "item_group": item_group, "valuation_method": method}).insert()
+
+    item_codes = [f"{prefix} Item {idx:06d}" for idx in range(items)]
+    existing = set(frappe.get_all("Item", filters={"name": ("in", item_codes)}, pluck="name"))
+    timestamp, user = now(), frappe.session.user
+    frappe.db.bulk_insert(
+        "Item",
+        fields=["name", "creation", "modified", "owner", "modified_by", "item_code", "item_name", "item_group"],
+        values=[
+            (
+                item_code, timestamp, timestamp, user, user, item_code, item_code,
+                item_groups["FIFO" if rng.random() < fifo_share else "Moving Average"],
+            )
+            for item_code in item_codes
+            if item_code not in existing
+        ],
+        chunk_size=INSERT_CHUNK_SIZE,
+    )
+    return item_codes
+
+
+def make_warehouse_tree(warehouse_groups, warehouses_per_group, prefix):
+    root = get_root_warehouse(prefix)
+    if not frappe.db.exists("Warehouse", root):
+        frappe.get_doc({"doctype": "Warehouse", "warehouse_name": root, "is_group": 1}).insert()
+
+    leaves = []
+    for group_idx in range(warehouse_groups):
+        group = f"{prefix} Group {group_idx}"
+        if not frappe.db.exists("Warehouse", group):
+            frappe.get_doc(
+                {"doctype": "Warehouse", "warehouse_name": group, "is_group": 1, "parent_warehouse": root}
+            ).insert()
+        for idx in range(warehouses_per_group):
+            warehouse = f"{prefix} Warehouse {group_idx}-{idx}"
+            if not frappe.db.exists("Warehouse", warehouse):
+                frappe.get_doc({"doctype": "Warehouse", "warehouse_name": warehouse, "parent_warehouse": group}).insert()
+            leaves.append(warehouse)
+    return leaves
+
+
+def get_root_warehouse(prefix=DATA_PREFIX):
+    return f"{prefix} Warehouses"
+
+
+def make_entry(idx, item_codes, warehouses, prefix, rng):
+    # most entries have a handful of lines and a few have many
+    lines = max(1, min(MAX_LINES, int(rng.lognormvariate(1.5, 0.8))))
+    stock_entry_type = rng.choices([name for name, _weight in ENTRY_TYPES], [weight for _name, weight in ENTRY_TYPES])[0]
+    name = f"{prefix}-STE-{idx:07d}-{rng.getrandbits(32):08x}"
+
+    details = []
+    for line in range(lines):
+        from_warehouse, to_warehouse = rng.sample(warehouses, 2)
+        details.append({
+            "name": f"{name}-{line}",
+            "item_code": rng.choice(item_codes),
+            "from_warehouse": from_warehouse if stock_entry_type != "Receive" else None,
+            "to_warehouse": to_warehouse if stock_entry_type != "Issue" else None,
+            "quantity": rng.randint(1, 20) if stock_entry_type == "Receive" else rng.randint(1, 8),
+            "item_price": rng.randint(10, 100),
+        })
+    return {
+        "doctype": "Stock Entry",
+        "name": name,
+        "stock_entry_type": stock_entry_type,
+        "stock_entry_details": details,
+    }
+
+
+def post_entries(entries):
+    batch, sl_entries = [], []
+    for entry in entries:
+        doc = frappe.get_doc(entry)
+        set_stock_qty(doc.stock_entry_details)
+        entry_rows = doc.get_sl_entries()
+        # transfer legs point at their source row within the voucher, which moves in the batch
+        for sle in entry_rows:
+            if sle.get("rate_from_row") is not None:
+                sle["rate_from_row"] += len(sl_entries)
+        sl_entries.extend(entry_rows)
+        batch.append(doc)
+
+        if len(sl_entries) >= POSTING_BATCH_ROWS:
+            post_batch(batch, sl_entries)
+            batch, sl_entries = [], []
+    post_batch(batch, sl_entries)
+
+
+def post_batch(docs, sl_entries):
+    if not docs:
+        return
+
+    timestamp, user = now(), frappe.session.user
+    common = ("creation", "modified", "owner", "modified_by", "docstatus")
+    frappe.db.bulk_insert(
+        "Stock Entry",
+        fields=["name", *common, "stock_entry_type", "posting_date", "posting_status", "total_quantity"],
+        values=[
+            (
+                doc.name, timestamp, timestamp, user, user, 1, doc.stock_entry_type, doc.posting_date,
+                "Completed", sum(item.quantity for item in doc.stock_entry_details),
+            )
+            for doc in docs
+        ],
+    )
+    frappe.db.bulk_insert(
+        "Stock Entry Details",
+        fields=[
+            "name", *common, "parent", "parenttype", "parentfield", "idx",
+            "item_code", "item_name", "quantity", "conversion_factor", "stock_qty", "item_price",
+            "from_warehouse", "to_warehouse",
+        ],
+        values=[
+            (
+                item.name, timestamp, timestamp, user, user, 1, doc.name, "Stock Entry", "stock_entry_details",
+                idx, item.item_code, item.item_code, item.quantity, item.conversion_factor, item.stock_qty,
+                item.item_price, item.from_warehouse, item.to_warehouse,
+            )
+            for doc in docs
+            for idx, item in enumerate(doc.stock_entry_details, 1)
+        ],
+        chunk_size=INSERT_CHUNK_SIZE,
+    )
+    make_sl_entries(sl_entries)
+    frappe.db.commit()
+
+
+def cleanup(prefix=DATA_PREFIX):
+    """Delete a generated dataset with its ledger, bins, reposts, snapshots and documents."""
+    item_codes = frappe.get_all("Item", filters={"name": ("like", f"{prefix} Item %")}, pluck="name")
+    for doctype in ("Stock Ledger Entry", "Bin", "Stock Repost", "Stock Closing Balance"):
+        frappe.db.delete(doctype, {"item_code": ("like", f"{prefix} Item %")})
+    for doctype, child_doctype in (
+        ("Stock Entry", "Stock Entry Details"),
+        ("Stock Reconciliation", "Stock Reconciliation Details"),
+    ):
+        frappe.db.delete(child_doctype, {"item_code": ("like", f"{prefix} Item %")})
+        frappe.db.delete(doctype, {"name": ("like", f"{prefix}-%")})
+    frappe.db.delete("Item", {"name": ("like", f"{prefix} Item %")})
+    frappe.db.delete("Item Group", {"name": ("like", f"{prefix} %")})
+    frappe.db.delete("Warehouse", {"name": ("like", f"{prefix} %")})
+
+    rebuild_warehouse_tree()
+    clear_items(item_codes)
+    for item_code in item_codes:
+        frappe.cache.delete(get_projection_key(item_code))
+    frappe.db.commit()
+    return len(item_codes)
@@ -0,0 +1,109 @@
+"""Cost of FIFO issues on bins with a long layer queue.
+
+    bench --site <site> execute inventory_management.benchmarks.fifo_valuation.run --kwargs "{'layers': 10000}"
+
+Times small issues against a queue of ``layers`` receipts in memory, against replaying
+the receipt history for every issue, and through ``make_sl_entries`` on a real bin, where
+the queue is also decoded and encoded once per posting. The posting runs in a transaction
+that is rolled back at the end.
+"""
+
+import random
+import time
+
+import frappe
+from frappe.utils import flt, today
+
+from inventory_management.inventory_management.stock_ledger import make_sl_entries
+from inventory_management.inventory_management.valuation import FifoQueue
+
+BENCH_PREFIX = "_Bench FIFO"
+
+
+def run(layers=10000, issues=1000):
+    rng = random.Random(0)
+    receipts = [(rng.randint(1, 10), flt(rng.uniform(5, 15), 2)) for _ in range(layers)]
+    issue_qtys = [rng.randint(1, 5) for _ in range(issues)]
+
+    # seconds per issue; replaying history is slow enough that a sample of the issues will do
+    replayed, posted = issue_qtys[: max(issues // 100, 1)], issue_qtys[: max(issues // 10, 1)]
+    results = {
+        "queue": time_queue(receipts, issue_qtys) / len(issue_qtys),
+        "replay": time_replay(receipts, replayed) / len(replayed),
+        "posting": time_posting(receipts, posted) / len(posted),
+    }
+    for label, seconds in results.items():
+        print(f"{label:>8}: {seconds * 1e6:10.1f} us per issue ({layers} layers)")
+    return results
+
+
+def time_queue(receipts, issue_qtys):
+    queue = FifoQueue()
+    for qty, rate in receipts:
+        queue.add(qty, rate)
+
+    start = time.perf_counter()
+    for qty in issue_qtys:
+        queue.remove(qty)
+    return time.perf_counter() - start
+
+
+def time_replay(receipts, issue_qtys):
+    # what valuing an issue costs without a stored queue: rebuild the layers from history
+    start, issued = time.perf_counter(), 0
+    for qty in issue_qtys:
+        queue = FifoQueue()
+        for receipt_qty, rate in receipts:
+            queue.add(receipt_qty, rate)
+        queue.remove(issued)
+        queue.remove(qty)
+        issued += qty
+    return time.perf_counter() - start
+
+
+def time_posting(receipts, issue_qtys):
+    item_code, warehouse = make_fixtures()
+    frappe.db.savepoint("fifo_benchmark")
+    try:
+        make_sl_entries([
+            {
+                "item_code": item_code,
+                "warehouse": warehouse,
+                "qty": qty,
+                "rate": rate,
+                "posting_date": today(),
+                "voucher_type": "Stock Entry",
+                "voucher_number": f"{BENCH_PREFIX}-RECEIPTS",
+            }
+            for qty, rate in receipts
+        ])
+
+        start = time.perf_counter()
+        for idx, qty in enumerate(issue_qtys):
+            make_sl_entries([
+                {
+                    "item_code": item_code,
+                    "warehouse": warehouse,
+                    "qty": -qty,
+                    "rate": 0,
+                    "posting_date": today(),
+                    "voucher_type": "Stock Entry",
+                    "voucher_number": f"{BENCH_PREFIX}-ISSUE-{idx}",
+                }
+            ])
+        return time.perf_counter() - start
+    finally:
+        frappe.db.rollback()
+
+
+def make_fixtures():
+    item_group, item_code, warehouse = f"{BENCH_PREFIX} Group", f"{BENCH_PREFIX} Item", f"{BENCH_PREFIX} Warehouse"
+    if not frappe.db.exists("Item Group", item_group):
+        frappe.get_doc({"doctype": "Item Group", "item_group": item_group, "valuation_method": "FIFO"}).insert()
+    if not frappe.db.exists("Item", item_code):
+        frappe.get_doc(
+            {"doctype": "Item", "item_code": item_code, "item_name": item_code, "item_group": item_group}
+        ).insert()
+    if not frappe.db.exists("Warehouse", warehouse):
+        frappe.get_doc({"doctype": "Warehouse", "warehouse_name": warehouse}).insert()
+    return item_code, warehouse
@@ -0,0 +1,100 @@
+"""Compare posting a Stock Entry row by row with posting it as one batch.
+
+    bench --site <site> execute inventory_management.benchmarks.posting.run --kwargs "{'rows': 1000}"
+
+Everything is written inside a transaction that is rolled back at the end.
+"""
+
+import time
+
+import frappe
+from frappe.utils import flt, today
+
+from inventory_management.inventory_management.stock_ledger import make_sl_entries, set_stock_qty
+
+BENCH_PREFIX = "_Bench"
+
+
+def run(rows=1000, repeat=3):
+    make_fixtures(rows)
+    frappe.db.savepoint("posting_benchmark")
+
+    try:
+        results, outputs = {}, {}
+        for label, post in (("per_row", post_per_row), ("batched", post_batched)):
+            timings = []
+            for _ in range(repeat):
+                stock_entry = make_stock_entry(rows)
+                start = time.perf_counter()
+                outputs[label] = post(stock_entry)
+                timings.append(time.perf_counter() - start)
+                frappe.db.rollback(save_point="posting_benchmark")
+            results[label] = min(timings)
+
+        if outputs["per_row"] != outputs["batched"]:
+            frappe.throw("Batched posting does not match the per-row posting results")
+
+        results["speedup"] = flt(results["per_row"] / results["batched"], 2) if results["batched"] else 0
+        print(f"{rows} lines: per-row {results['per_row']:.3f}s, batched {results['batched']:.3f}s "
+              f"({results['speedup']}x)")
+        return results
+    finally:
+        frappe.db.rollback()
+
+
+def post_per_row(stock_entry):
+    output = []
+    for item in stock_entry.stock_entry_details:
+        output.extend(make_sl_entries([stock_entry.get_sl_entry(item, "in")]))
+    return summarize(output)
+
+
+def post_batched(stock_entry):
+    return summarize(stock_entry.process_stock_entries())
+
+
+def summarize(ledger_rows):
+    return [
+        (row["item_code"], row["warehouse"], flt(row["qty_after_transaction"], 6), flt(row["valuation_rate"], 6))
+        for row in ledger_rows
+    ]
+
+
+def make_fixtures(rows):
+    for warehouse in get_warehouses():
+        if not frappe.db.exists("Warehouse", warehouse):
+            frappe.get_doc({"doctype": "Warehouse", "warehouse_name": warehouse}).insert()
+
+    for item_code in get_item_codes(rows):
+        if not frappe.db.exists("Item", item_code):
+            frappe.get_doc({"doctype": "Item", "item_code": item_code, "item_name": item_code}).insert()
+
+
+def make_stock_entry(rows):
+    # every (item, warehouse) pair shows up twice so both the insert and the update paths run
+    item_codes, warehouses = get_item_codes(rows), get_warehouses()
+    stock_entry = frappe.get_doc({
+        "doctype": "Stock Entry",
+        "name": f"{BENCH_PREFIX}-STE",
+        "stock_entry_type": "Receive",
+        "posting_date": today(),
+        "stock_entry_details": [
+            {
+                "item_code": item_codes[(idx // len(warehouses)) % len(item_codes)],
+                "to_warehouse": warehouses[idx % len(warehouses)],
+                "quantity": 10,
+                "item_price": 100 + idx % 7,
+            }
+            for idx in range(rows)
+        ],
+    })
+    set_stock_qty(stock_entry.stock_entry_details)
+    return stock_entry
+
+
+def get_item_codes(rows):
+    return [f"{BENCH_PREFIX} Item {idx:05d}" for idx in range(max(rows // 4, 1))]
+
+
+def get_warehouses():
+    return [f"{BENCH_PREFIX} Warehouse {idx}" for idx in range(2)]
@@ -0,0 +1,100 @@
+"""Show how the Stock Ledger Entry indexes change the plans of the hot report and posting queries.
+
+    bench --site <site> execute inventory_management.benchmarks.query_plans.run
+
+Each query is explained and timed once as is and once with the composite indexes ignored.
+"""
+
+import time
+
+import frappe
+from frappe.utils import add_months, today
+
+from inventory_management.inventory_management.doctype.stock_ledger_entry.stock_ledger_entry import (
+    KEY_POSTING_INDEX,
+    POSTING_INDEX,
+    VOUCHER_INDEX,
+)
+
+IGNORED_INDEXES = f"ignore index ({KEY_POSTING_INDEX}, {POSTING_INDEX}, {VOUCHER_INDEX})"
+
+
+def run(repeat=5):
+    sample = frappe.db.sql(
+        """select item_code, warehouse, voucher_type, voucher_number
+        from `tabStock Ledger Entry` order by creation desc limit 1""",
+        as_dict=True,
+    )
+    if not sample:
+        print("No Stock Ledger Entries to explain, generate some data first")
+        return
+
+    sample = sample[0]
+    params = {
+        "item_code": sample.item_code,
+        "warehouse": sample.warehouse,
+        "voucher_type": sample.voucher_type,
+        "voucher_number": sample.voucher_number,
+        "from_date": add_months(today(), -1),
+        "to_date": today(),
+    }
+
+    results = {}
+    for label, query in get_queries().items():
+        results[label] = {}
+        for variant, hint in (("indexed", ""), ("no_index", IGNORED_INDEXES)):
+            sql = query.format(hint=hint)
+            plan = frappe.db.sql(f"explain {sql}", params, as_dict=True)
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                frappe.db.sql(sql, params)
+                timings.append(time.perf_counter() - start)
+
+            results[label][variant] = {
+                "time": min(timings),
+                "plan": [
+                    {"table": row.get("table"), "type": row.get("type"), "key": row.get("key"),
+                     "rows": row.get("rows"), "extra": row.get("Extra")}
+                    for row in plan
+                ],
+            }
+
+        print(f"\n{label}")
+        for variant, result in results[label].items():
+            print(f"  {variant:<9} {result['time'] * 1000:8.2f} ms")
+            for row in result["plan"]:
+                print(f"            key={row['key']} type={row['type']} rows={row['rows']} {row['extra'] or ''}")
+
+    return results
+
+
+def get_queries():
+    return {
+        "stock ledger report for one item and warehouse": """
+            select item_code, warehouse, actual_qty, rate, qty_after_transaction, posting_date
+            from `tabStock Ledger Entry` {hint}
+            where is_cancelled = 0 and item_code = %(item_code)s and warehouse = %(warehouse)s
+                and posting_date between %(from_date)s and %(to_date)s
+            order by posting_date, creation
+        """,
+        "stock ledger report for a date range": """
+            select item_code, warehouse, actual_qty, rate, qty_after_transaction, posting_date
+            from `tabStock Ledger Entry` {hint}
+            where is_cancelled = 0 and posting_date between %(from_date)s and %(to_date)s
+            order by posting_date, creation
+            limit 500
+        """,
+        "balance of a key as of a date": """
+            select qty_after_transaction, stock_value
+            from `tabStock Ledger Entry` {hint}
+            where item_code = %(item_code)s and warehouse = %(warehouse)s and posting_date <= %(to_date)s
+            order by posting_date desc, creation desc
+            limit 1
+        """,
+        "ledger rows of a voucher (cancellation)": """
+            select item_code, warehouse, actual_qty, rate
+            from `tabStock Ledger Entry` {hint}
+            where voucher_type = %(voucher_type)s and voucher_number = %(voucher_number)s
+        """,
+    }
@@ -0,0 +1,153 @@
+"""Throughput of reserve/release with many processes competing for the same bins.
+
+    bench --site <site> execute inventory_management.benchmarks.reservations.run --kwargs "{'workers': 50}"
+
+Every worker is a separate process with its own connection that keeps a few reservations
+open on a handful of hot (item, warehouse) pairs, reserving and releasing in a loop and
+committing each operation. At the end the reserved qty of every bin must equal what its
+open reservations still hold and must never exceed its stock. The fixtures are deleted
+afterwards.
+"""
+
+import multiprocessing
+import random
+import time
+
+import frappe
+from frappe.utils import flt, today
+
+from inventory_management.inventory_management.doctype.stock_reservation.stock_reservation import (
+    InsufficientStockError,
+    release,
+    reserve,
+)
+from inventory_management.inventory_management.stock_ledger import make_sl_entries, run_with_lock_retry
+
+BENCH_PREFIX = "_Bench Reservation"
+STOCK_PER_KEY = 500
+OPEN_RESERVATIONS = 3
+
+
+def run(workers=50, operations=200, items=4):
+    item_codes = [f"{BENCH_PREFIX} Item {idx}" for idx in range(items)]
+    warehouse = f"{BENCH_PREFIX} Warehouse"
+    make_fixtures(item_codes, warehouse)
+
+    try:
+        context = multiprocessing.get_context("spawn")
+        start = time.perf_counter()
+        with context.Pool(workers) as pool:
+            results = pool.starmap(
+                reserve_and_release,
+                [
+                    (frappe.local.site, frappe.local.sites_path, seed, item_codes, warehouse, operations)
+                    for seed in range(workers)
+                ],
+            )
+        elapsed = time.perf_counter() - start
+
+        done = sum(result["done"] for result in results)
+        rejected = sum(result["rejected"] for result in results)
+        validate_reserved_qty(item_codes, warehouse)
+
+        print(f"{workers} workers, {len(item_codes)} hot bins: {done} operations in {elapsed:.2f}s "
+              f"({done / elapsed:.0f} ops/s), {rejected} reservations rejected for lack of stock")
+        return {"workers": workers, "operations": done, "rejected": rejected, "seconds": elapsed,
+                "ops_per_second": done / elapsed}
+    finally:
+        delete_fixtures(item_codes, warehouse)
+
+
+def reserve_and_release(site, sites_path, seed, item_codes, warehouse, operations):
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+    frappe.set_user("Administrator")
+
+    rng = random.Random(seed)
+    result = {"done": 0, "rejected": 0}
+    open_reservations = []
+    try:
+        for _ in range(operations):
+            if len(open_reservations) >= OPEN_RESERVATIONS or (open_reservations and rng.random() < 0.3):
+                run_with_lock_retry(release_and_commit, open_reservations.pop(0))
+            else:
+                try:
+                    name = run_with_lock_retry(
+                        reserve_and_commit, rng.choice(item_codes), warehouse, rng.randint(1, 20)
+                    )
+                    open_reservations.append(name)
+                except InsufficientStockError:
+                    frappe.db.rollback()
+                    frappe.clear_messages()
+                    result["rejected"] += 1
+            result["done"] += 1
+
+        for name in open_reservations:
+            run_with_lock_retry(release_and_commit, name)
+    finally:
+        frappe.destroy()
+
+    return result
+
+
+def reserve_and_commit(item_code, warehouse, qty):
+    name = reserve(item_code, warehouse, qty).name
+    frappe.db.commit()
+    return name
+
+
+def release_and_commit(name):
+    release(name)
+    frappe.db.commit()
+
+
+def validate_reserved_qty(item_codes, warehouse):
+    open_qty = dict(
+        frappe.db.sql(
+            """
+            select item_code, sum(reserved_qty - consumed_qty - released_qty)
+            from `tabStock Reservation`
+            where item_code in %(item_codes)s and warehouse = %(warehouse)s
+            group by item_code
+            """,
+            {"item_codes": item_codes, "warehouse": warehouse},
+        )
+    )
+    for item_code, actual_qty, reserved_qty in frappe.db.sql(
+        "select item_code, actual_qty, reserved_qty from `tabBin` where item_code in %(item_codes)s",
+        {"item_codes": item_codes},
+    ):
+        if flt(reserved_qty, 6) != flt(open_qty.get(item_code), 6) or flt(reserved_qty) > flt(actual_qty):
+            frappe.throw(
+                f"Reserved qty of {item_code} drifted: bin {reserved_qty}, reservations {open_qty.get(item_code)}"
+            )
+
+
+def make_fixtures(item_codes, warehouse):
+    delete_fixtures(item_codes, warehouse)
+    frappe.get_doc({"doctype": "Warehouse", "warehouse_name": warehouse}).insert()
+    for item_code in item_codes:
+        frappe.get_doc({"doctype": "Item", "item_code": item_code, "item_name": item_code}).insert()
+
+    make_sl_entries([
+        {
+            "item_code": item_code,
+            "warehouse": warehouse,
+            "qty": STOCK_PER_KEY,
+            "rate": 10,
+            "posting_date": today(),
+            "voucher_type": "Stock Entry",
+            "voucher_number": f"{BENCH_PREFIX}-OPENING",
+        }
+        for item_code in item_codes
+    ])
+    frappe.db.commit()
+
+
+def delete_fixtures(item_codes, warehouse):
+    frappe.db.delete("Stock Reservation", {"item_code": ("in", item_codes)})
+    frappe.db.delete("Stock Ledger Entry", {"item_code": ("in", item_codes)})
+    frappe.db.delete("Bin", {"item_code": ("in", item_codes)})
+    frappe.db.delete("Item", {"name": ("in", item_codes)})
+    frappe.db.delete("Warehouse", {"name": warehouse})
+    frappe.db.commit()
@@ -0,0 +1,113 @@
+"""Time the Stock Balance running balances on a large synthetic ledger.
+
+    bench --site <site> execute inventory_management.benchmarks.running_balance.run --kwargs "{'rows': 1000000}"
+
+The synthetic ledger rows are inserted inside a transaction that is rolled back at the end.
+The window-function query of the detailed report is compared with fetching the rows and
+carrying one balance per (item_code, warehouse) in Python.
+"""
+
+import random
+import time
+
+import frappe
+from frappe.utils import add_days, flt, getdate, now_datetime, today
+
+from inventory_management.inventory_management.report.stock_balance.stock_balance import get_data
+from inventory_management.inventory_management.stock_ledger import SLE_FIELDS
+
+BENCH_PREFIX = "_Bench"
+INSERT_CHUNK_SIZE = 10000
+
+
+def run(rows=1000000, items=1000, warehouses=10, days=365):
+    frappe.db.savepoint("running_balance_benchmark")
+
+    try:
+        make_ledger(rows, items, warehouses, days)
+        filters = frappe._dict(
+            mode="Detailed", from_date=add_days(today(), -days), to_date=today(), item_code=None, warehouse=None
+        )
+
+        start = time.perf_counter()
+        window_rows = get_data(filters)
+        window_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        python_rows = get_python_balances(filters)
+        python_time = time.perf_counter() - start
+
+        mismatches = sum(
+            1
+            for window_row, python_row in zip(window_rows, python_rows)
+            if flt(window_row.balance_qty, 6) != flt(python_row["balance_qty"], 6)
+        )
+        if mismatches or len(window_rows) != len(python_rows):
+            frappe.throw(f"Window balances differ from the Python balances on {mismatches} rows")
+
+        print(f"{len(window_rows)} rows: window functions {window_time:.3f}s, python loop {python_time:.3f}s")
+        return {"rows": len(window_rows), "window": window_time, "python": python_time}
+    finally:
+        frappe.db.rollback()
+
+
+def get_python_balances(filters):
+    entries = frappe.db.sql(
+        """
+        select item_code, warehouse, posting_date, actual_qty, stock_value_difference
+        from `tabStock Ledger Entry`
+        where is_cancelled = 0 and posting_date <= %(to_date)s
+        order by posting_date, creation, name
+        """,
+        filters,
+        as_dict=True,
+    )
+
+    from_date = getdate(filters.from_date)
+    balances, data = {}, []
+    for entry in entries:
+        balance = balances.setdefault((entry.item_code, entry.warehouse), [0.0, 0.0])
+        balance[0] += flt(entry.actual_qty)
+        balance[1] += flt(entry.stock_value_difference)
+        if entry.posting_date >= from_date:
+            data.append({"balance_qty": balance[0], "balance_val": balance[1]})
+
+    return data
+
+
+def make_ledger(rows, items, warehouses, days):
+    rng = random.Random(0)
+    timestamp, user = now_datetime(), frappe.session.user
+    first_day = getdate(add_days(today(), -days))
+
+    for start in range(0, rows, INSERT_CHUNK_SIZE):
+        values = []
+        for idx in range(start, min(start + INSERT_CHUNK_SIZE, rows)):
+            qty = rng.randint(-10, 20) or 1
+            rate = rng.randint(10, 100)
+            row = {
+                "item_code": f"{BENCH_PREFIX} Item {rng.randrange(items):05d}",
+                "warehouse": f"{BENCH_PREFIX} Warehouse {rng.randrange(warehouses)}",
+                "posting_date": add_days(first_day, idx * days // rows),
+                "voucher_type": "Stock Entry",
+                "voucher_number": f"{BENCH_PREFIX}-STE-{idx // 10}",
+                "voucher_detail_no": None,
+                "is_cancelled": 0,
+                "actual_qty": qty,
+                "rate": rate,
+                # balances are not read by either side of the benchmark
+                "qty_after_transaction": 0,
+                "valuation_rate": rate,
+                "stock_value": 0,
+                "stock_value_difference": qty * rate,
+            }
+            values.append(
+                (f"{BENCH_PREFIX}-SLE-{idx:07d}", timestamp, timestamp, user, user, 0)
+                + tuple(row[field] for field in SLE_FIELDS)
+            )
+
+        frappe.db.bulk_insert(
+            "Stock Ledger Entry",
+            fields=["name", "creation", "modified", "owner", "modified_by", "docstatus", *SLE_FIELDS],
+            values=values,
+        )
@@ -0,0 +1,47 @@
+"""Throughput of the stock ageing report's grouped array operations.
+
+    bench --site <site> execute inventory_management.benchmarks.stock_ageing.run --kwargs "{'rows': 5000000}"
+
+Feeds ``rows`` synthetic ledger rows through ``StockAgeing`` in chunks of the report's
+fetch size, so it measures the computation without the database, then times the whole
+report on the site's own ledger.
+"""
+
+import time
+
+import numpy as np
+
+from inventory_management.inventory_management.report.stock_ledger_entry.stock_ledger_entry import (
+    FETCH_SIZE,
+    StockAgeing,
+    execute,
+)
+
+
+def run(rows=5000000, items=20000, warehouses=20):
+    rng = np.random.default_rng(0)
+    item_codes = np.array([f"Item {idx:06d}" for idx in range(items)], dtype=object)
+    warehouse_names = np.array([f"Warehouse {idx:02d}" for idx in range(warehouses)], dtype=object)
+
+    ageing, elapsed = StockAgeing(30), 0.0
+    for start in range(0, rows, FETCH_SIZE):
+        size = min(FETCH_SIZE, rows - start)
+        chunk = (
+            item_codes[rng.integers(0, items, size)],
+            warehouse_names[rng.integers(0, warehouses, size)],
+            rng.integers(0, 365, size),
+            np.where(rng.random(size) < 0.6, 1.0, -1.0) * rng.integers(1, 20, size),
+        )
+        started = time.perf_counter()
+        ageing.add(*chunk)
+        elapsed += time.perf_counter() - started
+
+    started = time.perf_counter()
+    data = ageing.get_rows()
+    elapsed += time.perf_counter() - started
+    print(f"{rows} rows, {len(data)} keys: {elapsed:.2f}s in StockAgeing ({rows / elapsed:,.0f} rows/s)")
+
+    started = time.perf_counter()
+    _columns, site_data = execute({})
+    print(f"report on the site ledger: {time.perf_counter() - started:.2f}s for {len(site_data)} keys")
+    return {"seconds": elapsed, "keys": len(data)}
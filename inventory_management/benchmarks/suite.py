@@ -0,0 +1,196 @@
+"""Benchmark postings and reports on generated datasets of growing size.
+
+    bench --site <site> execute inventory_management.benchmarks.suite.run --kwargs "{'output': '/tmp/bench.json'}"
+    bench --site <site> execute inventory_management.benchmarks.suite.compare \
+        --kwargs "{'baseline': '/tmp/base.json', 'current': '/tmp/bench.json'}"
+
+For every scale a dataset of that many ledger rows is generated with ``data_generator``,
+then Stock Entry submit and cancel, a bulk Stock Reconciliation submit and the Stock
+Balance and Stock Ledger reports are timed ``repeat`` times, with the queries each run
+sends. Postings run inside a savepoint that is rolled back, and the dataset is removed
+before the next scale, so every scale starts from the same ledger for the same seed.
+Results are written as JSON with the commit they were measured on, so runs of two
+commits can be compared with ``compare``.
+"""
+
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+from functools import partial
+
+import frappe
+from frappe.utils import add_days, now, today
+
+from inventory_management.benchmarks.data_generator import DATA_PREFIX, cleanup, generate, get_root_warehouse
+from inventory_management.inventory_management.report.stock_balance.stock_balance import (
+    execute as stock_balance,
+)
+from inventory_management.inventory_management.report.stock_ledger.stock_ledger import execute as stock_ledger
+from inventory_management.inventory_management.stock_ledger import LARGE_VOUCHER_ROWS
+
+SCALES = (10000, 100000, 1000000)
+ENTRY_LINES = 20
+TRANSFER_QTY = 5
+REGRESSION_THRESHOLD = 0.1
+
+
+def run(scales=SCALES, repeat=5, output=None, seed=0, keep_data=False):
+    results = []
+    for scale in scales:
+        cleanup()
+        dataset = generate(rows=scale, items=max(scale // 100, 10), seed=seed)
+        print(f"{scale} rows: generated {dataset}")
+        for benchmark, prepare in get_benchmarks(get_dataset_masters(), seed):
+            result = {"scale": scale, "benchmark": benchmark, **time_benchmark(prepare, repeat)}
+            print(
+                f"{scale:>8} {benchmark:<32} median {result['median_seconds']:.4f}s "
+                f"min {result['min_seconds']:.4f}s, {result['queries']} queries"
+            )
+            results.append(result)
+        if not keep_data:
+            cleanup()
+
+    report = {
+        "commit": get_commit(),
+        "timestamp": now(),
+        "database": frappe.db.sql("select version()")[0][0],
+        "repeat": repeat,
+        "results": results,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=1)
+    return report
+
+
+def get_benchmarks(masters, seed):
+    """Pairs of a name and a setup function, which returns the call to measure."""
+    rng = random.Random(seed)
+    period = {"from_date": add_days(today(), -30), "to_date": today(), "warehouse": get_root_warehouse()}
+    return (
+        ("stock_entry_submit", lambda: make_transfer(masters, rng).insert().submit),
+        ("stock_entry_cancel", lambda: submitted(make_transfer(masters, rng)).cancel),
+        ("stock_reconciliation_submit", lambda: make_reconciliation(masters, rng).insert().submit),
+        ("stock_balance_summary", lambda: partial(stock_balance, period)),
+        ("stock_balance_detailed", lambda: partial(stock_balance, {**period, "mode": "Detailed"})),
+        ("stock_ledger", lambda: partial(stock_ledger, period)),
+    )
+
+
+def time_benchmark(prepare, repeat):
+    """Measure the call ``prepare`` returns ``repeat`` times, each in a savepoint that is rolled back."""
+    timings, queries = [], []
+    for _ in range(repeat):
+        frappe.db.savepoint("benchmark_suite")
+        try:
+            measured = prepare()
+            start_queries, start = get_query_count(), time.perf_counter()
+            measured()
+            timings.append(time.perf_counter() - start)
+            # the second status query is counted too
+            queries.append(get_query_count() - start_queries - 1)
+        finally:
+            frappe.db.rollback(save_point="benchmark_suite")
+
+    return {
+        "min_seconds": min(timings),
+        "median_seconds": statistics.median(timings),
+        "queries": min(queries),
+    }
+
+
+def get_query_count():
+    return int(frappe.db.sql("show session status like 'Questions'")[0][1])
+
+
+def submitted(doc):
+    doc.insert().submit()
+    return doc
+
+
+def make_transfer(masters, rng):
+    # only stock that is there can be moved, so every line takes from a different stocked bin
+    _item_codes, warehouses = masters
+    stocked = frappe.get_all(
+        "Bin",
+        filters={"item_code": ("like", f"{DATA_PREFIX} Item %"), "actual_qty": (">=", TRANSFER_QTY)},
+        fields=["item_code", "warehouse"],
+        order_by="item_code, warehouse",
+    )
+    return frappe.get_doc({
+        "doctype": "Stock Entry",
+        "stock_entry_type": "Transfer",
+        "posting_date": today(),
+        "stock_entry_details": [
+            {
+                "item_code": bin.item_code,
+                "from_warehouse": bin.warehouse,
+                "to_warehouse": rng.choice([warehouse for warehouse in warehouses if warehouse != bin.warehouse]),
+                "quantity": rng.randint(1, TRANSFER_QTY),
+                "item_price": 10,
+            }
+            for bin in rng.sample(stocked, ENTRY_LINES)
+        ],
+    })
+
+
+def make_reconciliation(masters, rng):
+    # the largest reconciliation that is still posted in the request
+    item_codes, warehouses = masters
+    return frappe.get_doc({
+        "doctype": "Stock Reconciliation",
+        "purpose": "Stock Reconciliation",
+        "posting_date": today(),
+        "stock_reconciliation_details": [
+            {
+                "item_code": rng.choice(item_codes),
+                "warehouse": rng.choice(warehouses),
+                "quantity": rng.randint(1, 20),
+                "rate": rng.randint(10, 100),
+            }
+            for _ in range(LARGE_VOUCHER_ROWS)
+        ],
+    })
+
+
+def get_dataset_masters():
+    return (
+        frappe.get_all("Item", filters={"name": ("like", f"{DATA_PREFIX} Item %")}, pluck="name", order_by="name"),
+        frappe.get_all(
+            "Warehouse", filters={"name": ("like", f"{DATA_PREFIX} Warehouse %")}, pluck="name", order_by="name"
+        ),
+    )
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(__file__), text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Print every benchmark of ``current`` against ``baseline`` and return the ones slower by more than ``threshold``."""
+    with open(baseline) as f:
+        before = {(row["scale"], row["benchmark"]): row for row in json.load(f)["results"]}
+    with open(current) as f:
+        after = json.load(f)["results"]
+
+    regressions = []
+    for row in after:
+        base = before.get((row["scale"], row["benchmark"]))
+        if not base:
+            continue
+        ratio = row["median_seconds"] / base["median_seconds"] if base["median_seconds"] else 0
+        print(
+            f"{row['scale']:>8} {row['benchmark']:<32} {base['median_seconds']:.4f}s -> {row['median_seconds']:.4f}s "
+            f"({ratio:.2f}x), queries {base['queries']} -> {row['queries']}"
+        )
+        if ratio > 1 + threshold or row["queries"] > base["queries"]:
+            regressions.append({**row, "baseline_seconds": base["median_seconds"], "baseline_queries": base["queries"]})
+    return regressions
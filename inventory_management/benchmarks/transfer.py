@@ -0,0 +1,116 @@
+"""Compare posting the two legs of a Stock Entry transfer separately with posting them as one batch.
+
+    bench --site <site> execute inventory_management.benchmarks.transfer.run --kwargs "{'rows': 1000}"
+
+Everything is written inside a transaction that is rolled back at the end.
+"""
+
+import time
+
+import frappe
+from frappe.utils import flt, today
+
+from inventory_management.inventory_management.stock_ledger import make_sl_entries, set_stock_qty
+
+BENCH_PREFIX = "_Bench Transfer"
+
+
+def run(rows=1000, repeat=3):
+    make_fixtures(rows)
+    frappe.db.savepoint("transfer_benchmark")
+
+    try:
+        results = {}
+        for label, post in (("per_leg", post_per_leg), ("batched", post_batched)):
+            timings, queries = [], []
+            for _ in range(repeat):
+                receive_stock(rows)
+                stock_entry = make_transfer(rows)
+                start, start_queries = time.perf_counter(), get_query_count()
+                post(stock_entry)
+                timings.append(time.perf_counter() - start)
+                queries.append(get_query_count() - start_queries)
+                frappe.db.rollback(save_point="transfer_benchmark")
+            results[label] = {"seconds": min(timings), "queries": min(queries)}
+
+        speedup = flt(results["per_leg"]["seconds"] / results["batched"]["seconds"], 2)
+        print(
+            f"{rows} rows: per leg {results['per_leg']['seconds']:.3f}s / {results['per_leg']['queries']} queries, "
+            f"batched {results['batched']['seconds']:.3f}s / {results['batched']['queries']} queries ({speedup}x)"
+        )
+        return results
+    finally:
+        frappe.db.rollback()
+
+
+def post_per_leg(stock_entry):
+    # every leg in its own batch, with its own masters check, bin locks and writes
+    sl_entries = stock_entry.get_sl_entries()
+    for out_leg, in_leg in zip(sl_entries[::2], sl_entries[1::2]):
+        (ledger_row,) = make_sl_entries([out_leg])
+        make_sl_entries([{**in_leg, "rate": ledger_row["rate"], "rate_from_row": None}])
+
+
+def post_batched(stock_entry):
+    make_sl_entries(stock_entry.get_sl_entries())
+
+
+def get_query_count():
+    return int(frappe.db.sql("show session status like 'Questions'")[0][1])
+
+
+def receive_stock(rows):
+    source = get_warehouses()[0]
+    make_sl_entries([
+        {
+            "item_code": item_code,
+            "warehouse": source,
+            "qty": 100,
+            "rate": 10,
+            "posting_date": today(),
+            "voucher_type": "Stock Entry",
+            "voucher_number": f"{BENCH_PREFIX}-RECEIPT",
+        }
+        for item_code in get_item_codes(rows)
+    ])
+
+
+def make_transfer(rows):
+    item_codes = get_item_codes(rows)
+    source, destination = get_warehouses()
+    stock_entry = frappe.get_doc({
+        "doctype": "Stock Entry",
+        "name": f"{BENCH_PREFIX}-STE",
+        "stock_entry_type": "Transfer",
+        "posting_date": today(),
+        "stock_entry_details": [
+            {
+                "item_code": item_codes[idx % len(item_codes)],
+                "from_warehouse": source,
+                "to_warehouse": destination,
+                "quantity": 1,
+                "item_price": 10,
+            }
+            for idx in range(rows)
+        ],
+    })
+    set_stock_qty(stock_entry.stock_entry_details)
+    return stock_entry
+
+
+def make_fixtures(rows):
+    for warehouse in get_warehouses():
+        if not frappe.db.exists("Warehouse", warehouse):
+            frappe.get_doc({"doctype": "Warehouse", "warehouse_name": warehouse}).insert()
+
+    for item_code in get_item_codes(rows):
+        if not frappe.db.exists("Item", item_code):
+            frappe.get_doc({"doctype": "Item", "item_code": item_code, "item_name": item_code}).insert()
+
+
+def get_item_codes(rows):
+    return [f"{BENCH_PREFIX} Item {idx:05d}" for idx in range(max(rows // 4, 1))]
+
+
+def get_warehouses():
+    return [f"{BENCH_PREFIX} Warehouse {idx}" for idx in range(2)]
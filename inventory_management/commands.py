@@ -0,0 +1,143 @@
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-stock-valuation")
+@click.option("--item", "item_code", help="Only rebuild the bins of this item")
+@click.option("--dry-run", is_flag=True, default=False, help="Report drift without fixing it")
+@pass_context
+def rebuild_stock_valuation(context, item_code=None, dry_run=False):
+    "Recompute the per-warehouse valuation state (Bin) from the Stock Ledger"
+    from inventory_management.inventory_management.doctype.bin.bin import rebuild_bins
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        drift = rebuild_bins(item_code=item_code, dry_run=dry_run)
+        for row in drift:
+            click.echo(
+                "{item_code} @ {warehouse}: qty {actual_qty} -> {expected_qty}, "
+                "value {stock_value} -> {expected_value}".format(**row)
+            )
+        click.echo(f"{len(drift)} bin(s) drifted from the ledger" + (" (dry run)" if dry_run else ""))
+        if not dry_run:
+            frappe.db.commit()
+    finally:
+        frappe.destroy()
+
+
+@click.command("rebuild-warehouse-tree")
+@pass_context
+def rebuild_warehouse_tree(context):
+    "Recompute the lft/rgt intervals of the Warehouse tree in one pass"
+    from inventory_management.inventory_management.doctype.warehouse.warehouse import (
+        rebuild_warehouse_tree as rebuild,
+    )
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        click.echo(f"Rebuilt the intervals of {rebuild()} warehouse(s)")
+        frappe.db.commit()
+    finally:
+        frappe.destroy()
+
+
+@click.command("check-stock-projection")
+@click.option("--fix", is_flag=True, default=False, help="Drop the differing entries so they are reloaded from Bin")
+@pass_context
+def check_stock_projection(context, fix=False):
+    "Compare the Redis stock projection with the Stock Ledger"
+    from inventory_management.inventory_management.stock_projection import check_projection
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        differences = check_projection(fix=fix)
+        for row in differences:
+            click.echo("{item_code} @ {warehouse}: projected {projected_qty}, ledger {ledger_qty}".format(**row))
+        click.echo(f"{len(differences)} projected quantit(ies) differ from the ledger" + (" (dropped)" if fix else ""))
+    finally:
+        frappe.destroy()
+
+
+@click.command("rebuild-item-stock")
+@pass_context
+def rebuild_item_stock(context):
+    "Recompute Item.item_stock from the bins"
+    from inventory_management.inventory_management.doctype.bin.bin import rebuild_item_stock as rebuild
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        click.echo(f"Corrected the stock of {rebuild()} item(s)")
+        frappe.db.commit()
+    finally:
+        frappe.destroy()
+
+
+@click.command("verify-stock-ledger")
+@click.option("--processes", default=4, type=int, help="Worker processes, each checking one shard of the items")
+@click.option("--repair", is_flag=True, default=False, help="Rewrite bins and item totals from the ledger")
+@click.option("--output", help="Path of the mismatch report, JSON lines")
+@pass_context
+def verify_stock_ledger(context, processes=4, repair=False, output=None):
+    "Check the Stock Ledger, bins and item totals against the vouchers that produced them"
+    from inventory_management.inventory_management.ledger_verifier import verify_ledger
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        output, counts = verify_ledger(processes=processes, repair=repair, output=output)
+        for check, count in sorted(counts.items()):
+            click.echo(f"{check}: {count} mismatch(es)" + (" (repaired)" if repair and check != "voucher" else ""))
+        click.echo(f"{sum(counts.values())} mismatch(es) in total, report written to {output}")
+    finally:
+        frappe.destroy()
+
+
+@click.command("stock-profile")
+@click.option("--operation", help="Only show this operation, e.g. 'Stock Entry.on_submit'")
+@click.option("--slowest", default=5, type=int, help="Slowest calls to list per operation")
+@pass_context
+def stock_profile(context, operation=None, slowest=5):
+    "Show the percentiles and slowest calls recorded by the sampled stock profiling"
+    from inventory_management.inventory_management.profiling import get_profile_summary
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        frappe.set_user("Administrator")
+        for name, summary in get_profile_summary(operation=operation, slowest=slowest).items():
+            if summary["calls"]:
+                click.echo(
+                    "{name}: {calls} call(s), p50 {p50:.3f}s, p95 {p95:.3f}s, p99 {p99:.3f}s".format(name=name, **summary)
+                )
+            if summary["traced_calls"]:
+                click.echo(
+                    "{name}: {traced_calls} traced call(s), {peak_memory} bytes peak".format(name=name, **summary)
+                )
+            for call in summary["slowest"]:
+                click.echo(
+                    "    {seconds:.3f}s {document} at {timestamp}: {queries} queries in {query_seconds:.3f}s, "
+                    "{rows} row(s)".format(**call)
+                )
+    finally:
+        frappe.destroy()
+
+
+commands = [
+    rebuild_stock_valuation,
+    rebuild_warehouse_tree,
+    check_stock_projection,
+    rebuild_item_stock,
+    verify_stock_ledger,
+    stock_profile,
+]
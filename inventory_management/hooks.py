@@ -130,6 +130,24 @@ app_license = "mit"
 # 	}
 # }
 
+doc_events = {
+	"Item": {
+		"on_update": "inventory_management.inventory_management.master_cache.clear_item_cache",
+		"on_trash": "inventory_management.inventory_management.master_cache.clear_item_cache",
+		"after_rename": "inventory_management.inventory_management.master_cache.clear_item_cache",
+	},
+	"Warehouse": {
+		"on_update": "inventory_management.inventory_management.master_cache.clear_warehouse_cache",
+		"on_trash": "inventory_management.inventory_management.master_cache.clear_warehouse_cache",
+		"after_rename": "inventory_management.inventory_management.master_cache.clear_warehouse_cache",
+	},
+	"UOM": {
+		"on_update": "inventory_management.inventory_management.master_cache.clear_uom_cache",
+		"on_trash": "inventory_management.inventory_management.master_cache.clear_uom_cache",
+		"after_rename": "inventory_management.inventory_management.master_cache.clear_uom_cache",
+	},
+}
+
 # Scheduled Tasks
 # ---------------
 
@@ -151,6 +169,18 @@ app_license = "mit"
 # 	],
 # }
 
+scheduler_events = {
+	"all": [
+		"inventory_management.inventory_management.doctype.stock_repost.stock_repost.process_repost_queue"
+	],
+	"daily": [
+		"inventory_management.inventory_management.doctype.stock_closing_balance.stock_closing_balance.make_daily_snapshot"
+	],
+	"monthly": [
+		"inventory_management.inventory_management.doctype.stock_closing_balance.stock_closing_balance.make_month_end_snapshot"
+	],
+}
+
 # Testing
 # -------
 
@@ -189,6 +219,9 @@ app_license = "mit"
 # before_job = ["inventory_management.utils.before_job"]
 # after_job = ["inventory_management.utils.after_job"]
 
+after_request = ["inventory_management.inventory_management.master_cache.flush_cache_stats"]
+after_job = ["inventory_management.inventory_management.master_cache.flush_cache_stats"]
+
 # User Data Protection
 # --------------------
 
@@ -0,0 +1,8 @@
+// Copyright (c) 2024, Poorvi Solutions and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Bin", {
+// 	refresh(frm) {
+
+// 	},
+// });
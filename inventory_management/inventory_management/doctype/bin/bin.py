@@ -0,0 +1,272 @@
+# Copyright (c) 2024, Poorvi Solutions and contributors
+# For license information, please see license.txt
+
+import time
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, now
+
+from inventory_management.inventory_management.utils import bulk_update_by_name
+
+LOCK_RETRIES = 3
+LOCK_RETRY_DELAY = 0.2
+
+
+class Bin(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_unique("Bin", ["item_code", "warehouse"], constraint_name="unique_item_warehouse")
+
+
+def get_bins(keys, for_update=False):
+	"""Return ``{(item_code, warehouse): bin}`` for the given keys.
+
+	With ``for_update`` the bins are locked in one statement in (item_code, warehouse)
+	order, so every posting acquires its locks in the same order, and missing bins are
+	created first so that there is a row to lock.
+	"""
+	if not keys:
+		return {}
+
+	keys = sorted(keys)
+	if not for_update:
+		return select_bins(keys)
+
+	bins = lock_bins(keys)
+	missing = [key for key in keys if key not in bins]
+	if missing:
+		insert_empty_bins(missing)
+		bins.update(lock_bins(missing))
+
+	return bins
+
+
+def lock_bins(keys):
+	for attempt in range(LOCK_RETRIES + 1):
+		try:
+			return select_bins(keys, for_update=True)
+		except frappe.QueryTimeoutError:
+			# a lock wait timeout only rolls back the statement, so it is safe to try again
+			if attempt == LOCK_RETRIES:
+				raise
+			time.sleep(LOCK_RETRY_DELAY * (attempt + 1))
+
+
+def select_bins(keys, for_update=False):
+	rows = frappe.db.sql(
+		"""
+		select name, item_code, warehouse, actual_qty, reserved_qty, valuation_rate, stock_value, fifo_queue
+		from `tabBin`
+		where (item_code, warehouse) in ({keys})
+		order by item_code, warehouse
+		{for_update}
+		""".format(keys=", ".join(["(%s, %s)"] * len(keys)), for_update="for update" if for_update else ""),
+		[value for key in keys for value in key],
+		as_dict=True,
+	)
+
+	return {
+		(row.item_code, row.warehouse): {
+			"name": row.name,
+			"item_code": row.item_code,
+			"warehouse": row.warehouse,
+			"actual_qty": flt(row.actual_qty),
+			"reserved_qty": flt(row.reserved_qty),
+			"valuation_rate": flt(row.valuation_rate),
+			"stock_value": flt(row.stock_value),
+			"fifo_queue": row.fifo_queue,
+		}
+		for row in rows
+	}
+
+
+def insert_empty_bins(keys):
+	timestamp, user = now(), frappe.session.user
+	frappe.db.bulk_insert(
+		"Bin",
+		fields=["name", "creation", "modified", "owner", "modified_by", "item_code", "warehouse"],
+		values=[(frappe.generate_hash(length=10), timestamp, timestamp, user, user, *key) for key in keys],
+		ignore_duplicates=True,
+	)
+
+
+def new_bin(item_code, warehouse):
+	return {
+		"name": None,
+		"item_code": item_code,
+		"warehouse": warehouse,
+		"actual_qty": 0.0,
+		"reserved_qty": 0.0,
+		"valuation_rate": 0.0,
+		"stock_value": 0.0,
+		"fifo_queue": None,
+	}
+
+
+def save_bins(bins):
+	"""Insert the bins that have no name yet and update the rest, each in bulk.
+
+	``reserved_qty`` is never written here, it is only changed by the Stock Reservation operations.
+	"""
+	new_bins = [b for b in bins if not b["name"]]
+	existing_bins = [b for b in bins if b["name"]]
+	if new_bins:
+		timestamp, user = now(), frappe.session.user
+		for b in new_bins:
+			b["name"] = frappe.generate_hash(length=10)
+
+		frappe.db.bulk_insert(
+			"Bin",
+			fields=[
+				"name", "creation", "modified", "owner", "modified_by",
+				"item_code", "warehouse", "actual_qty", "valuation_rate", "stock_value", "fifo_queue",
+			],
+			values=[
+				(
+					b["name"], timestamp, timestamp, user, user,
+					b["item_code"], b["warehouse"], b["actual_qty"], b["valuation_rate"], b["stock_value"],
+					b["fifo_queue"],
+				)
+				for b in new_bins
+			],
+		)
+
+	bulk_update_by_name(
+		"Bin",
+		{
+			b["name"]: {
+				"actual_qty": b["actual_qty"],
+				"valuation_rate": b["valuation_rate"],
+				"stock_value": b["stock_value"],
+				"fifo_queue": b["fifo_queue"],
+			}
+			for b in existing_bins
+		},
+	)
+
+
+def update_item_valuation_rates(item_codes):
+	"""Roll the warehouse-level valuation of each item up into ``Item.moving_average_rate``."""
+	if not item_codes:
+		return
+
+	totals = frappe.db.sql(
+		"""
+		select item_code, sum(actual_qty) as qty, sum(stock_value) as value
+		from `tabBin`
+		where item_code in %(item_codes)s
+		group by item_code
+		""",
+		{"item_codes": list(item_codes)},
+		as_dict=True,
+	)
+
+	bulk_update_by_name(
+		"Item",
+		{
+			row.item_code: {"moving_average_rate": flt(row.value) / flt(row.qty) if flt(row.qty) else 0}
+			for row in totals
+		},
+	)
+
+
+def update_item_stock(qty_by_item, chunk_size=500):
+	"""Add the signed qty of each item to ``Item.item_stock``, as an increment in the database.
+
+	Concurrent postings of the same item each add their own qty, so no lock on the Item is
+	needed beyond the row lock the update itself takes.
+	"""
+	item_codes = sorted(item_code for item_code, qty in qty_by_item.items() if flt(qty, 9))
+	for start in range(0, len(item_codes), chunk_size):
+		chunk = item_codes[start : start + chunk_size]
+		frappe.db.sql(
+			"""
+			update `tabItem` set item_stock = ifnull(item_stock, 0) + case name {cases} else 0 end
+			where name in ({names})
+			""".format(cases=" ".join(["when %s then %s"] * len(chunk)), names=", ".join(["%s"] * len(chunk))),
+			[value for item_code in chunk for value in (item_code, qty_by_item[item_code])] + chunk,
+		)
+
+
+def rebuild_item_stock(item_codes=None):
+	"""Set ``Item.item_stock`` to the total of the item's bins and return the number of items that changed."""
+	item_codes = list(item_codes or [])
+	bin_condition = "where item_code in %(item_codes)s" if item_codes else ""
+	item_condition = "and item.name in %(item_codes)s" if item_codes else ""
+	frappe.db.sql(
+		f"""
+		update `tabItem` item
+		left join (
+			select item_code, sum(actual_qty) as qty from `tabBin` {bin_condition} group by item_code
+		) bin on bin.item_code = item.name
+		set item.item_stock = ifnull(bin.qty, 0)
+		where round(ifnull(item.item_stock, 0) - ifnull(bin.qty, 0), 9) != 0 {item_condition}
+		""",
+		{"item_codes": item_codes},
+	)
+	return frappe.db._cursor.rowcount
+
+
+def rebuild_bins(item_code=None, dry_run=False):
+	"""Recompute every bin from the Stock Ledger and return the bins that had drifted."""
+	expected = get_bin_values_from_ledger(item_code)
+
+	filters = {"item_code": item_code} if item_code else {}
+	current = {
+		(b.item_code, b.warehouse): b
+		for b in frappe.get_all(
+			"Bin", filters=filters, fields=["name", "item_code", "warehouse", "actual_qty", "stock_value"]
+		)
+	}
+
+	drift, changed = [], []
+	for key in set(expected) | set(current):
+		qty, value = expected.get(key, (0.0, 0.0))
+		existing = current.get(key)
+		stored_qty = flt(existing.actual_qty) if existing else 0.0
+		stored_value = flt(existing.stock_value) if existing else 0.0
+		if flt(qty - stored_qty, 6) == 0 and flt(value - stored_value, 2) == 0:
+			continue
+
+		drift.append({
+			"item_code": key[0],
+			"warehouse": key[1],
+			"actual_qty": stored_qty,
+			"expected_qty": qty,
+			"stock_value": stored_value,
+			"expected_value": value,
+		})
+		b = new_bin(*key)
+		b.update({
+			"name": existing.name if existing else None,
+			"actual_qty": qty,
+			"stock_value": value,
+			"valuation_rate": value / qty if qty else 0.0,
+		})
+		changed.append(b)
+
+	if changed and not dry_run:
+		save_bins(changed)
+		update_item_valuation_rates({b["item_code"] for b in changed})
+		rebuild_item_stock({b["item_code"] for b in changed})
+
+	return drift
+
+
+def get_bin_values_from_ledger(item_code=None):
+	condition = "where item_code = %(item_code)s" if item_code else ""
+	rows = frappe.db.sql(
+		f"""
+		select item_code, warehouse, sum(actual_qty) as qty, sum(stock_value_difference) as value
+		from `tabStock Ledger Entry`
+		{condition}
+		group by item_code, warehouse
+		""",
+		{"item_code": item_code},
+		as_dict=True,
+	)
+
+	return {(row.item_code, row.warehouse): (flt(row.qty), flt(row.value)) for row in rows}
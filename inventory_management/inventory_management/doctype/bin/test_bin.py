@@ -0,0 +1,46 @@
+# Copyright (c) 2024, Poorvi Solutions and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import today
+
+from inventory_management.inventory_management.stock_ledger import make_sl_entries
+from inventory_management.inventory_management.stock_projection import (
+	get_available_qty,
+	get_projection_key,
+	write_projection,
+)
+
+TEST_ITEM = "_Test Projection Item"
+TEST_WAREHOUSE = "_Test Projection Warehouse"
+
+
+class TestBin(FrappeTestCase):
+	def setUp(self):
+		if not frappe.db.exists("Warehouse", TEST_WAREHOUSE):
+			frappe.get_doc({"doctype": "Warehouse", "warehouse_name": TEST_WAREHOUSE}).insert()
+		if not frappe.db.exists("Item", TEST_ITEM):
+			frappe.get_doc({"doctype": "Item", "item_code": TEST_ITEM, "item_name": TEST_ITEM}).insert()
+		frappe.cache.delete(get_projection_key(TEST_ITEM))
+
+	def test_available_qty_falls_back_to_bin_and_ignores_older_versions(self):
+		make_sl_entries([
+			{
+				"item_code": TEST_ITEM,
+				"warehouse": TEST_WAREHOUSE,
+				"qty": 6,
+				"rate": 10,
+				"posting_date": today(),
+				"voucher_type": "Stock Entry",
+				"voucher_number": frappe.generate_hash(length=10),
+			}
+		])
+		self.assertEqual(get_available_qty([TEST_ITEM], [TEST_WAREHOUSE]), {TEST_ITEM: {TEST_WAREHOUSE: 6}})
+
+		key = (TEST_ITEM, TEST_WAREHOUSE)
+		write_projection({key: (9, "2030-01-01 00:00:00.000002")})
+		write_projection({key: (7, "2030-01-01 00:00:00.000001")})
+		self.assertEqual(get_available_qty(TEST_ITEM, TEST_WAREHOUSE)[TEST_ITEM][TEST_WAREHOUSE], 9)
+
+		frappe.cache.delete(get_projection_key(TEST_ITEM))
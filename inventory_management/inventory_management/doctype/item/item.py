@@ -1,9 +1,31 @@
 # Copyright (c) 2024, Poorvi Solutions and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
+from frappe import _
 from frappe.model.document import Document
+from frappe.utils import flt
 
 
 class Item(Document):
-	pass
+	def validate(self):
+		self.validate_uom_conversions()
+		if not self.is_new():
+			# postings increment item_stock in place, saving the form must not write back an older total
+			self.item_stock = frappe.db.get_value("Item", self.name, "item_stock", for_update=True)
+
+	def validate_uom_conversions(self):
+		uoms = set()
+		for row in self.get("uoms"):
+			if row.uom in uoms:
+				frappe.throw(_("Row {0}: UOM {1} is entered more than once.").format(row.idx, row.uom))
+			uoms.add(row.uom)
+			if flt(row.conversion_factor) <= 0:
+				frappe.throw(_("Row {0}: Conversion Factor must be greater than zero.").format(row.idx))
+			if row.uom == self.unit_of_measure and flt(row.conversion_factor) != 1:
+				frappe.throw(_("Row {0}: The stock UOM {1} always converts at 1.").format(row.idx, row.uom))
+
+
+def on_doctype_update():
+	# sorting and filtering the Item list by stock reads the index instead of the table
+	frappe.db.add_index("Item", ["item_stock"])
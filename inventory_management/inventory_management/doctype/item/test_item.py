@@ -1,9 +1,89 @@
 # Copyright (c) 2024, Poorvi Solutions and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import flt, today
+
+from inventory_management.inventory_management.doctype.bin.bin import rebuild_item_stock
+from inventory_management.inventory_management.master_cache import (
+	ITEM_CACHE,
+	clear_items,
+	flush_cache_stats,
+	get_cache_stats,
+	get_item_details,
+	get_items,
+	get_local_cache,
+	reset_cache_stats,
+)
+from inventory_management.inventory_management.stock_ledger import make_sl_entries, reverse_sl_entries
+
+TEST_ITEM = "_Test Cached Item"
+TEST_WAREHOUSES = ("_Test Item Stock Warehouse 1", "_Test Item Stock Warehouse 2")
 
 
 class TestItem(FrappeTestCase):
-	pass
+	def test_item_cache_is_dropped_on_update(self):
+		if not frappe.db.exists("Item", TEST_ITEM):
+			frappe.get_doc({"doctype": "Item", "item_code": TEST_ITEM, "item_name": TEST_ITEM}).insert()
+
+		self.assertEqual(get_item_details(TEST_ITEM).item_name, TEST_ITEM)
+
+		item = frappe.get_doc("Item", TEST_ITEM)
+		item.item_name = "_Test Renamed Cached Item"
+		item.save()
+		self.assertEqual(get_item_details(TEST_ITEM).item_name, "_Test Renamed Cached Item")
+
+		self.assertIsNone(get_item_details("_Test Missing Item"))
+
+	def test_cache_stats_count_every_tier(self):
+		item_codes = [f"_Test Cache Stats Item {idx} {frappe.generate_hash(length=6)}" for idx in range(2)]
+		for item_code in item_codes:
+			frappe.get_doc({"doctype": "Item", "item_code": item_code, "item_name": item_code}).insert()
+		clear_items(item_codes)
+		flush_cache_stats()
+		reset_cache_stats()
+
+		get_items(item_codes)
+		get_items(item_codes)
+		get_local_cache(ITEM_CACHE).clear()
+		get_items(item_codes)
+		flush_cache_stats()
+
+		self.assertEqual(
+			get_cache_stats(),
+			{
+				f"{ITEM_CACHE}:misses": 2,
+				f"{ITEM_CACHE}:local_hits": 2,
+				f"{ITEM_CACHE}:redis_hits": 2,
+			},
+		)
+
+	def test_item_stock_follows_postings(self):
+		for warehouse in TEST_WAREHOUSES:
+			if not frappe.db.exists("Warehouse", warehouse):
+				frappe.get_doc({"doctype": "Warehouse", "warehouse_name": warehouse}).insert()
+		item_code = f"_Test Item Stock {frappe.generate_hash(length=6)}"
+		frappe.get_doc({"doctype": "Item", "item_code": item_code, "item_name": item_code}).insert()
+
+		voucher_number = frappe.generate_hash(length=10)
+		make_sl_entries([
+			{
+				"item_code": item_code,
+				"warehouse": warehouse,
+				"qty": qty,
+				"rate": 5,
+				"posting_date": today(),
+				"voucher_type": "Stock Entry",
+				"voucher_number": voucher_number,
+			}
+			for warehouse, qty in zip(TEST_WAREHOUSES, (10, 4))
+		])
+		self.assertEqual(flt(frappe.db.get_value("Item", item_code, "item_stock")), 14)
+
+		reverse_sl_entries("Stock Entry", voucher_number)
+		self.assertEqual(flt(frappe.db.get_value("Item", item_code, "item_stock")), 0)
+
+		frappe.db.set_value("Item", item_code, "item_stock", 3)
+		self.assertEqual(rebuild_item_stock([item_code]), 1)
+		self.assertEqual(flt(frappe.db.get_value("Item", item_code, "item_stock")), 0)
@@ -1,9 +1,87 @@
 # Copyright (c) 2024, Poorvi Solutions and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import flt, today
+
+from inventory_management.inventory_management.stock_ledger import make_sl_entries, reverse_sl_entries
+from inventory_management.inventory_management.valuation import FifoQueue
+
+TEST_ITEM_GROUP = "_Test FIFO Item Group"
+TEST_WAREHOUSE = "_Test FIFO Warehouse"
 
 
 class TestItemGroup(FrappeTestCase):
-	pass
+	def setUp(self):
+		if not frappe.db.exists("Item Group", TEST_ITEM_GROUP):
+			frappe.get_doc(
+				{"doctype": "Item Group", "item_group": TEST_ITEM_GROUP, "valuation_method": "FIFO"}
+			).insert()
+		if not frappe.db.exists("Warehouse", TEST_WAREHOUSE):
+			frappe.get_doc({"doctype": "Warehouse", "warehouse_name": TEST_WAREHOUSE}).insert()
+		self.item_code = f"_Test FIFO Item {frappe.generate_hash(length=6)}"
+		frappe.get_doc({
+			"doctype": "Item",
+			"item_code": self.item_code,
+			"item_name": self.item_code,
+			"item_group": TEST_ITEM_GROUP,
+		}).insert()
+
+	def test_fifo_issue_takes_the_oldest_layers(self):
+		post(self.item_code, 10, 5)
+		post(self.item_code, 10, 7)
+
+		voucher_number = frappe.generate_hash(length=10)
+		(issue,) = post(self.item_code, -15, 0, voucher_number)
+		self.assertAlmostEqual(issue["stock_value_difference"], -(10 * 5 + 5 * 7))
+		self.assertEqual(get_bin(self.item_code), (5, 7, 35))
+
+		reverse_sl_entries("Stock Entry", voucher_number)
+		self.assertEqual(get_bin(self.item_code), (20, 6, 120))
+
+		post(self.item_code, -12, 0)
+		# the returned stock went back in front, at the value it left with
+		self.assertEqual(get_bin(self.item_code), (8, 6.5, 52))
+
+	def test_cancelled_receipt_takes_back_exactly_its_value(self):
+		voucher_number = frappe.generate_hash(length=10)
+		post(self.item_code, 10, 10, voucher_number)
+		post(self.item_code, 10, 20)
+
+		reverse_sl_entries("Stock Entry", voucher_number)
+		ledger_value = frappe.db.sql(
+			"""select sum(stock_value_difference) from `tabStock Ledger Entry`
+			where item_code = %s and warehouse = %s""",
+			(self.item_code, TEST_WAREHOUSE),
+		)[0][0]
+		self.assertEqual(get_bin(self.item_code), (10, 20, 200))
+		self.assertAlmostEqual(flt(ledger_value), 200)
+
+		fifo_queue = frappe.db.get_value(
+			"Bin", {"item_code": self.item_code, "warehouse": TEST_WAREHOUSE}, "fifo_queue"
+		)
+		self.assertAlmostEqual(FifoQueue.loads(fifo_queue).get_value(), 200)
+
+
+def post(item_code, qty, rate, voucher_number=None):
+	return make_sl_entries([
+		{
+			"item_code": item_code,
+			"warehouse": TEST_WAREHOUSE,
+			"qty": qty,
+			"rate": rate,
+			"posting_date": today(),
+			"voucher_type": "Stock Entry",
+			"voucher_number": voucher_number or frappe.generate_hash(length=10),
+		}
+	])
+
+
+def get_bin(item_code):
+	values = frappe.db.get_value(
+		"Bin",
+		{"item_code": item_code, "warehouse": TEST_WAREHOUSE},
+		["actual_qty", "valuation_rate", "stock_value"],
+	)
+	return tuple(flt(value, 6) for value in values)
@@ -0,0 +1,15 @@
+// Copyright (c) 2024, Poorvi Solutions and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("Opening Stock Import", {
+	refresh(frm) {
+		if (frm.is_new() || frm.doc.status === "Completed") {
+			return;
+		}
+
+		const label = frm.doc.status === "Pending" ? __("Start Import") : __("Resume Import");
+		frm.add_custom_button(label, () => {
+			frm.call("start_import").then(() => frm.reload_doc());
+		}).addClass("btn-primary");
+	},
+});
@@ -0,0 +1,191 @@
+# Copyright (c) 2024, Poorvi Solutions and contributors
+# For license information, please see license.txt
+
+import csv
+import json
+import os
+from itertools import islice
+
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from frappe.utils import cint, cstr, flt
+
+from inventory_management.inventory_management.stock_ledger import make_sl_entries, run_with_lock_retry
+
+DEFAULT_BATCH_SIZE = 1000
+IMPORT_JOB_TIMEOUT = 4 * 3600
+IMPORT_FILE_TYPES = (".csv", ".json", ".jsonl")
+
+
+class OpeningStockImport(Document):
+	def validate(self):
+		if os.path.splitext(self.import_file or "")[1].lower() not in IMPORT_FILE_TYPES:
+			frappe.throw(_("Import File must be a CSV, JSON or JSON Lines file."))
+		if cint(self.batch_size) <= 0:
+			self.batch_size = DEFAULT_BATCH_SIZE
+
+	@frappe.whitelist()
+	def start_import(self):
+		if self.status == "Completed":
+			frappe.throw(_("Opening Stock Import {0} has already been completed.").format(self.name))
+
+		self.db_set("status", "In Progress")
+		frappe.enqueue(
+			run_import,
+			queue="long",
+			timeout=IMPORT_JOB_TIMEOUT,
+			job_id=f"opening_stock_import::{self.name}",
+			deduplicate=True,
+			enqueue_after_commit=True,
+			import_name=self.name,
+		)
+
+
+def run_import(import_name):
+	"""Post the import file in chunks, committing each chunk with its log row.
+
+	A chunk that already has a successful log row is skipped, so running the import again
+	only retries the chunks that failed (or never ran).
+	"""
+	doc = frappe.get_doc("Opening Stock Import", import_name)
+	file_path = frappe.get_doc("File", {"file_url": doc.import_file}).get_full_path()
+	batch_size = cint(doc.batch_size) or DEFAULT_BATCH_SIZE
+
+	total_rows = sum(1 for _row in read_rows(file_path))
+	doc.db_set({"status": "In Progress", "total_rows": total_rows})
+	frappe.db.commit()
+
+	imported_chunks = set(
+		frappe.get_all(
+			"Opening Stock Import Log",
+			filters={"parenttype": doc.doctype, "parent": doc.name, "success": 1},
+			pluck="chunk_index",
+		)
+	)
+	masters = get_masters()
+
+	rows = read_rows(file_path)
+	chunk_index = 0
+	while chunk := list(islice(rows, batch_size)):
+		from_row = chunk_index * batch_size + 1
+		to_row = from_row + len(chunk) - 1
+		if chunk_index not in imported_chunks:
+			try:
+				run_with_lock_retry(import_chunk, doc, chunk, chunk_index, from_row, masters)
+				frappe.db.commit()
+			except Exception:
+				frappe.db.rollback()
+				log_chunk(doc, chunk_index, from_row, to_row, error=frappe.get_traceback(with_context=False))
+				frappe.db.commit()
+
+		frappe.publish_progress(
+			to_row * 100 / total_rows,
+			title=_("Importing Opening Stock"),
+			doctype=doc.doctype,
+			docname=doc.name,
+			description=_("Imported rows {0} to {1} of {2}").format(from_row, to_row, total_rows),
+		)
+		chunk_index += 1
+
+	update_import_status(doc)
+	frappe.db.commit()
+	doc.notify_update()
+
+
+def import_chunk(doc, chunk, chunk_index, from_row, masters):
+	sl_entries = [
+		get_sl_entry(doc, row, row_number, masters) for row_number, row in enumerate(chunk, start=from_row)
+	]
+	make_sl_entries(sl_entries)
+	log_chunk(doc, chunk_index, from_row, from_row + len(chunk) - 1)
+
+
+def get_masters():
+	"""Load the link targets once so rows are validated without a query each."""
+	return frappe._dict(
+		items=dict(frappe.db.sql("select name, unit_of_measure from `tabItem`")),
+		warehouses=set(frappe.get_all("Warehouse", pluck="name")),
+		uoms=set(frappe.get_all("UOM", pluck="name")),
+	)
+
+
+def get_sl_entry(doc, row, row_number, masters):
+	# JSON rows can hold numbers and nulls where CSV rows always hold strings
+	item_code = cstr(row.get("item_code")).strip()
+	warehouse = cstr(row.get("warehouse")).strip()
+	uom = cstr(row.get("uom")).strip()
+	qty = flt(row.get("qty"))
+
+	if item_code not in masters.items:
+		frappe.throw(_("Row {0}: Item {1} does not exist.").format(row_number, item_code))
+	if warehouse not in masters.warehouses:
+		frappe.throw(_("Row {0}: Warehouse {1} does not exist.").format(row_number, warehouse))
+	if uom and uom not in masters.uoms:
+		frappe.throw(_("Row {0}: UOM {1} does not exist.").format(row_number, uom))
+	if uom and masters.items[item_code] and uom != masters.items[item_code]:
+		frappe.throw(
+			_("Row {0}: UOM {1} is not the stock UOM {2} of item {3}.").format(
+				row_number, uom, masters.items[item_code], item_code
+			)
+		)
+	if qty <= 0:
+		frappe.throw(_("Row {0}: Quantity must be greater than zero.").format(row_number))
+
+	return {
+		"item_code": item_code,
+		"warehouse": warehouse,
+		"qty": qty,
+		"rate": flt(row.get("rate")),
+		"posting_date": doc.posting_date,
+		"voucher_type": doc.doctype,
+		"voucher_number": doc.name,
+		"voucher_detail_no": f"{doc.name}:{row_number}",
+	}
+
+
+def read_rows(file_path):
+	extension = os.path.splitext(file_path)[1].lower()
+	with open(file_path, newline="", encoding="utf-8-sig") as import_file:
+		if extension == ".csv":
+			yield from csv.DictReader(import_file)
+		elif extension == ".jsonl":
+			for line in import_file:
+				if line.strip():
+					yield json.loads(line)
+		else:
+			# a JSON array can only be parsed whole, JSON Lines files are streamed line by line
+			yield from json.load(import_file)
+
+
+def log_chunk(doc, chunk_index, from_row, to_row, error=None):
+	# a retried chunk replaces its earlier failure
+	frappe.db.delete(
+		"Opening Stock Import Log", {"parenttype": doc.doctype, "parent": doc.name, "chunk_index": chunk_index}
+	)
+	frappe.get_doc({
+		"doctype": "Opening Stock Import Log",
+		"parenttype": doc.doctype,
+		"parent": doc.name,
+		"parentfield": "import_log",
+		"idx": chunk_index + 1,
+		"chunk_index": chunk_index,
+		"from_row": from_row,
+		"to_row": to_row,
+		"success": 0 if error else 1,
+		"error": error,
+	}).db_insert()
+
+
+def update_import_status(doc):
+	logs = frappe.get_all(
+		"Opening Stock Import Log",
+		filters={"parenttype": doc.doctype, "parent": doc.name},
+		fields=["from_row", "to_row", "success"],
+	)
+	imported_rows = sum(log.to_row - log.from_row + 1 for log in logs if log.success)
+	failed = any(not log.success for log in logs)
+	doc.db_set({
+		"imported_rows": imported_rows,
+		"status": "Partially Completed" if failed else "Completed",
+	})
@@ -0,0 +1,90 @@
+# Copyright (c) 2024, Poorvi Solutions and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from inventory_management.inventory_management.doctype.opening_stock_import.opening_stock_import import (
+	get_masters,
+	get_sl_entry,
+	run_import,
+)
+from inventory_management.inventory_management.master_cache import clear_items
+from inventory_management.inventory_management.stock_projection import get_projection_key
+
+TEST_ITEM = "_Test Opening Item"
+TEST_WAREHOUSE = "_Test Opening Warehouse"
+
+
+class TestOpeningStockImport(FrappeTestCase):
+	def setUp(self):
+		if not frappe.db.exists("Warehouse", TEST_WAREHOUSE):
+			frappe.get_doc({"doctype": "Warehouse", "warehouse_name": TEST_WAREHOUSE}).insert()
+		if not frappe.db.exists("Item", TEST_ITEM):
+			frappe.get_doc({"doctype": "Item", "item_code": TEST_ITEM, "item_name": TEST_ITEM}).insert()
+
+	def test_json_rows_take_numbers_and_report_bad_rows(self):
+		opening_import = frappe.get_doc(
+			{"doctype": "Opening Stock Import", "import_file": "/private/files/opening_stock.jsonl"}
+		)
+		masters = get_masters()
+
+		sle = get_sl_entry(
+			opening_import, {"item_code": TEST_ITEM, "warehouse": TEST_WAREHOUSE, "qty": 10, "rate": 5.5}, 1, masters
+		)
+		self.assertEqual(
+			(sle["item_code"], sle["warehouse"], sle["qty"], sle["rate"]), (TEST_ITEM, TEST_WAREHOUSE, 10, 5.5)
+		)
+
+		with self.assertRaisesRegex(frappe.ValidationError, "Row 2"):
+			get_sl_entry(opening_import, {"item_code": TEST_ITEM, "warehouse": None, "qty": 1}, 2, masters)
+
+	def test_failed_chunk_does_not_block_or_repeat_the_others(self):
+		content = "\n".join([
+			"item_code,warehouse,qty,rate",
+			f"{TEST_ITEM},{TEST_WAREHOUSE},10,5",
+			f"{TEST_ITEM},{TEST_WAREHOUSE},5,5",
+			f"_Test Missing Item,{TEST_WAREHOUSE},1,5",
+			f"{TEST_ITEM},{TEST_WAREHOUSE},1,5",
+		])
+		import_file = frappe.get_doc(
+			{"doctype": "File", "file_name": "opening_stock.csv", "content": content, "is_private": 1}
+		).insert()
+		opening_import = frappe.get_doc({
+			"doctype": "Opening Stock Import",
+			"import_file": import_file.file_url,
+			"batch_size": 2,
+		}).insert()
+		self.addCleanup(delete_import, opening_import.name, import_file.name)
+
+		# the second run retries only the failed chunk, which still fails
+		for _ in range(2):
+			run_import(opening_import.name)
+
+		opening_import.reload()
+		self.assertEqual(opening_import.status, "Partially Completed")
+		self.assertEqual(opening_import.imported_rows, 2)
+		self.assertEqual(
+			[log.success for log in sorted(opening_import.import_log, key=lambda log: log.chunk_index)], [1, 0]
+		)
+		self.assertEqual(
+			frappe.db.count(
+				"Stock Ledger Entry", {"voucher_type": "Opening Stock Import", "voucher_number": opening_import.name}
+			),
+			2,
+		)
+
+
+def delete_import(import_name, file_name):
+	# the import commits its chunks and the fixtures with them, so all of it is taken out by hand
+	frappe.db.delete("Stock Ledger Entry", {"voucher_type": "Opening Stock Import", "voucher_number": import_name})
+	frappe.db.delete("Bin", {"item_code": TEST_ITEM})
+	frappe.delete_doc("Opening Stock Import", import_name, force=True)
+	frappe.delete_doc("File", file_name, force=True, ignore_permissions=True)
+	# the item's stock total goes with the item
+	frappe.db.delete("Item", TEST_ITEM)
+	frappe.db.delete("Warehouse", TEST_WAREHOUSE)
+	frappe.db.commit()
+
+	clear_items([TEST_ITEM])
+	frappe.cache.delete(get_projection_key(TEST_ITEM))
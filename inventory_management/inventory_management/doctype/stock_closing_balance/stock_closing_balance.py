@@ -0,0 +1,337 @@
+# Copyright (c) 2024, Poorvi Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, flt, get_first_day, get_last_day, getdate, now, today
+
+from inventory_management.inventory_management.doctype.warehouse.warehouse import get_warehouse_condition
+from inventory_management.inventory_management.utils import bulk_update_by_name
+
+SNAPSHOT_RETENTION_DAYS = 35
+REBUILD_CHUNK_SIZE = 500
+
+
+class StockClosingBalance(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_unique(
+		"Stock Closing Balance", ["item_code", "warehouse", "closing_date"], constraint_name="unique_item_warehouse_date"
+	)
+	frappe.db.add_index("Stock Closing Balance", ["closing_date", "is_stale"])
+
+
+def make_daily_snapshot():
+	closing_date = getdate(add_days(today(), -1))
+	snapshot_type = "Month End" if closing_date == getdate(get_last_day(closing_date)) else "Daily"
+	make_snapshot(closing_date, snapshot_type)
+
+
+def make_month_end_snapshot():
+	closing_date = getdate(add_days(get_first_day(today()), -1))
+	if snapshot_exists(closing_date):
+		frappe.db.sql(
+			"update `tabStock Closing Balance` set snapshot_type = 'Month End' where closing_date = %s",
+			closing_date,
+		)
+	else:
+		make_snapshot(closing_date, "Month End")
+
+	prune_daily_snapshots()
+
+
+def make_snapshot(closing_date, snapshot_type="Daily"):
+	"""Store the closing qty/value of every (item, warehouse) as of ``closing_date``.
+
+	Starts from the previous snapshot, so only the ledger rows since then are read.
+	"""
+	closing_date = getdate(closing_date)
+	if snapshot_exists(closing_date):
+		return
+
+	timestamp, user = now(), frappe.session.user
+	frappe.db.bulk_insert(
+		"Stock Closing Balance",
+		fields=[
+			"name", "creation", "modified", "owner", "modified_by",
+			"item_code", "warehouse", "closing_date", "snapshot_type",
+			"actual_qty", "stock_value", "valuation_rate",
+		],
+		values=[
+			(
+				frappe.generate_hash(length=10), timestamp, timestamp, user, user,
+				item_code, warehouse, closing_date, snapshot_type,
+				qty, value, value / qty if qty else 0,
+			)
+			for (item_code, warehouse), (qty, value) in get_stock_balance_as_of(closing_date).items()
+			if flt(qty, 6) or flt(value, 2)
+		],
+	)
+
+
+def prune_daily_snapshots():
+	frappe.db.sql(
+		"""
+		delete from `tabStock Closing Balance`
+		where snapshot_type = 'Daily' and closing_date < %s
+		""",
+		add_days(today(), -SNAPSHOT_RETENTION_DAYS),
+	)
+
+
+def snapshot_exists(closing_date):
+	return bool(frappe.db.exists("Stock Closing Balance", {"closing_date": closing_date}))
+
+
+def get_snapshot_date(posting_date, item_code=None, warehouse=None):
+	"""Return the latest snapshot on or before ``posting_date`` with no stale rows in scope."""
+	conditions, values = get_conditions("Stock Closing Balance", item_code, warehouse)
+	values["posting_date"] = posting_date
+	snapshot = frappe.db.sql(
+		f"""
+		select closing_date
+		from `tabStock Closing Balance`
+		where closing_date <= %(posting_date)s {conditions}
+		group by closing_date
+		having max(is_stale) = 0
+		order by closing_date desc
+		limit 1
+		""",
+		values,
+	)
+	return snapshot[0][0] if snapshot else None
+
+
+@frappe.whitelist()
+def get_stock_balance(item_code, warehouse, posting_date=None):
+	# a group warehouse returns the total of the warehouses under it
+	balances = get_stock_balance_as_of(posting_date or today(), item_code, warehouse).values()
+	return {
+		"actual_qty": sum(qty for qty, _value in balances),
+		"stock_value": sum(value for _qty, value in balances),
+	}
+
+
+def get_stock_balance_as_of(posting_date, item_code=None, warehouse=None):
+	"""Return ``{(item_code, warehouse): (qty, value)}`` as of the end of ``posting_date``.
+
+	``warehouse`` may be a group, in which case every warehouse under it is returned.
+	"""
+	conditions, values = get_conditions("Stock Closing Balance", item_code, warehouse)
+	values["posting_date"] = posting_date
+	values["snapshot_date"] = get_snapshot_date(posting_date, item_code, warehouse)
+
+	balances = {}
+	if values["snapshot_date"]:
+		for row in frappe.db.sql(
+			f"""
+			select item_code, warehouse, actual_qty, stock_value
+			from `tabStock Closing Balance`
+			where closing_date = %(snapshot_date)s {conditions}
+			""",
+			values,
+			as_dict=True,
+		):
+			balances[(row.item_code, row.warehouse)] = [flt(row.actual_qty), flt(row.stock_value)]
+
+	tail_condition = "and posting_date > %(snapshot_date)s" if values["snapshot_date"] else ""
+	conditions, _values = get_conditions("Stock Ledger Entry", item_code, warehouse)
+	for row in frappe.db.sql(
+		f"""
+		select item_code, warehouse, sum(actual_qty) as qty, sum(stock_value_difference) as value
+		from `tabStock Ledger Entry`
+		where is_cancelled = 0 and posting_date <= %(posting_date)s {tail_condition} {conditions}
+		group by item_code, warehouse
+		""",
+		values,
+		as_dict=True,
+	):
+		balance = balances.setdefault((row.item_code, row.warehouse), [0.0, 0.0])
+		balance[0] += flt(row.qty)
+		balance[1] += flt(row.value)
+
+	return {key: tuple(balance) for key, balance in balances.items()}
+
+
+def get_conditions(doctype, item_code=None, warehouse=None):
+	conditions, values = [], {}
+	if item_code:
+		conditions.append("and item_code = %(item_code)s")
+		values["item_code"] = item_code
+	if warehouse:
+		conditions.append(f"and {get_warehouse_condition(warehouse, f'`tab{doctype}`.warehouse')}")
+
+	return " ".join(conditions), values
+
+
+def invalidate_snapshots(posting_dates):
+	"""Mark the snapshots after a backdated posting as stale and queue their rebuild.
+
+	``posting_dates`` maps (item_code, warehouse) to the earliest posting date of the batch.
+	Every snapshot on or after that date gets a stale row for the key, so a snapshot never
+	silently reads as zero for a key it has not seen yet.
+	"""
+	latest = frappe.db.sql("select max(closing_date) from `tabStock Closing Balance`")[0][0]
+	if not latest:
+		return
+
+	affected = {key: getdate(date) for key, date in posting_dates.items() if getdate(date) <= latest}
+	if not affected:
+		return
+
+	snapshot_types = dict(
+		frappe.db.sql(
+			"""
+			select closing_date, max(snapshot_type)
+			from `tabStock Closing Balance`
+			where closing_date >= %s
+			group by closing_date
+			""",
+			min(affected.values()),
+		)
+	)
+
+	keys = sorted(affected)
+	for start in range(0, len(keys), REBUILD_CHUNK_SIZE):
+		chunk = keys[start : start + REBUILD_CHUNK_SIZE]
+		frappe.db.sql(
+			"""
+			update `tabStock Closing Balance` set is_stale = 1
+			where {conditions}
+			""".format(
+				conditions=" or ".join(["(item_code = %s and warehouse = %s and closing_date >= %s)"] * len(chunk))
+			),
+			[value for key in chunk for value in (*key, affected[key])],
+		)
+
+	timestamp, user = now(), frappe.session.user
+	frappe.db.bulk_insert(
+		"Stock Closing Balance",
+		fields=[
+			"name", "creation", "modified", "owner", "modified_by",
+			"item_code", "warehouse", "closing_date", "snapshot_type", "is_stale",
+		],
+		values=[
+			(
+				frappe.generate_hash(length=10), timestamp, timestamp, user, user,
+				*key, closing_date, snapshot_type, 1,
+			)
+			for key in keys
+			for closing_date, snapshot_type in snapshot_types.items()
+			if closing_date >= affected[key]
+		],
+		ignore_duplicates=True,
+	)
+
+	frappe.enqueue(
+		rebuild_stale_snapshots,
+		queue="long",
+		job_id="rebuild_stale_snapshots",
+		deduplicate=True,
+		enqueue_after_commit=True,
+	)
+
+
+def rebuild_stale_snapshots():
+	"""Recompute stale snapshot rows key by key, reading only the ledger rows after each key's last valid snapshot."""
+	while True:
+		stale = frappe.db.sql(
+			"""
+			select item_code, warehouse, min(closing_date)
+			from `tabStock Closing Balance`
+			where is_stale = 1
+			group by item_code, warehouse
+			order by item_code, warehouse
+			limit %s
+			""",
+			REBUILD_CHUNK_SIZE,
+		)
+		if not stale:
+			break
+
+		rebuild_snapshot_rows({(item_code, warehouse): from_date for item_code, warehouse, from_date in stale})
+		frappe.db.commit()
+
+
+def rebuild_snapshot_rows(stale_from):
+	from inventory_management.inventory_management.doctype.bin.bin import get_bins
+
+	keys = sorted(stale_from)
+	# lock the bins like a posting would, so no posting can mark these rows stale mid-rebuild
+	get_bins(keys, for_update=True)
+
+	key_values = [value for key in keys for value in key]
+	key_placeholders = ", ".join(["(%s, %s)"] * len(keys))
+
+	base = {}
+	for row in frappe.db.sql(
+		f"""
+		select item_code, warehouse, closing_date, actual_qty, stock_value
+		from `tabStock Closing Balance`
+		where is_stale = 0 and (item_code, warehouse) in ({key_placeholders})
+		""",
+		key_values,
+		as_dict=True,
+	):
+		key = (row.item_code, row.warehouse)
+		if row.closing_date < stale_from[key] and (key not in base or row.closing_date > base[key].closing_date):
+			base[key] = row
+
+	stale_rows = frappe.db.sql(
+		f"""
+		select name, item_code, warehouse, closing_date
+		from `tabStock Closing Balance`
+		where is_stale = 1 and (item_code, warehouse) in ({key_placeholders})
+		order by closing_date
+		""",
+		key_values,
+		as_dict=True,
+	)
+	if not stale_rows:
+		return
+
+	start_date = min(row.closing_date for row in base.values()) if len(base) == len(keys) else None
+	movements = {}
+	for row in frappe.db.sql(
+		"""
+		select item_code, warehouse, posting_date, sum(actual_qty) as qty, sum(stock_value_difference) as value
+		from `tabStock Ledger Entry`
+		where is_cancelled = 0 and (item_code, warehouse) in ({keys}) and posting_date <= %s {start_condition}
+		group by item_code, warehouse, posting_date
+		order by posting_date
+		""".format(keys=key_placeholders, start_condition="and posting_date > %s" if start_date else ""),
+		key_values + [stale_rows[-1].closing_date] + ([start_date] if start_date else []),
+		as_dict=True,
+	):
+		movements.setdefault((row.item_code, row.warehouse), []).append(row)
+
+	state = {}
+	for key in keys:
+		base_row = base.get(key)
+		state[key] = {
+			"qty": flt(base_row.actual_qty) if base_row else 0.0,
+			"value": flt(base_row.stock_value) if base_row else 0.0,
+			"movements": [m for m in movements.get(key, []) if not base_row or m.posting_date > base_row.closing_date],
+			"position": 0,
+		}
+
+	updates = {}
+	for row in stale_rows:
+		key_state = state[(row.item_code, row.warehouse)]
+		key_movements = key_state["movements"]
+		while key_state["position"] < len(key_movements) and key_movements[key_state["position"]].posting_date <= row.closing_date:
+			key_state["qty"] += flt(key_movements[key_state["position"]].qty)
+			key_state["value"] += flt(key_movements[key_state["position"]].value)
+			key_state["position"] += 1
+
+		qty, value = key_state["qty"], key_state["value"]
+		updates[row.name] = {
+			"actual_qty": qty,
+			"stock_value": value,
+			"valuation_rate": value / qty if qty else 0,
+			"is_stale": 0,
+		}
+
+	bulk_update_by_name("Stock Closing Balance", updates)
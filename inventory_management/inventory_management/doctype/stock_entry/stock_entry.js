@@ -1,8 +1,27 @@
 // Copyright (c) 2024, Poorvi Solutions and contributors
 // For license information, please see license.txt
 
-// frappe.ui.form.on("Stock Entry", {
-// 	refresh(frm) {
+frappe.ui.form.on("Stock Entry", {
+	setup(frm) {
+		frappe.realtime.on("stock_posting_status", (data) => {
+			if (data.voucher_type === frm.doctype && data.voucher_number === frm.docname) {
+				frm.reload_doc();
+			}
+		});
+	},
 
-// 	},
-// });
+	refresh(frm) {
+		if (frm.doc.docstatus !== 1) {
+			return;
+		}
+
+		if (["Queued", "Processing"].includes(frm.doc.posting_status)) {
+			frm.set_intro(__("The stock ledger is being posted in the background."), "blue");
+		} else if (frm.doc.posting_status === "Failed") {
+			frm.set_intro(__("Posting the stock ledger failed, see the Error Log for details."), "red");
+			frm.add_custom_button(__("Retry Posting"), () => {
+				frm.call("retry_posting").then(() => frm.reload_doc());
+			});
+		}
+	},
+});
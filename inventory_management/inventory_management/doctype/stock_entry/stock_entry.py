@@ -2,12 +2,40 @@ import frappe
 from frappe.model.document import Document
 from frappe.utils import today, flt
 from frappe import _
+from inventory_management.inventory_management.profiling import profiled
+from inventory_management.inventory_management.stock_ledger import (
+    LARGE_VOUCHER_ROWS,
+    enqueue_posting,
+    make_sl_entries,
+    reverse_sl_entries,
+    set_stock_qty,
+    validate_posting_finished,
+    validate_warehouse,
+)
+from inventory_management.inventory_management.doctype.stock_reservation.stock_reservation import (
+    consume,
+    unconsume,
+    validate_unreserved_stock,
+)
 
 class StockEntry(Document):
     def validate(self):
         self.calculate_totals()
+        set_stock_qty(self.get('stock_entry_details'))
         if not self.get('stock_entry_details'):
             frappe.throw(_("At least one item must be entered in the stock entry details."))
+        self.validate_transfer_warehouses()
+        self.validate_reservations()
+        if self.stock_entry_type != "Receive":
+            # checked again with the bins locked when the entry is posted
+            validate_unreserved_stock(
+                [
+                    {"item_code": item.item_code, "warehouse": item.from_warehouse, "qty": -flt(item.stock_qty)}
+                    for item in self.get('stock_entry_details')
+                    if item.from_warehouse
+                ],
+                self.get_reserved_qty(),
+            )
 
     def calculate_totals(self):
         total_quantity = 0.0
@@ -20,94 +48,104 @@ class StockEntry(Document):
         self.total_quantity = total_quantity
         self.total_rate1 = total_rate1
 
+    def validate_transfer_warehouses(self):
+        if self.stock_entry_type != "Transfer":
+            return
+        for item in self.get('stock_entry_details'):
+            if not item.from_warehouse or not item.to_warehouse:
+                frappe.throw(_("Row {0}: A transfer needs both a From and a To Warehouse.").format(item.idx))
+            if item.from_warehouse == item.to_warehouse:
+                frappe.throw(_("Row {0}: From and To Warehouse must be different.").format(item.idx))
+
+    def validate_reservations(self):
+        for item in self.get('stock_entry_details'):
+            if not item.stock_reservation:
+                continue
+            if self.stock_entry_type == "Receive":
+                frappe.throw(_("Row {0}: Only outgoing stock can ship a Stock Reservation.").format(item.idx))
+
+            reservation = frappe.get_doc("Stock Reservation", item.stock_reservation)
+            if (reservation.item_code, reservation.warehouse) != (item.item_code, item.from_warehouse):
+                frappe.throw(
+                    _("Row {0}: Stock Reservation {1} is for item {2} in warehouse {3}.").format(
+                        item.idx, reservation.name, reservation.item_code, reservation.warehouse
+                    )
+                )
+            if self.docstatus == 1 and flt(item.stock_qty) > flt(reservation.get_remaining_qty(), 9):
+                frappe.throw(
+                    _("Row {0}: Stock Reservation {1} has only {2} left.").format(
+                        item.idx, reservation.name, reservation.get_remaining_qty()
+                    )
+                )
+
+    def get_reserved_qty(self):
+        reserved = {}
+        for item in self.get('stock_entry_details'):
+            if item.stock_reservation:
+                key = (item.item_code, item.from_warehouse)
+                reserved[key] = reserved.get(key, 0) + flt(item.stock_qty)
+        return reserved
+
+    @profiled("Stock Entry.on_submit")
     def on_submit(self):
+        if len(self.get('stock_entry_details')) > LARGE_VOUCHER_ROWS:
+            enqueue_posting(self, "process_stock_entries")
+            return
+
         self.process_stock_entries()
+        self.db_set("posting_status", "Completed")
         frappe.msgprint(_("Stock Ledger Entries have been created."))
 
+    @frappe.whitelist()
+    def retry_posting(self):
+        if self.docstatus == 1 and self.posting_status == "Failed":
+            enqueue_posting(self, "process_stock_entries")
+
     def process_stock_entries(self):
+        sl_entries = self.get_sl_entries()
+        # locks the bins of the entry, then ships its reservations out of the reserved stock
+        validate_unreserved_stock(sl_entries, self.get_reserved_qty(), for_update=True)
         for item in self.get('stock_entry_details'):
-            flow = "in" if self.stock_entry_type == "Receive" else "out"
-            entry = self.update_stock_ledger(item, flow)
-            if entry:
-                self.update_moving_average(item.item_code, item.to_warehouse if flow == "in" else item.from_warehouse)
-
-    def update_stock_ledger(self, item, flow):
-        return self._update_stock_ledger_entry(item, flow)
-
-    def update_moving_average(self, item_code, warehouse):
-        StockLedgerEntry = frappe.qb.DocType("Stock Ledger Entry")
-
-        stock_entries = (
-            frappe.qb.from_(StockLedgerEntry)
-            .select(StockLedgerEntry.quantity, StockLedgerEntry.rate)
-            .where(
-                (StockLedgerEntry.item_code == item_code) &
-                (StockLedgerEntry.warehouse == warehouse)
-            )
-        ).run(as_dict=True)
-        
-        total_qty = sum(flt(entry['quantity']) for entry in stock_entries)
-        total_value = sum(flt(entry['quantity']) * flt(entry['rate']) for entry in stock_entries)
-        
-        new_avg_rate = total_value / total_qty if total_qty else 0
-        
-        frappe.db.set_value("Item", item_code, "moving_average_rate", new_avg_rate)
+            if item.stock_reservation:
+                consume(item.stock_reservation, flt(item.stock_qty))
+        return make_sl_entries(sl_entries)
 
-    def on_cancel(self):
+    def get_sl_entries(self):
+        if self.stock_entry_type == "Receive":
+            return [self.get_sl_entry(item, "in") for item in self.get('stock_entry_details')]
+
+        sl_entries = []
         for item in self.get('stock_entry_details'):
-            if self.stock_entry_type == "Receive":
-                if not item.get('to_warehouse'):
-                    frappe.throw(_("Warehouse not specified for item code {0} on cancellation of Receive type entry").format(item.item_code))
-                self.update_stock_ledger(item, "out")
-            elif self.stock_entry_type == "Transfer":
-                if not item.get('from_warehouse'):
-                    frappe.throw(_("Warehouse not specified for item code {0} on cancellation of Transfer type entry").format(item.item_code))
-                self.update_stock_ledger(item, "in")
-
-    def _update_stock_ledger_entry(self, item, flow, warehouse=None):
-        item_quantity = flt(item.quantity)
-        item_price = flt(item.item_price)
+            sl_entries.append(self.get_sl_entry(item, "out"))
+            if self.stock_entry_type == "Transfer":
+                # both legs are posted in one batch, the destination at the value the source gave up
+                sl_entries.append({**self.get_sl_entry(item, "in"), "rate_from_row": len(sl_entries) - 1})
+        return sl_entries
+
+    def get_sl_entry(self, item, flow, warehouse=None):
         warehouse = warehouse or (item.to_warehouse if flow == "in" else item.from_warehouse)
+        validate_warehouse(item.item_code, warehouse, flow)
 
-        if not warehouse:
-            frappe.throw(_("Warehouse not specified for item code {0} in flow {1}").format(item.item_code, flow))
+        # posted in the stock UOM, with the price of one UOM spread over the stock units it holds
+        stock_qty = flt(item.stock_qty)
+        return {
+            "item_code": item.item_code,
+            "warehouse": warehouse,
+            "qty": stock_qty if flow == "in" else -stock_qty,
+            "rate": flt(item.item_price) / (flt(item.conversion_factor) or 1),
+            "posting_date": self.posting_date,
+            "voucher_type": self.doctype,
+            "voucher_number": self.name,
+            "voucher_detail_no": item.name,
+        }
 
-        new_qty = item_quantity if flow == "in" else -item_quantity
-        StockLedgerEntry = frappe.qb.DocType("Stock Ledger Entry")
+    def before_cancel(self):
+        validate_posting_finished(self)
 
-        existing_entry = (
-            frappe.qb.from_(StockLedgerEntry)
-            .select(StockLedgerEntry.name, StockLedgerEntry.quantity, StockLedgerEntry.rate)
-            .where(
-                (StockLedgerEntry.item_code == item.item_code) &
-                (StockLedgerEntry.warehouse == warehouse)
-            )
-        ).run(as_dict=True)
-
-        if existing_entry:
-            ledger_entry = frappe.get_doc("Stock Ledger Entry", existing_entry[0]['name'])
-            existing_quantity = flt(existing_entry[0]['quantity'])
-            existing_rate = flt(existing_entry[0]['rate']) if existing_entry[0]['rate'] else item_price
-
-            if flow == "in":
-                new_total_qty = existing_quantity + new_qty
-                new_total_value = (existing_quantity * existing_rate) + (new_qty * item_price)
-                new_avg_rate = new_total_value / new_total_qty if new_total_qty else 0.0
-                ledger_entry.rate = new_avg_rate
-            else:
-                ledger_entry.rate = existing_rate  
-            
-            ledger_entry.quantity = existing_quantity + new_qty
-            ledger_entry.posting_date = self.posting_date
-            ledger_entry.save()
-            return ledger_entry
-        else:
-            ledger_entry = frappe.new_doc("Stock Ledger Entry")
-            ledger_entry.item_code = item.item_code
-            ledger_entry.warehouse = warehouse
-            ledger_entry.quantity = new_qty
-            ledger_entry.posting_date = self.posting_date
-            ledger_entry.rate = item_price  # initial rate for the first entry
-            ledger_entry.voucher_number = self.name
-            ledger_entry.insert()
-            return ledger_entry
+    @profiled("Stock Entry.on_cancel")
+    def on_cancel(self):
+        # an entry whose posting failed never consumed its reservations
+        if reverse_sl_entries(self.doctype, self.name):
+            for item in self.get('stock_entry_details'):
+                if item.stock_reservation:
+                    unconsume(item.stock_reservation, flt(item.stock_qty))
@@ -1,9 +1,302 @@
 # Copyright (c) 2024, Poorvi Solutions and Contributors
 # See license.txt
 
-# import frappe
+import multiprocessing
+import random
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import flt, today
+
+from inventory_management.inventory_management.doctype.stock_reservation.stock_reservation import (
+	InsufficientStockError,
+)
+from inventory_management.inventory_management.master_cache import clear_items
+from inventory_management.inventory_management.stock_ledger import post_voucher, run_with_lock_retry
+from inventory_management.inventory_management.stock_projection import get_projection_key
+
+TEST_WAREHOUSE = "_Test Stock Entry Warehouse"
+TEST_TRANSFER_WAREHOUSE = "_Test Stock Entry Transfer Warehouse"
+TEST_FIFO_ITEM_GROUP = "_Test Stock Entry FIFO Item Group"
+STRESS_PREFIX = "_Test Stress"
+STRESS_WORKERS = 4
+STRESS_ENTRIES_PER_WORKER = 10
 
 
 class TestStockEntry(FrappeTestCase):
-	pass
+	def test_concurrent_postings_add_up(self):
+		items = [f"{STRESS_PREFIX} Item {idx}" for idx in range(3)]
+		warehouses = [f"{STRESS_PREFIX} Warehouse {idx}" for idx in range(2)]
+		make_stress_fixtures(items, warehouses)
+		self.addCleanup(delete_stress_data, items, warehouses)
+
+		context = multiprocessing.get_context("spawn")
+		with context.Pool(STRESS_WORKERS) as pool:
+			results = pool.starmap(
+				post_stress_entries,
+				[
+					(frappe.local.site, frappe.local.sites_path, seed, items, warehouses)
+					for seed in range(STRESS_WORKERS)
+				],
+			)
+
+		expected = {}
+		for posted in results:
+			for key, qty in posted:
+				expected[tuple(key)] = expected.get(tuple(key), 0) + qty
+
+		for (item_code, warehouse), qty in expected.items():
+			bin_qty = frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse}, "actual_qty")
+			ledger_qty = frappe.db.sql(
+				"""select sum(actual_qty) from `tabStock Ledger Entry`
+				where item_code = %s and warehouse = %s""",
+				(item_code, warehouse),
+			)[0][0]
+			self.assertAlmostEqual(flt(bin_qty), qty)
+			self.assertAlmostEqual(flt(ledger_qty), qty)
+
+	def test_rerun_posting_job_does_not_double_post(self):
+		items = [make_item() for _ in range(2)]
+		make_warehouses([TEST_WAREHOUSE])
+		stock_entry = make_voucher(
+			"Receive", [{"item_code": item_code, "warehouse": TEST_WAREHOUSE, "quantity": 5} for item_code in items]
+		)
+
+		# a job that is retried after it already posted must leave the ledger alone; its
+		# commits are left out, so the test transaction is still rolled back
+		with patch.object(frappe.db, "commit"):
+			for _ in range(2):
+				stock_entry.db_set("posting_status", "Queued")
+				post_voucher(stock_entry.doctype, stock_entry.name, "process_stock_entries")
+
+		self.assertEqual(frappe.db.get_value("Stock Entry", stock_entry.name, "posting_status"), "Completed")
+		self.assertEqual(
+			frappe.db.count("Stock Ledger Entry", {"voucher_type": "Stock Entry", "voucher_number": stock_entry.name}),
+			len(items),
+		)
+
+	def test_transfer_moves_stock_at_the_source_rate(self):
+		item_code = make_item()
+		make_warehouses([TEST_WAREHOUSE, TEST_TRANSFER_WAREHOUSE])
+
+		for qty, rate in ((10, 10), (10, 20)):
+			make_stock_entry("Receive", item_code, qty, rate, to_warehouse=TEST_WAREHOUSE)
+		transfer = make_stock_entry(
+			"Transfer", item_code, 5, 1, from_warehouse=TEST_WAREHOUSE, to_warehouse=TEST_TRANSFER_WAREHOUSE
+		)
+
+		self.assertEqual(get_bin(item_code, TEST_WAREHOUSE), (15, 225))
+		self.assertEqual(get_bin(item_code, TEST_TRANSFER_WAREHOUSE), (5, 75))
+
+		transfer.cancel()
+		self.assertEqual(get_bin(item_code, TEST_WAREHOUSE), (20, 300))
+		self.assertEqual(get_bin(item_code, TEST_TRANSFER_WAREHOUSE), (0, 0))
+
+	def test_fifo_transfer_moves_the_layers_it_takes(self):
+		if not frappe.db.exists("Item Group", TEST_FIFO_ITEM_GROUP):
+			frappe.get_doc(
+				{"doctype": "Item Group", "item_group": TEST_FIFO_ITEM_GROUP, "valuation_method": "FIFO"}
+			).insert()
+		item_code = make_item(item_group=TEST_FIFO_ITEM_GROUP)
+		make_warehouses([TEST_WAREHOUSE, TEST_TRANSFER_WAREHOUSE])
+
+		for qty, rate in ((10, 10), (10, 20)):
+			make_stock_entry("Receive", item_code, qty, rate, to_warehouse=TEST_WAREHOUSE)
+		transfer = make_stock_entry(
+			"Transfer", item_code, 15, 1, from_warehouse=TEST_WAREHOUSE, to_warehouse=TEST_TRANSFER_WAREHOUSE
+		)
+
+		# all of the layer at 10 and a third of the one at 20 move, at what they were worth
+		self.assertEqual(get_bin(item_code, TEST_WAREHOUSE), (5, 100))
+		self.assertEqual(get_bin(item_code, TEST_TRANSFER_WAREHOUSE), (15, 200))
+		in_leg_rate = frappe.db.get_value(
+			"Stock Ledger Entry",
+			{"voucher_number": transfer.name, "warehouse": TEST_TRANSFER_WAREHOUSE, "is_cancelled": 0},
+			"rate",
+		)
+		self.assertAlmostEqual(flt(in_leg_rate), 200 / 15)
+
+		transfer.cancel()
+		self.assertEqual(get_bin(item_code, TEST_WAREHOUSE), (20, 300))
+		self.assertEqual(get_bin(item_code, TEST_TRANSFER_WAREHOUSE), (0, 0))
+
+	def test_quantities_are_posted_in_the_stock_uom(self):
+		for uom in ("_Test Unit", "_Test Box", "_Test Pallet"):
+			if not frappe.db.exists("UOM", uom):
+				frappe.get_doc({"doctype": "UOM", "uom": uom}).insert()
+		item_code = make_item(unit_of_measure="_Test Unit", uoms=[{"uom": "_Test Box", "conversion_factor": 12}])
+		make_warehouses([TEST_WAREHOUSE])
+
+		stock_entry = frappe.get_doc({
+			"doctype": "Stock Entry",
+			"stock_entry_type": "Receive",
+			"posting_date": today(),
+			"stock_entry_details": [
+				{"item_code": item_code, "to_warehouse": TEST_WAREHOUSE, "quantity": 2, "uom": "_Test Box", "item_price": 120},
+				{"item_code": item_code, "to_warehouse": TEST_WAREHOUSE, "quantity": 6, "item_price": 10},
+			],
+		}).submit()
+
+		self.assertEqual([row.stock_qty for row in stock_entry.stock_entry_details], [24, 6])
+		ledger = frappe.get_all(
+			"Stock Ledger Entry",
+			filters={"voucher_type": "Stock Entry", "voucher_number": stock_entry.name},
+			fields=["actual_qty", "rate"],
+		)
+		# the ledger moves the stock qty, at the price of one stock unit
+		self.assertEqual(sorted((flt(row.actual_qty), flt(row.rate)) for row in ledger), [(6, 10), (24, 10)])
+		self.assertEqual(get_bin(item_code, TEST_WAREHOUSE), (30, 300))
+
+		stock_entry = frappe.get_doc({
+			"doctype": "Stock Entry",
+			"stock_entry_type": "Receive",
+			"posting_date": today(),
+			"stock_entry_details": [
+				{"item_code": item_code, "to_warehouse": TEST_WAREHOUSE, "quantity": 1, "uom": "_Test Pallet"}
+			],
+		})
+		self.assertRaises(frappe.ValidationError, stock_entry.insert)
+
+
+def get_bin(item_code, warehouse):
+	actual_qty, stock_value = frappe.db.get_value(
+		"Bin", {"item_code": item_code, "warehouse": warehouse}, ["actual_qty", "stock_value"]
+	)
+	return flt(actual_qty, 6), flt(stock_value, 6)
+
+
+def post_stress_entries(site, sites_path, seed, items, warehouses):
+	"""Submit random receipts, issues and reconciliations against a few keys from a separate process."""
+	frappe.init(site=site, sites_path=sites_path)
+	frappe.connect()
+	frappe.set_user("Administrator")
+
+	rng = random.Random(seed)
+	posted = []
+	try:
+		for _ in range(STRESS_ENTRIES_PER_WORKER):
+			voucher_type = rng.choice(["Receive", "Issue", "Stock Reconciliation"])
+			rows = [
+				{
+					"item_code": rng.choice(items),
+					"warehouse": rng.choice(warehouses),
+					"quantity": rng.randint(1, 20),
+				}
+				for _ in range(rng.randint(1, 5))
+			]
+			try:
+				run_with_lock_retry(submit_stress_voucher, voucher_type, rows)
+			except InsufficientStockError:
+				# an issue of more than is in stock is rejected and posts nothing
+				frappe.db.rollback()
+				continue
+			sign = -1 if voucher_type == "Issue" else 1
+			posted.extend(((row["item_code"], row["warehouse"]), sign * row["quantity"]) for row in rows)
+	finally:
+		frappe.destroy()
+
+	return posted
+
+
+def submit_stress_voucher(voucher_type, rows):
+	doc = make_voucher(voucher_type, rows)
+	frappe.db.commit()
+	return doc
+
+
+def make_voucher(voucher_type, rows):
+	if voucher_type == "Stock Reconciliation":
+		return frappe.get_doc({
+			"doctype": "Stock Reconciliation",
+			"purpose": "Stock Reconciliation",
+			"posting_date": today(),
+			"stock_reconciliation_details": [
+				{
+					"item_code": row["item_code"],
+					"warehouse": row["warehouse"],
+					"quantity": row["quantity"],
+					"rate": 10,
+				}
+				for row in rows
+			],
+		}).submit()
+
+	stock_entry_type = voucher_type
+	warehouse_field = "to_warehouse" if stock_entry_type == "Receive" else "from_warehouse"
+	return frappe.get_doc({
+		"doctype": "Stock Entry",
+		"stock_entry_type": stock_entry_type,
+		"posting_date": today(),
+		"stock_entry_details": [
+			{
+				"item_code": row["item_code"],
+				warehouse_field: row["warehouse"],
+				"quantity": row["quantity"],
+				"item_price": 10,
+			}
+			for row in rows
+		],
+	}).submit()
+
+
+def make_stress_fixtures(items, warehouses):
+	for warehouse in warehouses:
+		if not frappe.db.exists("Warehouse", warehouse):
+			frappe.get_doc({"doctype": "Warehouse", "warehouse_name": warehouse}).insert()
+	for item_code in items:
+		if not frappe.db.exists("Item", item_code):
+			frappe.get_doc({"doctype": "Item", "item_code": item_code, "item_name": item_code}).insert()
+	frappe.db.commit()
+
+
+def delete_stress_data(items, warehouses):
+	# the workers commit, so everything they posted is taken out again by hand
+	vouchers = frappe.get_all(
+		"Stock Ledger Entry", filters={"item_code": ("in", items)}, pluck="voucher_number", distinct=True
+	)
+	for doctype in ("Stock Ledger Entry", "Bin", "Stock Repost", "Stock Closing Balance"):
+		frappe.db.delete(doctype, {"item_code": ("in", items)})
+	for doctype, child_doctype in (
+		("Stock Entry", "Stock Entry Details"),
+		("Stock Reconciliation", "Stock Reconciliation Details"),
+	):
+		frappe.db.delete(child_doctype, {"parent": ("in", vouchers)})
+		frappe.db.delete(doctype, {"name": ("in", vouchers)})
+	# the item_stock totals go with the items
+	frappe.db.delete("Item", {"name": ("in", items)})
+	frappe.db.delete("Warehouse", {"name": ("in", warehouses)})
+	frappe.db.commit()
+
+	clear_items(items)
+	for item_code in items:
+		frappe.cache.delete(get_projection_key(item_code))
+
+
+def make_item(**fields):
+	item_code = f"_Test Stock Entry Item {frappe.generate_hash(length=6)}"
+	frappe.get_doc({"doctype": "Item", "item_code": item_code, "item_name": item_code, **fields}).insert()
+	return item_code
+
+
+def make_stock_entry(stock_entry_type, item_code, qty, rate, from_warehouse=None, to_warehouse=None):
+	return frappe.get_doc({
+		"doctype": "Stock Entry",
+		"stock_entry_type": stock_entry_type,
+		"posting_date": today(),
+		"stock_entry_details": [
+			{
+				"item_code": item_code,
+				"from_warehouse": from_warehouse,
+				"to_warehouse": to_warehouse,
+				"quantity": qty,
+				"item_price": rate,
+			}
+		],
+	}).submit()
+
+
+def make_warehouses(warehouses):
+	for warehouse in warehouses:
+		if not frappe.db.exists("Warehouse", warehouse):
+			frappe.get_doc({"doctype": "Warehouse", "warehouse_name": warehouse}).insert()
@@ -1,9 +1,24 @@
 # Copyright (c) 2024, Poorvi Solutions and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
+from frappe import _
 from frappe.model.document import Document
 
+KEY_POSTING_INDEX = "item_warehouse_posting_index"
+POSTING_INDEX = "posting_index"
+VOUCHER_INDEX = "voucher_index"
+
 
 class StockLedgerEntry(Document):
-	pass
+	def validate(self):
+		if not self.is_new():
+			frappe.throw(_("Stock Ledger Entries are immutable and cannot be modified once posted."))
+
+
+def on_doctype_update():
+	frappe.db.add_index(
+		"Stock Ledger Entry", ["item_code", "warehouse", "posting_date", "creation"], KEY_POSTING_INDEX
+	)
+	frappe.db.add_index("Stock Ledger Entry", ["posting_date", "creation"], POSTING_INDEX)
+	frappe.db.add_index("Stock Ledger Entry", ["voucher_type", "voucher_number"], VOUCHER_INDEX)
@@ -1,9 +1,53 @@
 # Copyright (c) 2024, Poorvi Solutions and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import today
+
+from inventory_management.inventory_management.ledger_verifier import verify_items
+from inventory_management.inventory_management.stock_ledger import make_sl_entries
+
+TEST_WAREHOUSE = "_Test Verifier Warehouse"
 
 
 class TestStockLedgerEntry(FrappeTestCase):
-	pass
+	def test_verifier_reports_and_repairs_drift(self):
+		if not frappe.db.exists("Warehouse", TEST_WAREHOUSE):
+			frappe.get_doc({"doctype": "Warehouse", "warehouse_name": TEST_WAREHOUSE}).insert()
+		item_code = f"_Test Verifier Item {frappe.generate_hash(length=6)}"
+		frappe.get_doc({"doctype": "Item", "item_code": item_code, "item_name": item_code}).insert()
+
+		frappe.get_doc({
+			"doctype": "Stock Entry",
+			"stock_entry_type": "Receive",
+			"posting_date": today(),
+			"stock_entry_details": [
+				{"item_code": item_code, "to_warehouse": TEST_WAREHOUSE, "quantity": 10, "item_price": 5}
+			],
+		}).submit()
+		self.assertEqual(verify_items([item_code]), [])
+
+		# a ledger row no voucher accounts for, and a bin and item total that drifted from the ledger
+		voucher_number = frappe.generate_hash(length=10)
+		make_sl_entries([
+			{
+				"item_code": item_code,
+				"warehouse": TEST_WAREHOUSE,
+				"qty": 2,
+				"rate": 5,
+				"posting_date": today(),
+				"voucher_type": "Stock Entry",
+				"voucher_number": voucher_number,
+			}
+		])
+		frappe.db.set_value("Bin", {"item_code": item_code}, "actual_qty", 7)
+		frappe.db.set_value("Item", item_code, "item_stock", 10)
+
+		mismatches = {row["check"]: row for row in verify_items([item_code], repair=True)}
+		self.assertEqual(mismatches["voucher"]["vouchers"][0].voucher_number, voucher_number)
+		self.assertEqual(mismatches["bin"]["bin_qty"], 7)
+		self.assertEqual(mismatches["item_stock"]["ledger_qty"], 12)
+
+		self.assertEqual([row["check"] for row in verify_items([item_code])], ["voucher"])
+		self.assertEqual(frappe.db.get_value("Bin", {"item_code": item_code}, "actual_qty"), 12)
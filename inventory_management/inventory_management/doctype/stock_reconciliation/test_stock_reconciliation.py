@@ -1,9 +1,114 @@
 # Copyright (c) 2024, Poorvi Solutions and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import flt, today
+
+from inventory_management.inventory_management.stock_ledger import (
+	NegativeStockError,
+	make_sl_entries,
+	reverse_sl_entries,
+)
+
+TEST_WAREHOUSE = "_Test Reconciliation Warehouse"
 
 
 class TestStockReconciliation(FrappeTestCase):
-	pass
+	def setUp(self):
+		if not frappe.db.exists("Warehouse", TEST_WAREHOUSE):
+			frappe.get_doc({"doctype": "Warehouse", "warehouse_name": TEST_WAREHOUSE}).insert()
+		# fresh items per test, so no test starts from the stock another one left behind
+		self.items = []
+		for _ in range(3):
+			item_code = f"_Test Reconciliation Item {frappe.generate_hash(length=6)}"
+			frappe.get_doc({"doctype": "Item", "item_code": item_code, "item_name": item_code}).insert()
+			self.items.append(item_code)
+
+	def test_cancel_reverses_every_row_and_restores_the_rate(self):
+		for item_code in self.items:
+			post(item_code, 10, 5)
+
+		reconciliation = make_reconciliation([(item_code, 10, 15) for item_code in self.items])
+		for item_code in self.items:
+			self.assertEqual(get_bin(item_code), (20, 10))
+
+		reconciliation.cancel()
+		for item_code in self.items:
+			self.assertEqual(get_bin(item_code), (10, 5))
+		self.assertFalse(
+			frappe.db.exists(
+				"Stock Ledger Entry",
+				{"voucher_type": "Stock Reconciliation", "voucher_number": reconciliation.name, "is_cancelled": 0},
+			)
+		)
+
+	def test_cancel_that_would_go_negative_changes_nothing(self):
+		item_1, item_2 = self.items[:2]
+		reconciliation = make_reconciliation([(item_1, 10, 5), (item_2, 10, 5)])
+		post(item_2, -8, 5)
+
+		self.assertRaises(NegativeStockError, reconciliation.cancel)
+		self.assertEqual(get_bin(item_1), (10, 5))
+		self.assertEqual(
+			frappe.db.count(
+				"Stock Ledger Entry",
+				{"voucher_type": "Stock Reconciliation", "voucher_number": reconciliation.name, "is_cancelled": 0},
+			),
+			2,
+		)
+
+	def test_large_cancellation_runs_a_bounded_number_of_queries(self):
+		voucher_number = frappe.generate_hash(length=10)
+		make_sl_entries([
+			{
+				"item_code": self.items[idx % len(self.items)],
+				"warehouse": TEST_WAREHOUSE,
+				"qty": 1,
+				"rate": 5,
+				"posting_date": today(),
+				"voucher_type": "Stock Reconciliation",
+				"voucher_number": voucher_number,
+				"voucher_detail_no": str(idx),
+			}
+			for idx in range(10000)
+		])
+
+		with self.assertQueryCount(25):
+			reverse_sl_entries("Stock Reconciliation", voucher_number, allow_negative_stock=False)
+
+		for item_code in self.items:
+			self.assertEqual(get_bin(item_code)[0], 0)
+
+
+def post(item_code, qty, rate):
+	make_sl_entries([
+		{
+			"item_code": item_code,
+			"warehouse": TEST_WAREHOUSE,
+			"qty": qty,
+			"rate": rate,
+			"posting_date": today(),
+			"voucher_type": "Stock Entry",
+			"voucher_number": frappe.generate_hash(length=10),
+		}
+	])
+
+
+def make_reconciliation(rows):
+	return frappe.get_doc({
+		"doctype": "Stock Reconciliation",
+		"purpose": "Stock Reconciliation",
+		"posting_date": today(),
+		"stock_reconciliation_details": [
+			{"item_code": item_code, "warehouse": TEST_WAREHOUSE, "quantity": qty, "rate": rate}
+			for item_code, qty, rate in rows
+		],
+	}).submit()
+
+
+def get_bin(item_code):
+	actual_qty, valuation_rate = frappe.db.get_value(
+		"Bin", {"item_code": item_code, "warehouse": TEST_WAREHOUSE}, ["actual_qty", "valuation_rate"]
+	)
+	return flt(actual_qty, 6), flt(valuation_rate, 6)
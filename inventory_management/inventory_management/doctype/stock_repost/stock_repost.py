@@ -0,0 +1,390 @@
+# Copyright (c) 2024, Poorvi Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_to_date, flt, getdate, now, now_datetime
+
+from inventory_management.inventory_management.doctype.bin.bin import (
+	get_bins,
+	save_bins,
+	update_item_valuation_rates,
+)
+from inventory_management.inventory_management.doctype.stock_closing_balance.stock_closing_balance import (
+	invalidate_snapshots,
+)
+from inventory_management.inventory_management.master_cache import clear_items_after_commit
+from inventory_management.inventory_management.utils import bulk_update_by_name
+from inventory_management.inventory_management.valuation import (
+	FIFO,
+	FifoQueue,
+	get_fifo_queue,
+	get_valuation_methods,
+	update_fifo_valuation,
+)
+
+REPOST_CHUNK_SIZE = 1000
+REPOST_JOB_TIMEOUT = 4 * 3600
+
+
+class StockRepost(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("Stock Repost", ["status", "item_code", "warehouse"])
+
+
+def queue_reposts(posting_dates, inclusive=False):
+	"""Queue a repost for every key whose ledger has rows dated after ``posting_dates[key]``.
+
+	``posting_dates`` maps (item_code, warehouse) to the earliest posting date of a batch.
+	With ``inclusive`` rows dated on that day count as well, for rows whose own value has
+	changed. A key that already has a queued repost gets that one moved back to the earlier
+	date instead of a second one.
+	"""
+	keys = sorted(posting_dates)
+	if not keys:
+		return
+
+	key_placeholders = ", ".join(["(%s, %s)"] * len(keys))
+	key_values = [value for key in keys for value in key]
+	latest = {
+		(item_code, warehouse): getdate(posting_date)
+		for item_code, warehouse, posting_date in frappe.db.sql(
+			f"""
+			select item_code, warehouse, max(posting_date)
+			from `tabStock Ledger Entry`
+			where (item_code, warehouse) in ({key_placeholders}) and is_cancelled = 0
+			group by item_code, warehouse
+			""",
+			key_values,
+		)
+	}
+	posting_dates = {key: getdate(posting_date) for key, posting_date in posting_dates.items()}
+	backdated = {
+		key: posting_dates[key]
+		for key in keys
+		if key in latest
+		and (latest[key] > posting_dates[key] or (inclusive and latest[key] == posting_dates[key]))
+	}
+	if not backdated:
+		return
+
+	queued = {
+		(row.item_code, row.warehouse): row
+		for row in frappe.db.sql(
+			f"""
+			select name, item_code, warehouse, posting_date
+			from `tabStock Repost`
+			where status = 'Queued' and (item_code, warehouse) in ({key_placeholders})
+			for update
+			""",
+			key_values,
+			as_dict=True,
+		)
+	}
+	for key, posting_date in backdated.items():
+		if key in queued and posting_date < queued[key].posting_date:
+			frappe.db.set_value("Stock Repost", queued[key].name, "posting_date", posting_date)
+
+	timestamp, user = now(), frappe.session.user
+	frappe.db.bulk_insert(
+		"Stock Repost",
+		fields=[
+			"name", "creation", "modified", "owner", "modified_by",
+			"item_code", "warehouse", "posting_date", "status",
+		],
+		values=[
+			(frappe.generate_hash(length=10), timestamp, timestamp, user, user, *key, posting_date, "Queued")
+			for key, posting_date in backdated.items()
+			if key not in queued
+		],
+	)
+
+	frappe.enqueue(
+		process_repost_queue,
+		queue="long",
+		timeout=REPOST_JOB_TIMEOUT,
+		job_id="process_repost_queue",
+		deduplicate=True,
+		enqueue_after_commit=True,
+	)
+
+
+def process_repost_queue():
+	"""Run the queued reposts, oldest first, committing after every chunk until the queue is empty.
+
+	Also runs from the scheduler, which picks up reposts queued while a previous run was
+	finishing and reposts whose job died half way, which continue from their last chunk.
+	"""
+	from inventory_management.inventory_management.stock_ledger import run_with_lock_retry
+
+	requeue_stalled_reposts()
+	while name := claim_next_repost():
+		try:
+			while not run_with_lock_retry(repost_chunk, name):
+				frappe.db.commit()
+			frappe.db.commit()
+		except Exception:
+			frappe.db.rollback()
+			frappe.db.set_value(
+				"Stock Repost", name, {"status": "Failed", "error": frappe.get_traceback(with_context=False)}
+			)
+			frappe.db.commit()
+
+
+def requeue_stalled_reposts():
+	frappe.db.sql(
+		"""
+		update `tabStock Repost` set status = 'Queued'
+		where status = 'In Progress' and modified < %s
+		""",
+		add_to_date(now_datetime(), seconds=-REPOST_JOB_TIMEOUT),
+	)
+	frappe.db.commit()
+
+
+def claim_next_repost():
+	entry = frappe.db.sql(
+		"""
+		select name, item_code, warehouse, posting_date, resume_name
+		from `tabStock Repost`
+		where status = 'Queued'
+		order by creation
+		limit 1
+		for update
+		""",
+		as_dict=True,
+	)
+	if not entry:
+		return None
+
+	entry = entry[0]
+	# any other queued repost of the key is folded into this one
+	duplicates = frappe.db.sql(
+		"""
+		select name, posting_date from `tabStock Repost`
+		where status = 'Queued' and item_code = %s and warehouse = %s and name != %s
+		for update
+		""",
+		(entry.item_code, entry.warehouse, entry.name),
+		as_dict=True,
+	)
+	values = {"status": "In Progress"}
+	if duplicates:
+		frappe.db.sql(
+			"update `tabStock Repost` set status = 'Completed' where name in %(names)s",
+			{"names": [row.name for row in duplicates]},
+		)
+		# a fresh start from the earliest date covers all of them, and any progress made before
+		values.update(
+			posting_date=min(entry.posting_date, *(row.posting_date for row in duplicates)),
+			resume_name=None,
+			reposted_rows=0,
+		)
+
+	frappe.db.set_value("Stock Repost", entry.name, values)
+	frappe.db.commit()
+	return entry.name
+
+
+def repost_chunk(name):
+	"""Revalue the next chunk of ledger rows of a repost and return True once the key is done.
+
+	Rows are revalued in (posting_date, creation) order from the balance before the repost
+	date. Cancelled rows and their reversals net out, so they are skipped and left as they are.
+	When an outgoing row leaves at a new rate, the incoming leg of its transfer is given that
+	rate and its warehouse is reposted from the leg's date.
+	"""
+	from inventory_management.inventory_management.stock_ledger import update_bin_valuation
+
+	entry = frappe.get_doc("Stock Repost", name)
+	key = (entry.item_code, entry.warehouse)
+	# keeps postings of the key out until the chunk, and at the end the bin, are written
+	bin = get_bins([key], for_update=True).get(key)
+
+	is_fifo = get_valuation_methods([entry.item_code])[entry.item_code] == FIFO
+	state = get_repost_state(entry, is_fifo)
+	queue = get_fifo_queue(state) if is_fifo else None
+
+	rows = get_repost_rows(entry)
+	updates, outgoing_rates = {}, {}
+	for row in rows:
+		qty, previous_stock_value = flt(row.actual_qty), state["stock_value"]
+		if queue is not None:
+			update_fifo_valuation(state, queue, qty, flt(row.rate))
+		else:
+			update_bin_valuation(state, qty, flt(row.rate))
+
+		stock_value_difference = state["stock_value"] - previous_stock_value
+		updates[row.name] = {
+			"qty_after_transaction": state["actual_qty"],
+			"valuation_rate": state["valuation_rate"],
+			"stock_value": state["stock_value"],
+			"stock_value_difference": stock_value_difference,
+		}
+		if qty < 0:
+			updates[row.name]["rate"] = stock_value_difference / qty
+			if row.voucher_detail_no and flt(updates[row.name]["rate"] - flt(row.rate), 9):
+				outgoing_rates[(row.voucher_type, row.voucher_number, row.voucher_detail_no)] = updates[row.name]["rate"]
+
+	# the computed balances of the rows are rewritten, the movements themselves never change
+	bulk_update_by_name("Stock Ledger Entry", updates, update_modified=False)
+	update_incoming_legs(entry, outgoing_rates)
+
+	progress = {
+		"qty_after_transaction": state["actual_qty"],
+		"valuation_rate": state["valuation_rate"],
+		"stock_value": state["stock_value"],
+		"fifo_queue": queue.dumps() if queue is not None else None,
+		"reposted_rows": (entry.reposted_rows or 0) + len(rows),
+	}
+	if rows:
+		progress.update(
+			resume_posting_date=rows[-1].posting_date, resume_creation=rows[-1].creation, resume_name=rows[-1].name
+		)
+
+	done = len(rows) < REPOST_CHUNK_SIZE
+	if done:
+		if bin:
+			bin.update(valuation_rate=state["valuation_rate"], stock_value=state["stock_value"])
+			if queue is not None:
+				bin["fifo_queue"] = progress["fifo_queue"]
+			save_bins([bin])
+		update_item_valuation_rates([entry.item_code])
+		clear_items_after_commit([entry.item_code])
+		invalidate_snapshots({key: entry.posting_date})
+		progress["status"] = "Completed"
+
+	frappe.db.set_value("Stock Repost", entry.name, progress)
+	return done
+
+
+def update_incoming_legs(entry, outgoing_rates):
+	"""Carry the new rates of outgoing rows over to the incoming legs posted at them, and repost those."""
+	if not outgoing_rates:
+		return
+
+	voucher_placeholders = ", ".join(["(%s, %s, %s)"] * len(outgoing_rates))
+	legs = frappe.db.sql(
+		f"""
+		select name, item_code, warehouse, posting_date, voucher_type, voucher_number, voucher_detail_no
+		from `tabStock Ledger Entry`
+		where (voucher_type, voucher_number, voucher_detail_no) in ({voucher_placeholders})
+			and item_code = %s and warehouse != %s and is_cancelled = 0 and actual_qty > 0
+		""",
+		[value for voucher in outgoing_rates for value in voucher] + [entry.item_code, entry.warehouse],
+		as_dict=True,
+	)
+	if not legs:
+		return
+
+	bulk_update_by_name(
+		"Stock Ledger Entry",
+		{
+			leg.name: {"rate": outgoing_rates[(leg.voucher_type, leg.voucher_number, leg.voucher_detail_no)]}
+			for leg in legs
+		},
+		update_modified=False,
+	)
+	posting_dates = {}
+	for leg in legs:
+		key = (leg.item_code, leg.warehouse)
+		posting_dates[key] = min(posting_dates.get(key, leg.posting_date), leg.posting_date)
+	queue_reposts(posting_dates, inclusive=True)
+
+
+def get_repost_state(entry, is_fifo=False):
+	if entry.resume_name:
+		return {
+			"actual_qty": flt(entry.qty_after_transaction),
+			"valuation_rate": flt(entry.valuation_rate),
+			"stock_value": flt(entry.stock_value),
+			"fifo_queue": entry.fifo_queue,
+		}
+	if is_fifo:
+		return get_fifo_state(entry)
+
+	previous = frappe.db.sql(
+		"""
+		select qty_after_transaction, valuation_rate, stock_value
+		from `tabStock Ledger Entry`
+		where item_code = %s and warehouse = %s and is_cancelled = 0 and posting_date < %s
+		order by posting_date desc, creation desc, name desc
+		limit 1
+		""",
+		(entry.item_code, entry.warehouse, entry.posting_date),
+		as_dict=True,
+	)
+	previous = previous[0] if previous else frappe._dict()
+	return {
+		"actual_qty": flt(previous.qty_after_transaction),
+		"valuation_rate": flt(previous.valuation_rate),
+		"stock_value": flt(previous.stock_value),
+		"fifo_queue": None,
+	}
+
+
+def get_fifo_state(entry):
+	"""Replay the rows of the key before the repost date, which gives the layers the balance was made of."""
+	state = {"actual_qty": 0.0, "valuation_rate": 0.0, "stock_value": 0.0}
+	queue, last = FifoQueue(), None
+	while True:
+		rows = frappe.db.sql(
+			f"""
+			select name, posting_date, creation, actual_qty, rate
+			from `tabStock Ledger Entry`
+			where item_code = %(item_code)s and warehouse = %(warehouse)s and is_cancelled = 0
+				and posting_date < %(posting_date)s
+				{"and (posting_date, creation, name) > (%(last_posting_date)s, %(last_creation)s, %(last_name)s)" if last else ""}
+			order by posting_date, creation, name
+			limit %(limit)s
+			""",
+			{
+				"item_code": entry.item_code,
+				"warehouse": entry.warehouse,
+				"posting_date": entry.posting_date,
+				"last_posting_date": last and last.posting_date,
+				"last_creation": last and last.creation,
+				"last_name": last and last.name,
+				"limit": REPOST_CHUNK_SIZE,
+			},
+			as_dict=True,
+		)
+		for row in rows:
+			update_fifo_valuation(state, queue, flt(row.actual_qty), flt(row.rate))
+		if len(rows) < REPOST_CHUNK_SIZE:
+			break
+		last = rows[-1]
+
+	state["fifo_queue"] = queue.dumps()
+	return state
+
+
+def get_repost_rows(entry):
+	resume_condition = (
+		"and (posting_date, creation, name) > (%(resume_posting_date)s, %(resume_creation)s, %(resume_name)s)"
+		if entry.resume_name
+		else ""
+	)
+	return frappe.db.sql(
+		f"""
+		select name, posting_date, creation, actual_qty, rate, voucher_type, voucher_number, voucher_detail_no
+		from `tabStock Ledger Entry`
+		where item_code = %(item_code)s and warehouse = %(warehouse)s and is_cancelled = 0
+			and posting_date >= %(posting_date)s {resume_condition}
+		order by posting_date, creation, name
+		limit %(limit)s
+		""",
+		{
+			"item_code": entry.item_code,
+			"warehouse": entry.warehouse,
+			"posting_date": entry.posting_date,
+			"resume_posting_date": entry.resume_posting_date,
+			"resume_creation": entry.resume_creation,
+			"resume_name": entry.resume_name,
+			"limit": REPOST_CHUNK_SIZE,
+		},
+		as_dict=True,
+	)
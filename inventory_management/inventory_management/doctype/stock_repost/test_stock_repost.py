@@ -0,0 +1,142 @@
+# Copyright (c) 2024, Poorvi Solutions and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, flt, getdate, today
+
+from inventory_management.inventory_management.doctype.stock_repost.stock_repost import process_repost_queue
+from inventory_management.inventory_management.stock_ledger import make_sl_entries
+from inventory_management.inventory_management.valuation import FifoQueue
+
+TEST_WAREHOUSE = "_Test Repost Warehouse"
+TEST_TRANSFER_WAREHOUSE = "_Test Repost Transfer Warehouse"
+TEST_FIFO_ITEM_GROUP = "_Test Repost FIFO Item Group"
+
+
+class TestStockRepost(FrappeTestCase):
+	def setUp(self):
+		for warehouse in (TEST_WAREHOUSE, TEST_TRANSFER_WAREHOUSE):
+			if not frappe.db.exists("Warehouse", warehouse):
+				frappe.get_doc({"doctype": "Warehouse", "warehouse_name": warehouse}).insert()
+		self.item_code = f"_Test Repost Item {frappe.generate_hash(length=6)}"
+		frappe.get_doc({"doctype": "Item", "item_code": self.item_code, "item_name": self.item_code}).insert()
+
+	def test_backdated_receipt_revalues_later_issue(self):
+		post(self.item_code, 10, 10, add_days(today(), -3))
+		post(self.item_code, -5, 0, today())
+		self.assertFalse(frappe.db.exists("Stock Repost", {"item_code": self.item_code}))
+
+		post(self.item_code, 10, 20, add_days(today(), -1))
+		post(self.item_code, 10, 20, add_days(today(), -2))
+		# both backdated postings share one queued repost, from the earlier date
+		reposts = frappe.get_all(
+			"Stock Repost", filters={"item_code": self.item_code, "status": "Queued"}, pluck="posting_date"
+		)
+		self.assertEqual(reposts, [getdate(add_days(today(), -2))])
+
+		process_repost_queue()
+
+		issue = frappe.db.get_value(
+			"Stock Ledger Entry",
+			{"item_code": self.item_code, "posting_date": today()},
+			["qty_after_transaction", "stock_value", "stock_value_difference"],
+			as_dict=True,
+		)
+		# 30 at a moving average of 500 / 30 before the issue, 25 left after it
+		self.assertAlmostEqual(flt(issue.qty_after_transaction), 25)
+		self.assertAlmostEqual(flt(issue.stock_value), 500 * 25 / 30)
+		self.assertAlmostEqual(flt(issue.stock_value_difference), -500 * 5 / 30)
+		self.assertAlmostEqual(
+			flt(frappe.db.get_value("Bin", {"item_code": self.item_code}, "stock_value")), 500 * 25 / 30
+		)
+
+	def test_fifo_repost_keeps_the_layers(self):
+		if not frappe.db.exists("Item Group", TEST_FIFO_ITEM_GROUP):
+			frappe.get_doc(
+				{"doctype": "Item Group", "item_group": TEST_FIFO_ITEM_GROUP, "valuation_method": "FIFO"}
+			).insert()
+		item_code = f"_Test Repost FIFO Item {frappe.generate_hash(length=6)}"
+		frappe.get_doc(
+			{"doctype": "Item", "item_code": item_code, "item_name": item_code, "item_group": TEST_FIFO_ITEM_GROUP}
+		).insert()
+
+		post(item_code, 10, 10, add_days(today(), -3))
+		post(item_code, 10, 20, add_days(today(), -2))
+		post(item_code, -5, 0, today())
+		post(item_code, 10, 30, add_days(today(), -1))
+		process_repost_queue()
+
+		# the issue still comes out of the oldest layer, not at the average of the first two
+		issue = frappe.db.get_value(
+			"Stock Ledger Entry",
+			{"item_code": item_code, "posting_date": today()},
+			["rate", "stock_value", "stock_value_difference"],
+			as_dict=True,
+		)
+		self.assertAlmostEqual(flt(issue.rate), 10)
+		self.assertAlmostEqual(flt(issue.stock_value_difference), -50)
+		self.assertAlmostEqual(flt(issue.stock_value), 550)
+
+		bin = frappe.db.get_value("Bin", {"item_code": item_code}, ["stock_value", "fifo_queue"], as_dict=True)
+		self.assertAlmostEqual(flt(bin.stock_value), 550)
+		self.assertEqual(list(FifoQueue.loads(bin.fifo_queue).layers), [5, 10, 10, 20, 10, 30])
+
+	def test_repost_revalues_the_incoming_leg_of_a_transfer(self):
+		post(self.item_code, 10, 10, add_days(today(), -3))
+		voucher_number = frappe.generate_hash(length=10)
+		make_sl_entries([
+			{
+				"item_code": self.item_code,
+				"warehouse": warehouse,
+				"qty": qty,
+				"rate": 0,
+				"posting_date": today(),
+				"voucher_type": "Stock Entry",
+				"voucher_number": voucher_number,
+				"voucher_detail_no": "_Test Repost Transfer Row",
+				**extra,
+			}
+			for warehouse, qty, extra in (
+				(TEST_WAREHOUSE, -5, {}),
+				(TEST_TRANSFER_WAREHOUSE, 5, {"rate_from_row": 0}),
+			)
+		])
+
+		post(self.item_code, 10, 40, add_days(today(), -1))
+		process_repost_queue()
+
+		# 20 at an average of 25 before the transfer, which both legs now carry
+		legs = {
+			row.warehouse: row
+			for row in frappe.get_all(
+				"Stock Ledger Entry",
+				filters={"voucher_number": voucher_number},
+				fields=["warehouse", "rate", "stock_value_difference"],
+			)
+		}
+		self.assertAlmostEqual(flt(legs[TEST_WAREHOUSE].rate), 25)
+		self.assertAlmostEqual(flt(legs[TEST_TRANSFER_WAREHOUSE].rate), 25)
+		self.assertAlmostEqual(flt(legs[TEST_TRANSFER_WAREHOUSE].stock_value_difference), 125)
+		self.assertAlmostEqual(
+			flt(
+				frappe.db.get_value(
+					"Bin", {"item_code": self.item_code, "warehouse": TEST_TRANSFER_WAREHOUSE}, "stock_value"
+				)
+			),
+			125,
+		)
+
+
+def post(item_code, qty, rate, posting_date):
+	return make_sl_entries([
+		{
+			"item_code": item_code,
+			"warehouse": TEST_WAREHOUSE,
+			"qty": qty,
+			"rate": rate,
+			"posting_date": posting_date,
+			"voucher_type": "Stock Entry",
+			"voucher_number": frappe.generate_hash(length=10),
+		}
+	])
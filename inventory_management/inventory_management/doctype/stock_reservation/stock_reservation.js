@@ -0,0 +1,17 @@
+// Copyright (c) 2024, Poorvi Solutions and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("Stock Reservation", {
+	refresh(frm) {
+		if (["Reserved", "Partially Consumed"].includes(frm.doc.status)) {
+			frm.add_custom_button(__("Release"), () => {
+				frappe
+					.call({
+						method: "inventory_management.inventory_management.doctype.stock_reservation.stock_reservation.release",
+						args: { reservation: frm.doc.name },
+					})
+					.then(() => frm.reload_doc());
+			});
+		}
+	},
+});
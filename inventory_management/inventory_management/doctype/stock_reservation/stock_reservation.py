@@ -0,0 +1,162 @@
+# Copyright (c) 2024, Poorvi Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from frappe.utils import flt, now
+
+from inventory_management.inventory_management.doctype.bin.bin import get_bins
+
+
+class InsufficientStockError(frappe.ValidationError):
+	pass
+
+
+class StockReservation(Document):
+	def get_remaining_qty(self):
+		return flt(self.reserved_qty) - flt(self.consumed_qty) - flt(self.released_qty)
+
+
+def on_doctype_update():
+	frappe.db.add_index("Stock Reservation", ["item_code", "warehouse"])
+
+
+@frappe.whitelist()
+def reserve(item_code, warehouse, qty, reference_doctype=None, reference_name=None):
+	"""Reserve ``qty`` of an item in a warehouse and return the new Stock Reservation.
+
+	The Bin is checked and updated in one statement, so concurrent reservations can never
+	together reserve more than the stock that is not reserved yet.
+	"""
+	frappe.has_permission("Stock Reservation", "create", throw=True)
+	qty = flt(qty)
+	if qty <= 0:
+		frappe.throw(_("Reserved quantity must be greater than zero."))
+
+	frappe.db.sql(
+		"""
+		update `tabBin` set reserved_qty = reserved_qty + %(qty)s
+		where item_code = %(item_code)s and warehouse = %(warehouse)s
+			and round(actual_qty - reserved_qty - %(qty)s, 9) >= 0
+		""",
+		{"item_code": item_code, "warehouse": warehouse, "qty": qty},
+	)
+	if not get_rowcount():
+		frappe.throw(
+			_("Only {0} of item {1} is available to reserve in warehouse {2}.").format(
+				get_available_qty(item_code, warehouse), item_code, warehouse
+			),
+			InsufficientStockError,
+		)
+
+	return frappe.get_doc({
+		"doctype": "Stock Reservation",
+		"item_code": item_code,
+		"warehouse": warehouse,
+		"reserved_qty": qty,
+		"status": "Reserved",
+		"reference_doctype": reference_doctype,
+		"reference_name": reference_name,
+	}).insert(ignore_permissions=True)
+
+
+@frappe.whitelist()
+def release(reservation, qty=None):
+	"""Give back ``qty`` (by default all) of what is left of a reservation."""
+	frappe.has_permission("Stock Reservation", "write", reservation, throw=True)
+	doc = frappe.get_doc("Stock Reservation", reservation)
+	qty = flt(qty) if qty else doc.get_remaining_qty()
+	update_reservation(doc, "released_qty", qty)
+	return frappe.get_doc("Stock Reservation", reservation)
+
+
+def consume(reservation, qty):
+	"""Take ``qty`` of a reservation out of the reserved stock, when a voucher ships it."""
+	update_reservation(frappe.get_doc("Stock Reservation", reservation), "consumed_qty", qty)
+
+
+def unconsume(reservation, qty):
+	"""Put ``qty`` consumed by a cancelled voucher back into the reservation."""
+	update_reservation(frappe.get_doc("Stock Reservation", reservation), "consumed_qty", -qty)
+
+
+def update_reservation(doc, field, qty):
+	if not qty:
+		return
+
+	# bins are always locked before reservations, the order a Stock Entry takes them in as well
+	get_bins([(doc.item_code, doc.warehouse)], for_update=True)
+	frappe.db.sql(
+		f"""
+		update `tabStock Reservation` set {field} = {field} + %(qty)s, modified = %(modified)s
+		where name = %(name)s
+			and round(reserved_qty - consumed_qty - released_qty - %(qty)s, 9) >= 0
+			and round({field} + %(qty)s, 9) >= 0
+		""",
+		{"name": doc.name, "qty": qty, "modified": now()},
+	)
+	if not get_rowcount():
+		frappe.throw(
+			_("Stock Reservation {0} has only {1} left.").format(
+				doc.name, frappe.get_doc("Stock Reservation", doc.name).get_remaining_qty()
+			),
+			InsufficientStockError,
+		)
+
+	frappe.db.sql(
+		"""
+		update `tabBin` set reserved_qty = reserved_qty - %(qty)s
+		where item_code = %(item_code)s and warehouse = %(warehouse)s
+		""",
+		{"item_code": doc.item_code, "warehouse": doc.warehouse, "qty": qty},
+	)
+	doc.reload()
+	doc.db_set("status", get_status(doc), update_modified=False)
+
+
+def get_status(doc):
+	if flt(doc.get_remaining_qty(), 9) > 0:
+		return "Partially Consumed" if flt(doc.consumed_qty) else "Reserved"
+	return "Consumed" if flt(doc.consumed_qty) else "Released"
+
+
+def get_rowcount():
+	return frappe.db._cursor.rowcount
+
+
+def get_available_qty(item_code, warehouse):
+	bin = get_bins([(item_code, warehouse)]).get((item_code, warehouse))
+	return max(flt(bin["actual_qty"] - bin["reserved_qty"], 9), 0) if bin else 0
+
+
+def validate_unreserved_stock(sl_entries, reservations=None, for_update=False):
+	"""Throw when outgoing ``sl_entries`` would take more than the stock that is not reserved.
+
+	``reservations`` maps ``(item_code, warehouse)`` to the reserved qty the entries ship
+	themselves, which they may take on top of the unreserved stock. A pair without a bin
+	has nothing available. With ``for_update`` the bins of every entry are locked, so the
+	check still holds when the entries are posted in the same transaction.
+	"""
+	outgoing = {}
+	for sle in sl_entries:
+		if flt(sle["qty"]) < 0:
+			key = (sle["item_code"], sle["warehouse"])
+			outgoing[key] = outgoing.get(key, 0) - flt(sle["qty"])
+
+	# all the voucher's bins at once, locking only the outgoing ones first could deadlock the posting
+	bins = get_bins({(sle["item_code"], sle["warehouse"]) for sle in sl_entries}, for_update=for_update)
+	short = []
+	for key, qty in sorted(outgoing.items()):
+		bin = bins.get(key) or {}
+		available = flt(bin.get("actual_qty")) - flt(bin.get("reserved_qty")) + (reservations or {}).get(key, 0)
+		if flt(available - qty, 9) < 0:
+			short.append(key)
+
+	if short:
+		frappe.throw(
+			_("Not enough unreserved stock for: {0}").format(
+				", ".join(_("item {0} in warehouse {1}").format(*key) for key in short)
+			),
+			InsufficientStockError,
+		)
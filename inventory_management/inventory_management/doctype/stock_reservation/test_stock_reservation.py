@@ -0,0 +1,97 @@
+# Copyright (c) 2024, Poorvi Solutions and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import flt, today
+
+from inventory_management.inventory_management.doctype.stock_reservation.stock_reservation import (
+	InsufficientStockError,
+	release,
+	reserve,
+)
+from inventory_management.inventory_management.stock_ledger import make_sl_entries
+
+TEST_WAREHOUSE = "_Test Reservation Warehouse"
+
+
+class TestStockReservation(FrappeTestCase):
+	def setUp(self):
+		if not frappe.db.exists("Warehouse", TEST_WAREHOUSE):
+			frappe.get_doc({"doctype": "Warehouse", "warehouse_name": TEST_WAREHOUSE}).insert()
+		self.item_code = f"_Test Reservation Item {frappe.generate_hash(length=6)}"
+		frappe.get_doc({"doctype": "Item", "item_code": self.item_code, "item_name": self.item_code}).insert()
+		make_sl_entries([
+			{
+				"item_code": self.item_code,
+				"warehouse": TEST_WAREHOUSE,
+				"qty": 10,
+				"rate": 5,
+				"posting_date": today(),
+				"voucher_type": "Stock Entry",
+				"voucher_number": frappe.generate_hash(length=10),
+			}
+		])
+
+	def test_reserve_and_release(self):
+		reservation = reserve(self.item_code, TEST_WAREHOUSE, 6)
+		self.assertEqual(get_reserved_qty(self.item_code), 6)
+		self.assertRaises(InsufficientStockError, reserve, self.item_code, TEST_WAREHOUSE, 5)
+		self.assertEqual(get_reserved_qty(self.item_code), 6)
+
+		reservation = release(reservation.name, 2)
+		self.assertEqual(reservation.status, "Reserved")
+		self.assertEqual(get_reserved_qty(self.item_code), 4)
+		self.assertEqual(release(reservation.name).status, "Released")
+		self.assertEqual(get_reserved_qty(self.item_code), 0)
+
+	def test_issue_cannot_take_reserved_stock(self):
+		reservation = reserve(self.item_code, TEST_WAREHOUSE, 8)
+		self.assertRaises(InsufficientStockError, make_issue, self.item_code, 5)
+
+		stock_entry = make_issue(self.item_code, 5, reservation.name)
+		reservation.reload()
+		self.assertEqual(reservation.status, "Partially Consumed")
+		self.assertEqual(get_reserved_qty(self.item_code), 3)
+
+		stock_entry.cancel()
+		reservation.reload()
+		self.assertEqual(reservation.status, "Reserved")
+		self.assertEqual(get_reserved_qty(self.item_code), 8)
+
+	def test_issue_cannot_take_more_than_the_stock(self):
+		self.assertRaises(InsufficientStockError, make_issue, self.item_code, 11)
+
+		# an item that never had stock in the warehouse has no bin at all
+		item_code = f"_Test Reservation Item {frappe.generate_hash(length=6)}"
+		frappe.get_doc({"doctype": "Item", "item_code": item_code, "item_name": item_code}).insert()
+		self.assertRaises(InsufficientStockError, make_issue, item_code, 1)
+
+		make_issue(self.item_code, 10)
+		self.assertEqual(
+			flt(frappe.db.get_value("Bin", {"item_code": self.item_code, "warehouse": TEST_WAREHOUSE}, "actual_qty")),
+			0,
+		)
+
+
+def make_issue(item_code, qty, reservation=None):
+	return frappe.get_doc({
+		"doctype": "Stock Entry",
+		"stock_entry_type": "Issue",
+		"posting_date": today(),
+		"stock_entry_details": [
+			{
+				"item_code": item_code,
+				"from_warehouse": TEST_WAREHOUSE,
+				"quantity": qty,
+				"item_price": 5,
+				"stock_reservation": reservation,
+			}
+		],
+	}).submit()
+
+
+def get_reserved_qty(item_code):
+	return flt(
+		frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": TEST_WAREHOUSE}, "reserved_qty"), 6
+	)
@@ -1,9 +1,72 @@
 # Copyright (c) 2024, Poorvi Solutions and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import today
+
+from inventory_management.inventory_management.doctype.stock_closing_balance.stock_closing_balance import (
+	get_stock_balance,
+)
+from inventory_management.inventory_management.doctype.warehouse.warehouse import (
+	get_warehouse_stock,
+	rebuild_warehouse_tree,
+)
+from inventory_management.inventory_management.stock_ledger import make_sl_entries
+
+TEST_ITEM = "_Test Tree Item"
 
 
 class TestWarehouse(FrappeTestCase):
-	pass
+	def setUp(self):
+		if not frappe.db.exists("Item", TEST_ITEM):
+			frappe.get_doc({"doctype": "Item", "item_code": TEST_ITEM, "item_name": TEST_ITEM}).insert()
+
+		# _Test Tree Root > _Test Tree Group > _Test Tree Leaf 1, _Test Tree Leaf 2
+		make_warehouse("_Test Tree Root", is_group=1)
+		make_warehouse("_Test Tree Group", "_Test Tree Root", is_group=1)
+		make_warehouse("_Test Tree Leaf 1", "_Test Tree Group")
+		make_warehouse("_Test Tree Leaf 2", "_Test Tree Group")
+
+	def test_rebuild_keeps_children_inside_their_parents(self):
+		frappe.db.sql("update `tabWarehouse` set lft = 0, rgt = 0")
+		rebuild_warehouse_tree()
+
+		lft, rgt = frappe.db.get_value("Warehouse", "_Test Tree Root", ["lft", "rgt"])
+		for warehouse in ("_Test Tree Group", "_Test Tree Leaf 1", "_Test Tree Leaf 2"):
+			child_lft, child_rgt = frappe.db.get_value("Warehouse", warehouse, ["lft", "rgt"])
+			self.assertTrue(lft < child_lft < child_rgt < rgt)
+
+	def test_group_warehouses_roll_up_their_descendants(self):
+		make_sl_entries([
+			{
+				"item_code": TEST_ITEM,
+				"warehouse": warehouse,
+				"qty": qty,
+				"rate": 10,
+				"posting_date": today(),
+				"voucher_type": "Stock Entry",
+				"voucher_number": frappe.generate_hash(length=10),
+			}
+			for warehouse, qty in (("_Test Tree Leaf 1", 3), ("_Test Tree Leaf 2", 4))
+		])
+
+		stock = {row.warehouse: row.actual_qty for row in get_warehouse_stock(TEST_ITEM)}
+		self.assertEqual(stock["_Test Tree Root"], 7)
+		self.assertEqual(stock["_Test Tree Group"], 7)
+		self.assertEqual(stock["_Test Tree Leaf 1"], 3)
+		self.assertEqual(get_stock_balance(TEST_ITEM, "_Test Tree Group")["actual_qty"], 7)
+
+		self.addCleanup(frappe.set_user, frappe.session.user)
+		frappe.set_user("Guest")
+		self.assertRaises(frappe.PermissionError, get_warehouse_stock, TEST_ITEM)
+
+
+def make_warehouse(warehouse_name, parent_warehouse=None, is_group=0):
+	if not frappe.db.exists("Warehouse", warehouse_name):
+		frappe.get_doc({
+			"doctype": "Warehouse",
+			"warehouse_name": warehouse_name,
+			"parent_warehouse": parent_warehouse,
+			"is_group": is_group,
+		}).insert()
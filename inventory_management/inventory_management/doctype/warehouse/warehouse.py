@@ -1,9 +1,94 @@
 # Copyright (c) 2024, Poorvi Solutions and contributors
 # For license information, please see license.txt
 
-# import frappe
-from frappe.model.document import Document
+import frappe
+from frappe import _
+from frappe.utils import cint
+from frappe.utils.nestedset import NestedSet
 
+from inventory_management.inventory_management.master_cache import clear_warehouse_cache, get_warehouse_details
+from inventory_management.inventory_management.utils import bulk_update_by_name
 
-class Warehouse(Document):
-	pass
+
+class Warehouse(NestedSet):
+	nsm_parent_field = "parent_warehouse"
+
+	def validate(self):
+		if self.is_group and not self.is_new() and frappe.db.exists("Stock Ledger Entry", {"warehouse": self.name}):
+			frappe.throw(_("Warehouse {0} has stock transactions and cannot be made a group.").format(self.name))
+
+
+def on_doctype_update():
+	frappe.db.add_index("Warehouse", ["lft", "rgt"])
+
+
+def rebuild_warehouse_tree():
+	"""Recompute lft/rgt of every warehouse from parent_warehouse in one pass.
+
+	Unlike ``frappe.utils.nestedset.rebuild_tree`` this reads the tree in one query, walks it
+	without recursion and writes the intervals in bulk. Returns the number of warehouses.
+	"""
+	warehouses = frappe.db.sql("select name, parent_warehouse from `tabWarehouse` order by name")
+	names = {name for name, _parent in warehouses}
+	children = {}
+	for name, parent in warehouses:
+		# a parent that no longer exists makes the warehouse a root
+		children.setdefault(parent if parent in names else None, []).append(name)
+
+	intervals, counter = {}, 0
+	stack = [(name, False) for name in reversed(children.get(None, []))]
+	while stack:
+		name, closing = stack.pop()
+		counter += 1
+		if closing:
+			intervals[name]["rgt"] = counter
+			continue
+
+		intervals[name] = {"lft": counter}
+		stack.append((name, True))
+		stack.extend((child, False) for child in reversed(children.get(name, [])))
+
+	unreachable = names - set(intervals)
+	if unreachable:
+		frappe.throw(
+			_("Warehouses {0} are part of a parent loop, fix their Parent Warehouse first.").format(
+				", ".join(sorted(unreachable))
+			)
+		)
+
+	bulk_update_by_name("Warehouse", intervals, update_modified=False)
+	clear_warehouse_cache(None)
+	return len(intervals)
+
+
+def get_warehouse_condition(warehouse, field="warehouse"):
+	"""Return an SQL condition on ``field`` matching ``warehouse`` or, for a group, any warehouse under it."""
+	details = get_warehouse_details(warehouse)
+	if not details or not details.is_group:
+		return f"{field} = {frappe.db.escape(warehouse)}"
+
+	return f"""exists (
+		select 1 from `tabWarehouse` descendant
+		where descendant.name = {field} and descendant.lft >= {cint(details.lft)} and descendant.rgt <= {cint(details.rgt)}
+	)"""
+
+
+@frappe.whitelist()
+def get_warehouse_stock(item_code=None):
+	"""Stock qty and value of every warehouse, groups included, in a single range join over Bin."""
+	frappe.has_permission("Bin", "read", throw=True)
+	return frappe.db.sql(
+		"""
+		select warehouse.name as warehouse, warehouse.is_group,
+			sum(bin.actual_qty) as actual_qty, sum(bin.stock_value) as stock_value
+		from `tabWarehouse` warehouse
+		inner join `tabWarehouse` descendant
+			on descendant.lft >= warehouse.lft and descendant.rgt <= warehouse.rgt
+		inner join `tabBin` bin on bin.warehouse = descendant.name
+		where ifnull(%(item_code)s, '') = '' or bin.item_code = %(item_code)s
+		group by warehouse.name, warehouse.is_group
+		order by warehouse.lft
+		""",
+		{"item_code": item_code},
+		as_dict=True,
+	)
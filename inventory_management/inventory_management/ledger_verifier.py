@@ -0,0 +1,282 @@
+"""Check the Stock Ledger, the bins and the item totals against the vouchers that produced them.
+
+Items are split into shards by the CRC32 of their code and every shard is checked by its
+own process, a chunk of items at a time, so memory is bounded by the chunk size and not by
+the size of the ledger. For each (item, warehouse) the qty posted by the submitted vouchers
+is compared with the ledger and the ledger with the Bin; for each item the ledger totals
+are compared with ``Item.item_stock`` and ``Item.moving_average_rate``.
+
+Mismatches are written as JSON lines. With ``repair`` the bins and item totals are
+rewritten from the ledger; a ledger that disagrees with its vouchers is only reported,
+since fixing it means reposting the voucher.
+"""
+
+import json
+import multiprocessing
+import os
+
+import frappe
+from frappe.utils import flt, now, now_datetime
+
+from inventory_management.inventory_management.doctype.bin.bin import new_bin, save_bins
+from inventory_management.inventory_management.master_cache import clear_items_after_commit
+from inventory_management.inventory_management.stock_projection import update_projection_after_commit
+from inventory_management.inventory_management.utils import bulk_update_by_name
+
+VERIFY_CHUNK_SIZE = 500
+VOUCHERS_PER_MISMATCH = 100
+
+# ledger rows of other voucher types (Opening Stock Import) are their own source
+VOUCHER_TYPES = ("Stock Entry", "Stock Reconciliation")
+VOUCHER_ROWS = """
+    select 'Stock Entry' as voucher_type, se.name as voucher_number, sed.item_code,
+        if(se.stock_entry_type = 'Receive', sed.to_warehouse, sed.from_warehouse) as warehouse,
+        if(se.stock_entry_type = 'Receive', sed.stock_qty, -sed.stock_qty) as qty
+    from `tabStock Entry Details` sed
+    inner join `tabStock Entry` se on se.name = sed.parent
+    where se.docstatus = 1 and ifnull(se.posting_status, '') not in ('Queued', 'Processing')
+    union all
+    select 'Stock Entry', se.name, sed.item_code, sed.to_warehouse, sed.stock_qty
+    from `tabStock Entry Details` sed
+    inner join `tabStock Entry` se on se.name = sed.parent
+    where se.docstatus = 1 and ifnull(se.posting_status, '') not in ('Queued', 'Processing')
+        and se.stock_entry_type = 'Transfer'
+    union all
+    select 'Stock Reconciliation', sr.name, srd.item_code, srd.warehouse, srd.stock_qty
+    from `tabStock Reconciliation Details` srd
+    inner join `tabStock Reconciliation` sr on sr.name = srd.parent
+    where sr.docstatus = 1 and ifnull(sr.posting_status, '') not in ('Queued', 'Processing')
+"""
+
+
+def verify_ledger(processes=4, repair=False, output=None):
+    """Check every shard and merge their reports into ``output``; returns the path and the mismatch counts."""
+    output = output or frappe.get_site_path(
+        "private", "files", f"stock_ledger_verification_{now_datetime():%Y%m%d_%H%M%S}.jsonl"
+    )
+    shards = max(processes, 1)
+    shard_paths = [f"{output}.shard{shard}" for shard in range(shards)]
+
+    if shards == 1:
+        results = [verify_shard(0, 1, repair, shard_paths[0])]
+    else:
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(shards) as pool:
+            results = pool.starmap(
+                run_shard,
+                [
+                    (frappe.local.site, frappe.local.sites_path, shard, shards, repair, shard_paths[shard])
+                    for shard in range(shards)
+                ],
+            )
+
+    counts = {}
+    with open(output, "w") as report:
+        for shard_path, shard_counts in zip(shard_paths, results):
+            with open(shard_path) as shard_report:
+                for line in shard_report:
+                    report.write(line)
+            os.remove(shard_path)
+            for check, count in shard_counts.items():
+                counts[check] = counts.get(check, 0) + count
+
+    return output, counts
+
+
+def run_shard(site, sites_path, shard, shards, repair, path):
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+    try:
+        return verify_shard(shard, shards, repair, path)
+    finally:
+        frappe.destroy()
+
+
+def verify_shard(shard, shards, repair, path):
+    counts = {}
+    with open(path, "w") as report:
+        for item_codes in iter_item_chunks(shard, shards):
+            for mismatch in verify_items(item_codes, repair):
+                report.write(json.dumps(mismatch, default=str) + "\n")
+                counts[mismatch["check"]] = counts.get(mismatch["check"], 0) + 1
+
+            if repair:
+                frappe.db.commit()
+            else:
+                frappe.db.rollback()
+    return counts
+
+
+def iter_item_chunks(shard, shards):
+    after = ""
+    while True:
+        item_codes = frappe.db.sql_list(
+            """
+            select name from `tabItem`
+            where mod(crc32(name), %(shards)s) = %(shard)s and name > %(after)s
+            order by name
+            limit %(limit)s
+            """,
+            {"shard": shard, "shards": shards, "after": after, "limit": VERIFY_CHUNK_SIZE},
+        )
+        if not item_codes:
+            return
+        yield item_codes
+        after = item_codes[-1]
+
+
+def verify_items(item_codes, repair=False):
+    """Return the mismatches of a chunk of items, repairing bins and item totals with ``repair``."""
+    values = {"item_codes": item_codes, "voucher_types": VOUCHER_TYPES}
+    if repair:
+        # postings lock the bins too, so the ledger cannot move between the check and the repair
+        frappe.db.sql(
+            "select name from `tabBin` where item_code in %(item_codes)s order by item_code, warehouse for update",
+            values,
+        )
+
+    ledger, source_ledger = {}, {}
+    for item_code, warehouse, voucher_type, qty, value in frappe.db.sql(
+        """
+        select item_code, warehouse, voucher_type in %(voucher_types)s,
+            sum(actual_qty), sum(stock_value_difference)
+        from `tabStock Ledger Entry`
+        where item_code in %(item_codes)s
+        group by item_code, warehouse, voucher_type in %(voucher_types)s
+        """,
+        values,
+    ):
+        qty, total = flt(qty), ledger.get((item_code, warehouse), (0.0, 0.0))
+        ledger[(item_code, warehouse)] = (total[0] + qty, total[1] + flt(value))
+        if voucher_type:
+            source_ledger[(item_code, warehouse)] = qty
+
+    expected = {
+        (item_code, warehouse): flt(qty)
+        for item_code, warehouse, qty in frappe.db.sql(
+            f"""
+            select item_code, warehouse, sum(qty)
+            from ({VOUCHER_ROWS}) voucher
+            where item_code in %(item_codes)s
+            group by item_code, warehouse
+            """,
+            values,
+        )
+    }
+    bins = {
+        (row.item_code, row.warehouse): row
+        for row in frappe.db.sql(
+            """
+            select name, item_code, warehouse, actual_qty, stock_value
+            from `tabBin` where item_code in %(item_codes)s
+            """,
+            values,
+            as_dict=True,
+        )
+    }
+    items = {
+        row.name: row
+        for row in frappe.db.sql(
+            "select name, item_stock, moving_average_rate from `tabItem` where name in %(item_codes)s",
+            values,
+            as_dict=True,
+        )
+    }
+
+    mismatches = []
+    for key in sorted(set(source_ledger) | set(expected)):
+        ledger_qty, expected_qty = source_ledger.get(key, 0.0), expected.get(key, 0.0)
+        if flt(ledger_qty - expected_qty, 6):
+            mismatches.append({
+                "check": "voucher",
+                "item_code": key[0],
+                "warehouse": key[1],
+                "expected_qty": expected_qty,
+                "ledger_qty": ledger_qty,
+                "vouchers": get_voucher_differences(*key),
+            })
+
+    bin_repairs = []
+    for key in sorted(set(ledger) | set(bins)):
+        ledger_qty, ledger_value = ledger.get(key, (0.0, 0.0))
+        bin = bins.get(key)
+        bin_qty, bin_value = (flt(bin.actual_qty), flt(bin.stock_value)) if bin else (0.0, 0.0)
+        if flt(ledger_qty - bin_qty, 6) or flt(ledger_value - bin_value, 2):
+            mismatches.append({
+                "check": "bin",
+                "item_code": key[0],
+                "warehouse": key[1],
+                "ledger_qty": ledger_qty,
+                "bin_qty": bin_qty,
+                "ledger_value": ledger_value,
+                "bin_value": bin_value,
+            })
+            repaired = new_bin(*key)
+            repaired.update({
+                "name": bin.name if bin else None,
+                "actual_qty": ledger_qty,
+                "stock_value": ledger_value,
+                "valuation_rate": ledger_value / ledger_qty if ledger_qty else 0.0,
+            })
+            bin_repairs.append(repaired)
+
+    item_totals = {}
+    for (item_code, _warehouse), (qty, value) in ledger.items():
+        total = item_totals.get(item_code, (0.0, 0.0))
+        item_totals[item_code] = (total[0] + qty, total[1] + value)
+
+    item_repairs = {}
+    for item_code, item in items.items():
+        qty, value = item_totals.get(item_code, (0.0, 0.0))
+        rate = value / qty if qty else 0.0
+        if flt(qty - flt(item.item_stock), 6):
+            mismatches.append(
+                {"check": "item_stock", "item_code": item_code, "ledger_qty": qty, "item_stock": flt(item.item_stock)}
+            )
+            item_repairs.setdefault(item_code, {})["item_stock"] = qty
+        if flt(rate - flt(item.moving_average_rate), 6):
+            mismatches.append({
+                "check": "valuation_rate",
+                "item_code": item_code,
+                "ledger_rate": rate,
+                "moving_average_rate": flt(item.moving_average_rate),
+            })
+            item_repairs.setdefault(item_code, {})["moving_average_rate"] = rate
+
+    if repair:
+        # bins are rewritten whole, so a FIFO bin restarts its queue from the repaired balance
+        save_bins(bin_repairs)
+        update_projection_after_commit(bin_repairs, now())
+        bulk_update_by_name("Item", item_repairs)
+        clear_items_after_commit(item_repairs)
+
+    return mismatches
+
+
+def get_voucher_differences(item_code, warehouse):
+    """The vouchers whose ledger rows for the key do not add up to what the voucher posts."""
+    return frappe.db.sql(
+        f"""
+        select voucher_type, voucher_number, sum(ledger_qty) as ledger_qty, sum(expected_qty) as expected_qty
+        from (
+            select voucher_type, voucher_number, actual_qty as ledger_qty, 0 as expected_qty
+            from `tabStock Ledger Entry`
+            where item_code = %(item_code)s and warehouse = %(warehouse)s and voucher_type in %(voucher_types)s
+            union all
+            select voucher_type, voucher_number, 0, qty
+            from ({VOUCHER_ROWS}) voucher
+            where item_code = %(item_code)s and warehouse = %(warehouse)s
+        ) movement
+        group by voucher_type, voucher_number
+        having abs(sum(ledger_qty) - sum(expected_qty)) > 0.000001
+        order by voucher_type, voucher_number
+        limit %(limit)s
+        """,
+        {
+            "item_code": item_code,
+            "warehouse": warehouse,
+            "voucher_types": VOUCHER_TYPES,
+            "limit": VOUCHERS_PER_MISMATCH,
+        },
+        as_dict=True,
+    )
@@ -0,0 +1,221 @@
+"""Cached Item and Warehouse lookups for the posting paths and reports.
+
+Lookups go through a small LRU kept on ``frappe.local`` for the current request or job,
+then through a Redis hash per doctype, and only then to the database. Entries are dropped
+by the doc_events hooks when an Item, Warehouse or UOM changes, and after commit when a
+posting rewrites item valuation rates. Hit and miss counters per tier are kept in Redis.
+"""
+
+import pickle
+from collections import OrderedDict
+
+import frappe
+from frappe.utils import flt
+
+ITEM_CACHE = "inventory_management:item_master"
+WAREHOUSE_CACHE = "inventory_management:warehouse_master"
+CACHE_STATS = "inventory_management:master_cache_stats"
+LOCAL_CACHE_SIZE = 1024
+
+ITEM_FIELDS = ("item_name", "unit_of_measure", "item_group", "moving_average_rate")
+WAREHOUSE_FIELDS = ("is_group", "parent_warehouse", "lft", "rgt")
+
+
+def get_item_details(item_code):
+    """Return ``item_name``, ``unit_of_measure``, ``item_group``, ``moving_average_rate`` and
+    ``uom_conversions`` (UOM -> factor to the stock UOM) of an item, or None."""
+    return get_items([item_code]).get(item_code)
+
+
+def get_conversion_factor(item_code, uom):
+    """How many of the item's stock UOM one ``uom`` holds, or None when the item has no factor for it."""
+    item = get_item_details(item_code)
+    if not item:
+        return None
+    if not uom or uom == item.unit_of_measure:
+        return 1.0
+    return (item.get("uom_conversions") or {}).get(uom)
+
+
+def get_items(item_codes):
+    return get_cached(ITEM_CACHE, item_codes, load_items)
+
+
+def get_warehouse_details(warehouse):
+    """Return ``is_group``, ``parent_warehouse``, ``lft``, ``rgt``, ``ancestors`` and ``leaves`` of a warehouse, or None."""
+    return get_warehouses([warehouse]).get(warehouse)
+
+
+def get_warehouses(warehouses):
+    return get_cached(WAREHOUSE_CACHE, warehouses, load_warehouses)
+
+
+def get_cached(cache_name, names, load):
+    local_cache = get_local_cache(cache_name)
+    stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+    found, remote, missing = {}, [], []
+
+    for name in set(filter(None, names)):
+        if name in local_cache:
+            local_cache.move_to_end(name)
+            found[name] = local_cache[name]
+            stats["local_hits"] += 1
+        else:
+            remote.append(name)
+
+    # one round trip for everything the local cache does not have, and one to store what was loaded
+    redis_key = frappe.cache.make_key(cache_name)
+    if remote:
+        for name, value in zip(remote, frappe.cache.hmget(redis_key, remote)):
+            if value is not None:
+                found[name] = pickle.loads(value)
+                stats["redis_hits"] += 1
+            else:
+                missing.append(name)
+
+    if missing:
+        stats["misses"] += len(missing)
+        loaded = load(missing)
+        if loaded:
+            pipeline = frappe.cache.pipeline()
+            pipeline.hset(redis_key, mapping={name: pickle.dumps(value) for name, value in loaded.items()})
+            pipeline.execute()
+            found.update(loaded)
+
+    for name, value in found.items():
+        local_cache[name] = value
+        local_cache.move_to_end(name)
+    while len(local_cache) > LOCAL_CACHE_SIZE:
+        local_cache.popitem(last=False)
+
+    record_stats(cache_name, stats)
+    return found
+
+
+def get_local_cache(cache_name):
+    if not hasattr(frappe.local, "master_cache"):
+        frappe.local.master_cache = {}
+    return frappe.local.master_cache.setdefault(cache_name, OrderedDict())
+
+
+def load_items(item_codes):
+    items = {
+        item.name: item
+        for item in frappe.get_all(
+            "Item", filters={"name": ("in", item_codes)}, fields=["name", *ITEM_FIELDS]
+        )
+    }
+    for item in items.values():
+        item.uom_conversions = {}
+    if items:
+        for row in frappe.get_all(
+            "UOM Conversion Detail",
+            filters={"parenttype": "Item", "parent": ("in", list(items))},
+            fields=["parent", "uom", "conversion_factor"],
+        ):
+            items[row.parent].uom_conversions[row.uom] = flt(row.conversion_factor)
+    return items
+
+
+def load_warehouses(warehouses):
+    details = {
+        warehouse.name: warehouse
+        for warehouse in frappe.get_all(
+            "Warehouse", filters={"name": ("in", warehouses)}, fields=["name", *WAREHOUSE_FIELDS]
+        )
+    }
+    for warehouse in details.values():
+        warehouse.ancestors = get_ancestors(warehouse)
+        warehouse.leaves = get_leaves(warehouse) if warehouse.is_group else []
+    return details
+
+
+def get_leaves(warehouse):
+    return frappe.db.sql_list(
+        """
+        select name from `tabWarehouse`
+        where lft > %s and rgt < %s and is_group = 0
+        order by lft
+        """,
+        (warehouse.lft, warehouse.rgt),
+    )
+
+
+def get_ancestors(warehouse):
+    return frappe.db.sql_list(
+        """
+        select name from `tabWarehouse`
+        where lft < %s and rgt > %s
+        order by lft
+        """,
+        (warehouse.lft, warehouse.rgt),
+    )
+
+
+def record_stats(cache_name, stats):
+    # counted in memory and written to Redis once per request or job by flush_cache_stats
+    counters = frappe.local.master_cache.setdefault("stats", {})
+    for counter, count in stats.items():
+        if count:
+            key = f"{cache_name}:{counter}"
+            counters[key] = counters.get(key, 0) + count
+
+
+def flush_cache_stats():
+    counters = getattr(frappe.local, "master_cache", {}).pop("stats", None)
+    if not counters:
+        return
+
+    pipeline = frappe.cache.pipeline()
+    for key, count in counters.items():
+        pipeline.hincrby(frappe.cache.make_key(CACHE_STATS), key, count)
+    pipeline.execute()
+
+
+@frappe.whitelist()
+def get_cache_stats():
+    """Hit and miss counters since the last reset, per cache and tier."""
+    frappe.only_for("System Manager")
+    # read raw, the wrapper's hgetall would build the key again and unpickle the plain counters
+    pipeline = frappe.cache.pipeline()
+    pipeline.hgetall(frappe.cache.make_key(CACHE_STATS))
+    return {frappe.safe_decode(key): int(count) for key, count in pipeline.execute()[0].items()}
+
+
+def reset_cache_stats():
+    frappe.cache.delete(frappe.cache.make_key(CACHE_STATS))
+
+
+def clear_items(item_codes):
+    item_codes = list(filter(None, item_codes))
+    if not item_codes:
+        return
+
+    local_cache = get_local_cache(ITEM_CACHE)
+    for item_code in item_codes:
+        local_cache.pop(item_code, None)
+        frappe.cache.hdel(ITEM_CACHE, item_code)
+
+
+def clear_items_after_commit(item_codes):
+    # dropped again after commit, in case a reader refilled the cache from the old row in the meantime
+    item_codes = list(item_codes)
+    clear_items(item_codes)
+    frappe.db.after_commit.add(lambda: clear_items(item_codes))
+
+
+def clear_item_cache(doc, method=None, *args):
+    # after_rename passes the old name first
+    clear_items([doc.name, *args[:1]])
+
+
+def clear_warehouse_cache(doc, method=None, *args):
+    # a moved or renamed warehouse changes the ancestors of everything below it
+    get_local_cache(WAREHOUSE_CACHE).clear()
+    frappe.cache.delete_value(WAREHOUSE_CACHE)
+
+
+def clear_uom_cache(doc, method=None, *args):
+    # items store their UOM by name, so a renamed or deleted UOM can touch any of them
+    get_local_cache(ITEM_CACHE).clear()
+    frappe.cache.delete_value(ITEM_CACHE)
@@ -0,0 +1,174 @@
+"""Sampled profiling of stock postings and reports.
+
+Off unless the site config sets ``stock_profile_sample_rate`` (0 to 1). A sampled call
+records its wall time, the number and time of its queries and the rows it handled as one
+JSON line in ``logs/stock_profile.jsonl`` of the site, or the
+file ``stock_profile_log`` names, which is rotated by size. Calls that are not sampled only
+pay for a random draw, and a call made inside a sampled one is covered by it and not
+profiled again.
+
+Tracing memory slows allocation-heavy code down several times, so peak Python memory is
+only recorded for a further ``stock_profile_memory_sample_rate`` share of the sampled
+calls. Those are marked ``traced`` and left out of the timing percentiles.
+"""
+
+import functools
+import json
+import logging
+import math
+import os
+import random
+import time
+import tracemalloc
+from logging.handlers import RotatingFileHandler
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import now
+
+PROFILE_LOG = "stock_profile.jsonl"
+PROFILE_LOG_SIZE = 10 * 1024 * 1024
+PROFILE_LOG_COUNT = 5
+PERCENTILES = (50, 95, 99)
+
+
+def profiled(operation):
+    """Profile a sampled share of the calls of ``fn`` under ``operation``.
+
+    Rows are the child rows of a document method, or the data rows of a report's
+    ``(columns, data)`` result.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            sample_rate = frappe.conf.get("stock_profile_sample_rate")
+            if not sample_rate or getattr(frappe.local, "stock_profile", None) or random.random() >= sample_rate:
+                return fn(*args, **kwargs)
+            return run_profiled(operation, fn, args, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def run_profiled(operation, fn, args, kwargs):
+    doc = args[0] if args and isinstance(args[0], Document) else None
+    profile = frappe.local.stock_profile = {"queries": 0, "query_seconds": 0.0}
+    sql = frappe.db.sql
+
+    def timed_sql(*sql_args, **sql_kwargs):
+        start = time.perf_counter()
+        try:
+            return sql(*sql_args, **sql_kwargs)
+        finally:
+            profile["queries"] += 1
+            profile["query_seconds"] += time.perf_counter() - start
+
+    traced = random.random() < (frappe.conf.get("stock_profile_memory_sample_rate") or 0)
+    tracing = tracemalloc.is_tracing()
+    if traced:
+        if tracing:
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+
+    frappe.db.sql = timed_sql
+    start, result, failed = time.perf_counter(), None, False
+    try:
+        result = fn(*args, **kwargs)
+        return result
+    except Exception:
+        failed = True
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        frappe.db.sql = sql
+        peak_memory = tracemalloc.get_traced_memory()[1] if traced else None
+        if traced and not tracing:
+            tracemalloc.stop()
+        frappe.local.stock_profile = None
+
+        profile.update(
+            operation=operation,
+            document=doc.name if doc else None,
+            timestamp=now(),
+            seconds=seconds,
+            rows=count_rows(doc, result),
+            peak_memory=peak_memory,
+            traced=traced,
+            failed=failed,
+        )
+        get_profile_logger().info(json.dumps(profile, default=str))
+
+
+def count_rows(doc, result):
+    if doc:
+        return len(doc.get_all_children())
+    if isinstance(result, (tuple, list)) and len(result) > 1 and isinstance(result[1], list):
+        return len(result[1])
+    return None
+
+
+def get_profile_logger():
+    # one logger per log file, writing bare JSON lines
+    path = get_profile_log_path()
+    logger = logging.getLogger(f"{__name__}.{path}")
+    if not logger.handlers:
+        handler = RotatingFileHandler(path, maxBytes=PROFILE_LOG_SIZE, backupCount=PROFILE_LOG_COUNT)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def get_profile_log_path():
+    return frappe.conf.get("stock_profile_log") or frappe.get_site_path("logs", PROFILE_LOG)
+
+
+def read_profiles():
+    path = get_profile_log_path()
+    for log_path in [f"{path}.{idx}" for idx in range(PROFILE_LOG_COUNT, 0, -1)] + [path]:
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path) as log:
+            for line in log:
+                if line.strip():
+                    yield json.loads(line)
+
+
+@frappe.whitelist()
+def get_profile_summary(operation=None, slowest=10):
+    """Percentiles of the recorded calls per operation, and the slowest documents of each.
+
+    Calls that traced memory only count towards ``traced_calls`` and ``peak_memory``.
+    """
+    frappe.only_for("System Manager")
+
+    profiles = {}
+    for profile in read_profiles():
+        if not operation or profile["operation"] == operation:
+            profiles.setdefault(profile["operation"], []).append(profile)
+
+    summary = {}
+    for name, profiles_of_operation in sorted(profiles.items()):
+        calls = sorted(
+            (call for call in profiles_of_operation if not call.get("traced")), key=lambda call: call["seconds"]
+        )
+        traced = [call["peak_memory"] for call in profiles_of_operation if call.get("traced")]
+        summary[name] = {
+            "calls": len(calls),
+            **{f"p{percentile}": get_percentile(calls, percentile) for percentile in PERCENTILES},
+            "slowest": calls[::-1][: int(slowest)],
+            "traced_calls": len(traced),
+            "peak_memory": max(traced, default=None),
+        }
+    return summary
+
+
+def get_percentile(calls, percentile):
+    # nearest rank over calls sorted by wall time
+    if not calls:
+        return None
+    return calls[max(math.ceil(percentile / 100 * len(calls)) - 1, 0)]["seconds"]
@@ -26,6 +26,13 @@ frappe.query_reports["Stock Balance"] = {
             "fieldtype": "Link",
             "options": "Item"
         },
+        {
+            "fieldname": "mode",
+            "label": __("Mode"),
+            "fieldtype": "Select",
+            "options": "Summary\nDetailed",
+            "default": "Summary"
+        },
         {
             "fieldname": "include_uom",
             "label": __("Include UOM"),
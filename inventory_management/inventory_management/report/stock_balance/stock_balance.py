@@ -1,19 +1,156 @@
 import frappe
 from typing import List, Dict, Any
 from frappe import _
-from frappe.utils import flt
-from frappe.query_builder import DocType, Field
-from frappe.query_builder.functions import Cast
+from frappe.utils import add_days, flt
 
+from inventory_management.inventory_management.doctype.stock_closing_balance.stock_closing_balance import (
+    get_snapshot_date,
+)
+from inventory_management.inventory_management.doctype.warehouse.warehouse import get_warehouse_condition
+from inventory_management.inventory_management.profiling import profiled
+
+@profiled("Stock Balance.execute")
 def execute(filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
     columns, data = [], []
+    filters = frappe._dict(filters or {})
 
-    columns = get_columns()
-    data = get_data(filters)
+    if filters.get("mode") == "Detailed":
+        columns = get_columns(filters)
+        data = get_data(filters)
+    else:
+        columns = get_summary_columns(filters)
+        data = get_summary_data(filters)
 
     return columns, data
 
-def get_columns():
+def get_summary_columns(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    columns = [
+        {"label": _("Item Code"), "fieldname": "item_code", "fieldtype": "Link", "options": "Item", "width": 120},
+        {"label": _("Warehouse"), "fieldname": "warehouse", "fieldtype": "Link", "options": "Warehouse", "width": 120},
+        {"label": _("Stock UOM"), "fieldname": "stock_uom", "fieldtype": "Link", "options": "UOM", "width": 90},
+        {"label": _("Opening Qty"), "fieldname": "opening_qty", "fieldtype": "Float", "width": 100},
+        {"label": _("Opening Value"), "fieldname": "opening_value", "fieldtype": "Currency", "width": 110},
+        {"label": _("In Qty"), "fieldname": "in_qty", "fieldtype": "Float", "width": 100},
+        {"label": _("In Value"), "fieldname": "in_val", "fieldtype": "Currency", "width": 110},
+        {"label": _("Out Qty"), "fieldname": "out_qty", "fieldtype": "Float", "width": 100},
+        {"label": _("Out Value"), "fieldname": "out_val", "fieldtype": "Currency", "width": 110},
+        {"label": _("Balance Qty"), "fieldname": "balance_qty", "fieldtype": "Float", "width": 100},
+        {"label": _("Balance Value"), "fieldname": "balance_val", "fieldtype": "Currency", "width": 110},
+        {"label": _("Valuation Rate"), "fieldname": "valuation_rate", "fieldtype": "Currency", "width": 110},
+    ]
+
+    return columns + get_uom_columns(filters)
+
+def get_uom_columns(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if not filters.get("include_uom"):
+        return []
+    return [{
+        "label": _("Balance Qty (as per {0})").format(filters.get("include_uom")),
+        "fieldname": "balance_qty_in_uom",
+        "fieldtype": "Float",
+        "width": 140,
+    }]
+
+def get_uom_conversion(filters: Dict[str, Any], qty: str):
+    # the factors are joined in from the item's UOM Conversion Detail rows (indexed on parent),
+    # so no row is converted in Python; items without the UOM show no converted qty
+    if not filters.get("include_uom"):
+        return "", "", ""
+
+    column = f""",
+            {qty} / if(item.unit_of_measure = %(include_uom)s, 1, conversion.conversion_factor) as balance_qty_in_uom"""
+    join = """
+        left join `tabUOM Conversion Detail` conversion
+            on conversion.parenttype = 'Item' and conversion.parent = item.name and conversion.uom = %(include_uom)s"""
+    return column, join, ", conversion.conversion_factor"
+
+def get_summary_data(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    query, values = get_summary_query(filters)
+    data = frappe.db.sql(query, values, as_dict=True)
+
+    for row in data:
+        row.valuation_rate = flt(row.balance_val) / flt(row.balance_qty) if flt(row.balance_qty) else 0
+
+    return data
+
+def get_summary_query(filters: Dict[str, Any]):
+    # one row per (item_code, warehouse): the opening balance starts from the latest closing
+    # snapshot before from_date, so only the ledger rows after that snapshot are aggregated.
+    # The in/out movements are split by the sign of actual_qty within the period.
+    values = {
+        "from_date": filters.get("from_date"),
+        "to_date": filters.get("to_date"),
+        "item_code": filters.get("item_code"),
+        "warehouse": filters.get("warehouse"),
+        "include_uom": filters.get("include_uom"),
+        "snapshot_date": get_snapshot_date(
+            add_days(filters.get("from_date"), -1), filters.get("item_code"), filters.get("warehouse")
+        ),
+    }
+
+    conditions = ""
+    if filters.get("item_code"):
+        conditions += " and item_code = %(item_code)s"
+
+    snapshot_rows = ""
+    tail_condition = ""
+    if values["snapshot_date"]:
+        snapshot_rows = f"""
+            select item_code, warehouse, actual_qty as opening_qty, stock_value as opening_value,
+                0 as in_qty, 0 as in_val, 0 as out_qty, 0 as out_val
+            from `tabStock Closing Balance`
+            where closing_date = %(snapshot_date)s {conditions}
+                {get_warehouse_filter(filters, "Stock Closing Balance")}
+            union all
+        """
+        tail_condition = "and posting_date > %(snapshot_date)s"
+
+    uom_column, uom_join, uom_group = get_uom_conversion(
+        filters, "sum(balance.opening_qty + balance.in_qty - balance.out_qty)"
+    )
+
+    query = f"""
+        select
+            balance.item_code,
+            balance.warehouse,
+            item.unit_of_measure as stock_uom,
+            sum(balance.opening_qty) as opening_qty,
+            sum(balance.opening_value) as opening_value,
+            sum(balance.in_qty) as in_qty,
+            sum(balance.in_val) as in_val,
+            sum(balance.out_qty) as out_qty,
+            sum(balance.out_val) as out_val,
+            sum(balance.opening_qty + balance.in_qty - balance.out_qty) as balance_qty,
+            sum(balance.opening_value + balance.in_val - balance.out_val) as balance_val
+            {uom_column}
+        from (
+            {snapshot_rows}
+            select
+                item_code,
+                warehouse,
+                sum(case when posting_date < %(from_date)s then actual_qty else 0 end) as opening_qty,
+                sum(case when posting_date < %(from_date)s then stock_value_difference else 0 end) as opening_value,
+                sum(case when posting_date >= %(from_date)s and actual_qty > 0 then actual_qty else 0 end) as in_qty,
+                sum(case when posting_date >= %(from_date)s and actual_qty > 0 then stock_value_difference else 0 end) as in_val,
+                sum(case when posting_date >= %(from_date)s and actual_qty < 0 then -actual_qty else 0 end) as out_qty,
+                sum(case when posting_date >= %(from_date)s and actual_qty < 0 then -stock_value_difference else 0 end) as out_val
+            from `tabStock Ledger Entry`
+            where is_cancelled = 0 and posting_date <= %(to_date)s {tail_condition} {conditions}
+                {get_warehouse_filter(filters, "Stock Ledger Entry")}
+            group by item_code, warehouse
+        ) balance
+        inner join `tabItem` item on item.name = balance.item_code
+        {uom_join}
+        group by balance.item_code, balance.warehouse, item.unit_of_measure {uom_group}
+        order by balance.item_code, balance.warehouse
+    """
+
+    return query, values
+
+def get_columns(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return get_detailed_columns() + get_uom_columns(filters)
+
+def get_detailed_columns():
     return [
         {"label": _("Posting Date"), "fieldname": "posting_date", "fieldtype": "Date", "width": 100},
         {"label": _("Item Code"), "fieldname": "item_code", "fieldtype": "Link", "options": "Item", "width": 100},
@@ -21,7 +158,8 @@ def get_columns():
         {"label": _("Quantity"), "fieldname": "quantity", "fieldtype": "Float", "width": 100},
         {"label": _("Rate"), "fieldname": "rate", "fieldtype": "Currency", "width": 100},
         {"label": _("Balance Qty"), "fieldname": "balance_qty", "fieldtype": "Float", "width": 100},
-        {"label": _("Voucher Number"), "fieldname": "voucher_number", "fieldtype": "Link", "options": "Stock Entry", "width": 100},
+        {"label": _("Voucher Type"), "fieldname": "voucher_type", "fieldtype": "Link", "options": "DocType", "width": 100},
+        {"label": _("Voucher Number"), "fieldname": "voucher_number", "fieldtype": "Dynamic Link", "options": "voucher_type", "width": 100},
         {"label": _("In Qty"), "fieldname": "in_qty", "fieldtype": "Float", "width": 100},
         {"label": _("Out Qty"), "fieldname": "out_qty", "fieldtype": "Float", "width": 100},
         {"label": _("In Rate"), "fieldname": "in_rate", "fieldtype": "Currency", "width": 100},
@@ -32,63 +170,89 @@ def get_columns():
     ]
 
 def get_data(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
-    sl_entries = get_stock_ledger_entries(filters)
-    balance_qty = 0
-    balance_val = 0
-    data = []
-
-    for entry in sl_entries:
-        in_qty = flt(entry.get("quantity")) if entry.get("quantity") > 0 else 0
-        out_qty = -flt(entry.get("quantity")) if entry.get("quantity") < 0 else 0
-        in_val = in_qty * flt(entry.get("rate"))
-        out_val = out_qty * flt(entry.get("rate"))
-        balance_qty += flt(entry.get("quantity"))
-        balance_val += flt(entry.get("quantity")) * flt(entry.get("rate"))
-
-        data.append({
-            "posting_date": entry.get("posting_date"),
-            "item_code": entry.get("item_code"),
-            "warehouse": entry.get("warehouse"),
-            "quantity": entry.get("quantity"),
-            "rate": entry.get("rate"),
-            "balance_qty": balance_qty,
-            "voucher_number": entry.get("voucher_number"),
-            "in_qty": in_qty,
-            "out_qty": out_qty,
-            "in_rate": entry.get("rate") if in_qty else 0,
-            "out_rate": entry.get("rate") if out_qty else 0,
-            "in_val": in_val,
-            "out_val": out_val,
-            "balance_val": balance_val,
-        })
+    query, values = get_detailed_query(filters)
+    return frappe.db.sql(query, values, as_dict=True)
 
-    return data
+def get_detailed_query(filters: Dict[str, Any]):
+    # running balances are partitioned by (item_code, warehouse) and computed by the database.
+    # The window starts after the latest closing snapshot, whose balance is added as the opening,
+    # and covers the rows before from_date too so the first row of the period starts from the right total.
+    values = {
+        "from_date": filters.get("from_date"),
+        "to_date": filters.get("to_date"),
+        "item_code": filters.get("item_code"),
+        "warehouse": filters.get("warehouse"),
+        "include_uom": filters.get("include_uom"),
+        "snapshot_date": None,
+    }
 
-def get_stock_ledger_entries(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
-    sle = DocType("Stock Ledger Entry")
-
-    query = (
-        frappe.qb.from_(sle)
-        .select(
-            sle.posting_date.as_("date"),
-            sle.item_code,
-            sle.warehouse,
-            Cast(sle.quantity, 'DECIMAL(10, 2)').as_("quantity"),
-            sle.rate,
-            sle.voucher_number,
-            sle.posting_date
+    conditions = ""
+    if filters.get("to_date"):
+        conditions += " and posting_date <= %(to_date)s"
+    if filters.get("item_code"):
+        conditions += " and item_code = %(item_code)s"
+    conditions += get_warehouse_filter(filters, "Stock Ledger Entry")
+
+    period_condition = ""
+    if filters.get("from_date"):
+        values["snapshot_date"] = get_snapshot_date(
+            add_days(filters.get("from_date"), -1), filters.get("item_code"), filters.get("warehouse")
         )
+        period_condition = "where ledger.posting_date >= %(from_date)s"
+    if values["snapshot_date"]:
+        conditions += " and posting_date > %(snapshot_date)s"
+
+    uom_column, uom_join, _uom_group = get_uom_conversion(
+        filters, "(ifnull(opening.actual_qty, 0) + ledger.running_qty)"
     )
+    if uom_join:
+        uom_join = "left join `tabItem` item on item.name = ledger.item_code" + uom_join
 
-    if filters.get("from_date"):
-        query = query.where(sle.posting_date >= filters.get("from_date"))
-    if filters.get("to_date"):
-        query = query.where(sle.posting_date <= filters.get("to_date"))
-    if filters.get("item_code"):
-        query = query.where(sle.item_code == filters.get("item_code"))
-    if filters.get("warehouse"):
-        query = query.where(sle.warehouse == filters.get("warehouse"))
+    query = f"""
+        select
+            ledger.posting_date,
+            ledger.item_code,
+            ledger.warehouse,
+            ledger.actual_qty as quantity,
+            ledger.rate,
+            ifnull(opening.actual_qty, 0) + ledger.running_qty as balance_qty,
+            ledger.voucher_type,
+            ledger.voucher_number,
+            if(ledger.actual_qty > 0, ledger.actual_qty, 0) as in_qty,
+            if(ledger.actual_qty < 0, -ledger.actual_qty, 0) as out_qty,
+            if(ledger.actual_qty > 0, ledger.rate, 0) as in_rate,
+            if(ledger.actual_qty < 0, ledger.rate, 0) as out_rate,
+            if(ledger.actual_qty > 0, ledger.stock_value_difference, 0) as in_val,
+            if(ledger.actual_qty < 0, -ledger.stock_value_difference, 0) as out_val,
+            ifnull(opening.stock_value, 0) + ledger.running_value as balance_val
+            {uom_column}
+        from (
+            select
+                name, creation, posting_date, item_code, warehouse, actual_qty, rate,
+                stock_value_difference, voucher_type, voucher_number,
+                sum(actual_qty) over running as running_qty,
+                sum(stock_value_difference) over running as running_value
+            from `tabStock Ledger Entry`
+            where is_cancelled = 0 {conditions}
+            window running as (
+                partition by item_code, warehouse
+                order by posting_date, creation, name
+                rows between unbounded preceding and current row
+            )
+        ) ledger
+        left join `tabStock Closing Balance` opening
+            on opening.closing_date = %(snapshot_date)s
+            and opening.item_code = ledger.item_code
+            and opening.warehouse = ledger.warehouse
+        {uom_join}
+        {period_condition}
+        order by ledger.posting_date, ledger.creation, ledger.name
+    """
 
-    query = query.orderby(sle.posting_date).orderby(sle.creation)
+    return query, values
 
-    return query.run(as_dict=True)
+def get_warehouse_filter(filters: Dict[str, Any], doctype: str) -> str:
+    # a group warehouse matches every warehouse in its lft/rgt range
+    if not filters.get("warehouse"):
+        return ""
+    return " and " + get_warehouse_condition(filters.get("warehouse"), f"`tab{doctype}`.warehouse")
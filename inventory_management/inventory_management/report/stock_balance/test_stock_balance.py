@@ -0,0 +1,86 @@
+# Copyright (c) 2024, Poorvi Solutions and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, today
+
+from inventory_management.inventory_management.report.stock_balance.stock_balance import execute
+from inventory_management.inventory_management.stock_ledger import make_sl_entries
+
+TEST_ITEMS = ("_Test Balance Item 1", "_Test Balance Item 2")
+TEST_WAREHOUSE = "_Test Balance Warehouse"
+
+
+class TestStockBalance(FrappeTestCase):
+	def setUp(self):
+		if not frappe.db.exists("Warehouse", TEST_WAREHOUSE):
+			frappe.get_doc({"doctype": "Warehouse", "warehouse_name": TEST_WAREHOUSE}).insert()
+		for item_code in TEST_ITEMS:
+			if not frappe.db.exists("Item", item_code):
+				frappe.get_doc({"doctype": "Item", "item_code": item_code, "item_name": item_code}).insert()
+
+	def test_detailed_balances_are_per_item_and_warehouse(self):
+		item_1, item_2 = TEST_ITEMS
+		post(item_1, 10, 5, add_days(today(), -2))
+		post(item_2, 3, 7, today())
+		post(item_1, -4, 5, today())
+		post(item_2, 2, 7, today())
+
+		_columns, data = execute({
+			"mode": "Detailed",
+			"from_date": add_days(today(), -1),
+			"to_date": today(),
+			"warehouse": TEST_WAREHOUSE,
+		})
+
+		# the movement before from_date is the opening of item 1, not a row of the period
+		self.assertEqual(
+			[(row.item_code, row.quantity, row.balance_qty, row.balance_val) for row in data],
+			[(item_2, 3, 3, 21), (item_1, -4, 6, 30), (item_2, 2, 5, 35)],
+		)
+
+
+	def test_balance_is_converted_to_the_included_uom(self):
+		for uom in ("_Test Unit", "_Test Box"):
+			if not frappe.db.exists("UOM", uom):
+				frappe.get_doc({"doctype": "UOM", "uom": uom}).insert()
+		boxed, loose = (f"_Test Balance UOM Item {frappe.generate_hash(length=6)}" for _ in range(2))
+		frappe.get_doc({
+			"doctype": "Item",
+			"item_code": boxed,
+			"item_name": boxed,
+			"unit_of_measure": "_Test Unit",
+			"uoms": [{"uom": "_Test Box", "conversion_factor": 4}],
+		}).insert()
+		frappe.get_doc({"doctype": "Item", "item_code": loose, "item_name": loose, "unit_of_measure": "_Test Unit"}).insert()
+		post(boxed, 10, 5, today())
+		post(loose, 3, 7, today())
+
+		for mode in ("Summary", "Detailed"):
+			_columns, data = execute({
+				"mode": mode,
+				"from_date": today(),
+				"to_date": today(),
+				"warehouse": TEST_WAREHOUSE,
+				"include_uom": "_Test Box",
+			})
+
+			# an item without a factor for the UOM has nothing to show
+			self.assertEqual(
+				{row.item_code: (row.balance_qty, row.balance_qty_in_uom) for row in data if row.item_code in (boxed, loose)},
+				{boxed: (10, 2.5), loose: (3, None)},
+			)
+
+def post(item_code, qty, rate, posting_date):
+	make_sl_entries([
+		{
+			"item_code": item_code,
+			"warehouse": TEST_WAREHOUSE,
+			"qty": qty,
+			"rate": rate,
+			"posting_date": posting_date,
+			"voucher_type": "Stock Entry",
+			"voucher_number": frappe.generate_hash(length=10),
+		}
+	])
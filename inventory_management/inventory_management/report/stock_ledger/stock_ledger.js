@@ -39,9 +39,38 @@ frappe.query_reports["Stock Ledger"] = {
             "label": __("Item Group"),
             "fieldtype": "Link",
             "options": "Item Group"
+        },
+        {
+            "fieldname": "after",
+            "label": __("After Entry"),
+            "fieldtype": "Data",
+            "hidden": 1
         }
     ],
 
+    "onload": function(report) {
+        report.page.add_inner_button(__("Next Page"), function() {
+            const data = report.data || [];
+            if (data.length) {
+                report.set_filter_value("after", data[data.length - 1].name);
+            }
+        });
+        report.page.add_inner_button(__("First Page"), function() {
+            report.set_filter_value("after", "");
+        });
+
+        ["CSV", "Excel"].forEach(function(file_format) {
+            report.page.add_inner_button(__(file_format), function() {
+                const filters = report.get_filter_values(true);
+                delete filters.after;
+                open_url_post("/api/method/inventory_management.inventory_management.report.stock_ledger.stock_ledger.export_stock_ledger", {
+                    filters: JSON.stringify(filters),
+                    file_format: file_format
+                });
+            }, __("Export"));
+        });
+    },
+
     "formatter": function(value, row, column, data, default_formatter) {
         value = default_formatter(value, row, column, data);
 
@@ -1,21 +1,41 @@
+import csv
+import io
+import tempfile
+from itertools import islice
+
 import frappe
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
 from frappe import _
-from frappe.utils import flt
+from frappe.utils import cint, flt
 from frappe.query_builder import Order
+from openpyxl import Workbook
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import wrap_file
+
+from inventory_management.inventory_management.master_cache import get_item_details, get_warehouse_details
+from inventory_management.inventory_management.profiling import profiled
+
+PAGE_LENGTH = 500
+FETCH_SIZE = 2000
 
+@profiled("Stock Ledger.execute")
 def execute(filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-    columns, data = get_columns(), get_data(filters)
+    # the UI gets one page at a time; the page after is requested with the last row's name
+    filters = frappe._dict(filters or {})
+    page_length = cint(filters.get("page_length")) or PAGE_LENGTH
+    columns, data = get_columns(), list(islice(get_data(filters, after=filters.get("after")), page_length))
     return columns, data
 
 def get_columns():
     return [
         {"label": _("Item Code"), "fieldname": "item_code", "fieldtype": "Link", "options": "Item", "width": 100},
+        {"label": _("Item Name"), "fieldname": "item_name", "fieldtype": "Data", "width": 150},
         {"label": _("Warehouse"), "fieldname": "warehouse", "fieldtype": "Link", "options": "Warehouse", "width": 100},
         {"label": _("Quantity"), "fieldname": "quantity", "fieldtype": "Float", "width": 100},
         {"label": _("Rate"), "fieldname": "rate", "fieldtype": "Currency", "width": 100},
         {"label": _("Balance Qty"), "fieldname": "balance_qty", "fieldtype": "Float", "width": 100},
-        {"label": _("Voucher Number"), "fieldname": "voucher_number", "fieldtype": "Link", "options": "Stock Entry", "width": 100},
+        {"label": _("Voucher Type"), "fieldname": "voucher_type", "fieldtype": "Link", "options": "DocType", "width": 100},
+        {"label": _("Voucher Number"), "fieldname": "voucher_number", "fieldtype": "Dynamic Link", "options": "voucher_type", "width": 100},
         {"label": _("Posting Date"), "fieldname": "posting_date", "fieldtype": "Date", "width": 100},
         {"label": _("In Qty"), "fieldname": "in_qty", "fieldtype": "Float", "width": 100},
         {"label": _("Out Qty"), "fieldname": "out_qty", "fieldtype": "Float", "width": 100},
@@ -24,53 +44,70 @@ def get_columns():
         {"label": _("Balance Value"), "fieldname": "balance_value", "fieldtype": "Currency", "width": 100},
     ]
 
-def get_data(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
-    sl_entries = get_stock_ledger_entries(filters)
-    balance_qty, balance_value = {}, {}
-    data = []
+def get_data(filters: Dict[str, Any], after: str = None) -> Iterator[Dict[str, Any]]:
+    for entry in iter_stock_ledger_entries(filters, after=after):
+        actual_qty = flt(entry.get("actual_qty"))
+        in_qty = actual_qty if actual_qty > 0 else 0
+        out_qty = -actual_qty if actual_qty < 0 else 0
 
-    for entry in sl_entries:
-        key = (entry.get("item_code"), entry.get("warehouse"))
-        balance_qty[key] = balance_qty.get(key, 0) + flt(entry.get("quantity"))
-        balance_value[key] = balance_value.get(key, 0) + flt(entry.get("quantity")) * flt(entry.get("rate"))
+        item = get_item_details(entry.get("item_code")) or {}
 
-        in_qty = flt(entry.get("quantity")) if flt(entry.get("quantity")) > 0 else 0
-        out_qty = -flt(entry.get("quantity")) if flt(entry.get("quantity")) < 0 else 0
-        avg_rate = flt(balance_value[key]) / flt(balance_qty[key]) if flt(balance_qty[key]) else 0
-        valuation_rate = flt(entry.get("rate"))
-
-        data.append({
+        yield {
+            "name": entry.get("name"),
             "item_code": entry.get("item_code"),
+            "item_name": item.get("item_name"),
             "warehouse": entry.get("warehouse"),
-            "quantity": entry.get("quantity"),
+            "quantity": actual_qty,
             "rate": entry.get("rate"),
-            "balance_qty": balance_qty[key],
+            "balance_qty": flt(entry.get("qty_after_transaction")),
+            "voucher_type": entry.get("voucher_type"),
             "voucher_number": entry.get("voucher_number"),
             "posting_date": entry.get("posting_date"),
             "in_qty": in_qty,
             "out_qty": out_qty,
-            "avg_rate": avg_rate,
-            "valuation_rate": valuation_rate,
-            "balance_value": balance_value[key],
-        })
+            "avg_rate": flt(entry.get("valuation_rate")),
+            "valuation_rate": flt(entry.get("rate")),
+            "balance_value": flt(entry.get("stock_value")),
+        }
+
+def iter_stock_ledger_entries(filters: Dict[str, Any], after: str = None, fetch_size: int = FETCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yield the ledger rows in (posting_date, creation, name) order, one keyset page at a time.
+
+    Each page seeks past the last row of the previous one, so memory stays at ``fetch_size``
+    rows and no page has to skip over the rows before it.
+    """
+    cursor = frappe.db.get_value("Stock Ledger Entry", after, ["posting_date", "creation", "name"]) if after else None
 
-    return data
+    while True:
+        entries = get_stock_ledger_entries(filters, cursor, fetch_size)
+        yield from entries
+        if len(entries) < fetch_size:
+            break
+        cursor = (entries[-1].posting_date, entries[-1].creation, entries[-1].name)
 
-def get_stock_ledger_entries(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+def get_stock_ledger_entries(filters: Dict[str, Any], cursor: Tuple = None, limit: int = FETCH_SIZE) -> List[Dict[str, Any]]:
     sle = frappe.qb.DocType("Stock Ledger Entry")
     query = (
         frappe.qb.from_(sle)
         .select(
+            sle.name,
+            sle.creation,
             sle.item_code,
             sle.warehouse,
-            sle.quantity,
+            sle.actual_qty,
             sle.rate,
+            sle.qty_after_transaction,
+            sle.valuation_rate,
+            sle.stock_value,
+            sle.voucher_type,
             sle.voucher_number,
             sle.posting_date,
         )
-        .where(sle.docstatus < 2)
+        .where(sle.is_cancelled == 0)
         .orderby(sle.posting_date, Order.asc)
         .orderby(sle.creation, Order.asc)
+        .orderby(sle.name, Order.asc)
+        .limit(limit)
     )
 
     if filters.get("from_date"):
@@ -80,6 +117,59 @@ def get_stock_ledger_entries(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
     if filters.get("item_code"):
         query = query.where(sle.item_code == filters.get("item_code"))
     if filters.get("warehouse"):
-        query = query.where(sle.warehouse == filters.get("warehouse"))
+        details = get_warehouse_details(filters.get("warehouse")) or frappe._dict()
+        if details.is_group:
+            # a group warehouse covers every warehouse in its lft/rgt range
+            warehouse = frappe.qb.DocType("Warehouse")
+            query = (
+                query.inner_join(warehouse)
+                .on(warehouse.name == sle.warehouse)
+                .where((warehouse.lft >= details.lft) & (warehouse.rgt <= details.rgt))
+            )
+        else:
+            query = query.where(sle.warehouse == filters.get("warehouse"))
+
+    if cursor:
+        posting_date, creation, name = cursor
+        query = query.where(
+            (sle.posting_date > posting_date)
+            | (
+                (sle.posting_date == posting_date)
+                & ((sle.creation > creation) | ((sle.creation == creation) & (sle.name > name)))
+            )
+        )
 
     return query.run(as_dict=True)
+
+@frappe.whitelist()
+def export_stock_ledger(filters, file_format="CSV"):
+    """Download the whole report, writing it row by row to a temporary file instead of building it in memory."""
+    frappe.has_permission("Stock Ledger Entry", "read", throw=True)
+    filters = frappe._dict(frappe.parse_json(filters) or {})
+    columns = get_columns()
+    header = [column["label"] for column in columns]
+    rows = ([row.get(column["fieldname"]) for column in columns] for row in get_data(filters))
+
+    export_file = tempfile.TemporaryFile()
+    if file_format == "Excel":
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Stock Ledger")
+        sheet.append(header)
+        for row in rows:
+            sheet.append(row)
+        workbook.save(export_file)
+        extension, mimetype = "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        text_file = io.TextIOWrapper(export_file, encoding="utf-8", newline="", write_through=True)
+        writer = csv.writer(text_file)
+        writer.writerow(header)
+        writer.writerows(rows)
+        text_file.detach()
+        extension, mimetype = "csv", "text/csv"
+
+    export_file.seek(0)
+    response = Response(
+        wrap_file(frappe.local.request.environ, export_file), mimetype=mimetype, direct_passthrough=True
+    )
+    response.headers["Content-Disposition"] = f'attachment; filename="stock_ledger.{extension}"'
+    return response
@@ -0,0 +1,30 @@
+frappe.query_reports["Stock Ledger Entry"] = {
+    "filters": [
+        {
+            "fieldname": "as_of_date",
+            "label": __("As Of Date"),
+            "fieldtype": "Date",
+            "default": frappe.datetime.get_today(),
+            "reqd": 1
+        },
+        {
+            "fieldname": "window_days",
+            "label": __("Consumption Window (Days)"),
+            "fieldtype": "Int",
+            "default": 30,
+            "reqd": 1
+        },
+        {
+            "fieldname": "warehouse",
+            "label": __("Warehouse"),
+            "fieldtype": "Link",
+            "options": "Warehouse"
+        },
+        {
+            "fieldname": "item_code",
+            "label": __("Item"),
+            "fieldtype": "Link",
+            "options": "Item"
+        }
+    ]
+};
@@ -1,9 +1,201 @@
 # Copyright (c) 2024, Test and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
+import numpy as np
+from frappe import _
+from frappe.utils import add_days, cint, getdate, today
 
+from inventory_management.inventory_management.doctype.stock_closing_balance.stock_closing_balance import (
+	get_snapshot_date,
+)
+from inventory_management.inventory_management.doctype.warehouse.warehouse import get_warehouse_condition
+from inventory_management.inventory_management.profiling import profiled
 
+# upper bounds of the age buckets in days, anything older falls into the last one
+AGE_BUCKETS = np.array([30, 60, 90])
+AGE_BUCKET_FIELDS = ("age_0_30", "age_31_60", "age_61_90", "age_90_plus")
+DEFAULT_WINDOW_DAYS = 30
+FETCH_SIZE = 100000
+
+
+@profiled("Stock Ledger Entry.execute")
 def execute(filters=None):
-	columns, data = [], []
-	return columns, data
+	filters = frappe._dict(filters or {})
+	filters.as_of_date = getdate(filters.get("as_of_date") or today())
+	filters.window_days = cint(filters.get("window_days")) or DEFAULT_WINDOW_DAYS
+	return get_columns(), get_data(filters)
+
+
+def get_columns():
+	return [
+		{"label": _("Item Code"), "fieldname": "item_code", "fieldtype": "Link", "options": "Item", "width": 120},
+		{"label": _("Warehouse"), "fieldname": "warehouse", "fieldtype": "Link", "options": "Warehouse", "width": 120},
+		{"label": _("Balance Qty"), "fieldname": "balance_qty", "fieldtype": "Float", "width": 100},
+		{"label": _("0-30"), "fieldname": "age_0_30", "fieldtype": "Float", "width": 90},
+		{"label": _("31-60"), "fieldname": "age_31_60", "fieldtype": "Float", "width": 90},
+		{"label": _("61-90"), "fieldname": "age_61_90", "fieldtype": "Float", "width": 90},
+		{"label": _("90+"), "fieldname": "age_90_plus", "fieldtype": "Float", "width": 90},
+		{"label": _("Consumed Qty"), "fieldname": "consumed_qty", "fieldtype": "Float", "width": 110},
+		{"label": _("Avg Daily Consumption"), "fieldname": "avg_daily_consumption", "fieldtype": "Float", "width": 150},
+		{"label": _("Days of Cover"), "fieldname": "days_of_cover", "fieldtype": "Float", "width": 110},
+	]
+
+
+def get_data(filters):
+	ageing = StockAgeing(filters.window_days)
+	for item_codes, warehouses, ages, qtys in iter_ledger_chunks(filters):
+		ageing.add(item_codes, warehouses, ages, qtys)
+	return ageing.get_rows()
+
+
+class StockAgeing:
+	"""Running totals per (item_code, warehouse), fed a chunk of ledger columns at a time.
+
+	Receipts are only kept as totals per age bucket: the stock on hand is the newest
+	receipts that add up to the balance, so filling the balance from the youngest bucket
+	back gives the same buckets as matching every issue against the oldest receipt.
+	"""
+
+	def __init__(self, window_days):
+		self.window_days = window_days
+		self.keys, self.key_index = [], {}
+		self.balance = np.zeros(0)
+		self.received = np.zeros((0, len(AGE_BUCKET_FIELDS)))
+		self.consumed = np.zeros(0)
+
+	def add(self, item_codes, warehouses, ages, qtys):
+		rows = self.get_key_rows(item_codes, warehouses)
+		count = len(self.keys)
+		self.balance += np.bincount(rows, weights=qtys, minlength=count)
+
+		received = qtys > 0
+		buckets = np.searchsorted(AGE_BUCKETS, ages[received])
+		self.received += np.bincount(
+			rows[received] * len(AGE_BUCKET_FIELDS) + buckets,
+			weights=qtys[received],
+			minlength=count * len(AGE_BUCKET_FIELDS),
+		).reshape(count, len(AGE_BUCKET_FIELDS))
+
+		consumed = (qtys < 0) & (ages < self.window_days)
+		self.consumed -= np.bincount(rows[consumed], weights=qtys[consumed], minlength=count)
+
+	def get_key_rows(self, item_codes, warehouses):
+		# factorise the chunk's keys with array ops, the dict only sees each distinct key once
+		items, item_rows = np.unique(item_codes, return_inverse=True)
+		warehouse_names, warehouse_rows = np.unique(warehouses, return_inverse=True)
+		chunk_keys, key_rows = np.unique(item_rows * len(warehouse_names) + warehouse_rows, return_inverse=True)
+
+		key_map = np.empty(len(chunk_keys), dtype=np.int64)
+		for idx, chunk_key in enumerate(chunk_keys):
+			key = (items[chunk_key // len(warehouse_names)], warehouse_names[chunk_key % len(warehouse_names)])
+			if key not in self.key_index:
+				self.key_index[key] = len(self.keys)
+				self.keys.append(key)
+			key_map[idx] = self.key_index[key]
+
+		added = len(self.keys) - len(self.balance)
+		if added:
+			self.balance = np.concatenate([self.balance, np.zeros(added)])
+			self.received = np.concatenate([self.received, np.zeros((added, len(AGE_BUCKET_FIELDS)))])
+			self.consumed = np.concatenate([self.consumed, np.zeros(added)])
+
+		return key_map[key_rows.ravel()]
+
+	def get_aged_qty(self):
+		aged = np.zeros_like(self.received)
+		remaining = np.clip(self.balance, 0, None)
+		for bucket in range(len(AGE_BUCKET_FIELDS) - 1):
+			aged[:, bucket] = np.minimum(remaining, self.received[:, bucket])
+			remaining -= aged[:, bucket]
+		# stock left after every receipt is used up came in before the ledger (or the snapshot) started
+		aged[:, -1] = remaining
+		return aged
+
+	def get_rows(self):
+		aged = self.get_aged_qty()
+		avg_daily = self.consumed / self.window_days
+		with np.errstate(divide="ignore", invalid="ignore"):
+			days_of_cover = np.where(avg_daily > 0, np.clip(self.balance, 0, None) / avg_daily, np.nan)
+
+		active = np.flatnonzero(np.round(self.balance, 9).astype(bool) | (self.consumed > 0))
+		data = []
+		for idx in sorted(active, key=lambda idx: self.keys[idx]):
+			row = frappe._dict(
+				item_code=self.keys[idx][0],
+				warehouse=self.keys[idx][1],
+				balance_qty=float(self.balance[idx]),
+				consumed_qty=float(self.consumed[idx]),
+				avg_daily_consumption=float(avg_daily[idx]),
+				days_of_cover=None if np.isnan(days_of_cover[idx]) else float(days_of_cover[idx]),
+			)
+			row.update(zip(AGE_BUCKET_FIELDS, aged[idx].tolist()))
+			data.append(row)
+		return data
+
+
+def iter_ledger_chunks(filters):
+	"""Yield (item_codes, warehouses, ages, qtys) arrays of at most ``FETCH_SIZE`` rows.
+
+	Everything older than the last age bucket and the consumption window only adds to the
+	balance, so it is read from a closing snapshot when there is one.
+	"""
+	values = {
+		"as_of_date": filters.as_of_date,
+		"snapshot_date": get_snapshot_date(
+			add_days(filters.as_of_date, -max(int(AGE_BUCKETS[-1]) + 1, filters.window_days)),
+			filters.get("item_code"),
+			filters.get("warehouse"),
+		),
+	}
+
+	sources = []
+	if values["snapshot_date"]:
+		sources.append(
+			f"""
+			select name, item_code, warehouse, datediff(%(as_of_date)s, closing_date), actual_qty
+			from `tabStock Closing Balance`
+			where closing_date = %(snapshot_date)s {get_conditions(filters, "Stock Closing Balance")}
+			"""
+		)
+	sources.append(
+		f"""
+		select name, item_code, warehouse, datediff(%(as_of_date)s, posting_date), actual_qty
+		from `tabStock Ledger Entry`
+		where is_cancelled = 0 and posting_date <= %(as_of_date)s
+			{"and posting_date > %(snapshot_date)s" if values["snapshot_date"] else ""}
+			{get_conditions(filters, "Stock Ledger Entry")}
+		"""
+	)
+
+	for query in sources:
+		# keyset pagination over the primary key keeps every fetch a short range scan
+		after = ""
+		while True:
+			rows = frappe.db.sql(
+				f"{query} and name > %(after)s order by name limit %(limit)s",
+				{**values, "after": after, "limit": FETCH_SIZE},
+			)
+			if not rows:
+				break
+
+			names, item_codes, warehouses, ages, qtys = zip(*rows)
+			yield (
+				np.array(item_codes, dtype=object),
+				np.array(warehouses, dtype=object),
+				np.array(ages, dtype=np.int64),
+				np.array(qtys, dtype=np.float64),
+			)
+			if len(rows) < FETCH_SIZE:
+				break
+			after = names[-1]
+
+
+def get_conditions(filters, doctype):
+	conditions = ""
+	if filters.get("item_code"):
+		conditions += f" and `tab{doctype}`.item_code = {frappe.db.escape(filters.get('item_code'))}"
+	if filters.get("warehouse"):
+		# a group warehouse matches every warehouse in its lft/rgt range
+		conditions += " and " + get_warehouse_condition(filters.get("warehouse"), f"`tab{doctype}`.warehouse")
+	return conditions
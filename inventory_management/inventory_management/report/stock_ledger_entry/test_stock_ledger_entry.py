@@ -0,0 +1,51 @@
+# Copyright (c) 2024, Poorvi Solutions and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, today
+
+from inventory_management.inventory_management.report.stock_ledger_entry.stock_ledger_entry import execute
+from inventory_management.inventory_management.stock_ledger import make_sl_entries
+
+TEST_WAREHOUSE = "_Test Ageing Warehouse"
+
+
+class TestStockLedgerEntry(FrappeTestCase):
+	def setUp(self):
+		if not frappe.db.exists("Warehouse", TEST_WAREHOUSE):
+			frappe.get_doc({"doctype": "Warehouse", "warehouse_name": TEST_WAREHOUSE}).insert()
+		self.item_code = f"_Test Ageing Item {frappe.generate_hash(length=6)}"
+		frappe.get_doc({"doctype": "Item", "item_code": self.item_code, "item_name": self.item_code}).insert()
+
+	def test_stock_on_hand_is_aged_from_the_newest_receipts(self):
+		post(self.item_code, 10, add_days(today(), -100))
+		post(self.item_code, 5, add_days(today(), -45))
+		post(self.item_code, 8, add_days(today(), -5))
+		post(self.item_code, -12, add_days(today(), -2))
+
+		_columns, data = execute({"item_code": self.item_code, "window_days": 30})
+
+		# the issue used up the oldest receipt and 2 of the next one
+		(row,) = data
+		self.assertEqual(
+			(row.balance_qty, row.age_0_30, row.age_31_60, row.age_61_90, row.age_90_plus),
+			(11, 8, 3, 0, 0),
+		)
+		self.assertEqual(row.consumed_qty, 12)
+		self.assertAlmostEqual(row.avg_daily_consumption, 0.4)
+		self.assertAlmostEqual(row.days_of_cover, 27.5)
+
+
+def post(item_code, qty, posting_date):
+	make_sl_entries([
+		{
+			"item_code": item_code,
+			"warehouse": TEST_WAREHOUSE,
+			"qty": qty,
+			"rate": 10,
+			"posting_date": posting_date,
+			"voucher_type": "Stock Entry",
+			"voucher_number": frappe.generate_hash(length=10),
+		}
+	])
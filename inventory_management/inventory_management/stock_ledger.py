@@ -0,0 +1,433 @@
+import random
+import time
+from datetime import timedelta
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt, getdate, now, now_datetime
+
+from inventory_management.inventory_management.doctype.bin.bin import (
+    get_bins,
+    new_bin,
+    save_bins,
+    update_item_stock,
+    update_item_valuation_rates,
+)
+from inventory_management.inventory_management.doctype.stock_closing_balance.stock_closing_balance import (
+    invalidate_snapshots,
+)
+from inventory_management.inventory_management.doctype.stock_repost.stock_repost import queue_reposts
+from inventory_management.inventory_management.master_cache import (
+    clear_items_after_commit,
+    get_conversion_factor,
+    get_items,
+    get_warehouses,
+)
+from inventory_management.inventory_management.stock_projection import update_projection_after_commit
+from inventory_management.inventory_management.valuation import (
+    FIFO,
+    get_fifo_queue,
+    get_valuation_methods,
+    update_fifo_valuation,
+)
+
+SLE_SERIES = "SLE-"
+SLE_SERIES_DIGITS = 5
+
+POSTING_RETRIES = 3
+POSTING_RETRY_DELAY = 0.1
+
+# vouchers with more rows than this are posted by a background job instead of the web request
+LARGE_VOUCHER_ROWS = 500
+POSTING_JOB_TIMEOUT = 3600
+
+SLE_FIELDS = (
+    "item_code",
+    "warehouse",
+    "posting_date",
+    "voucher_type",
+    "voucher_number",
+    "voucher_detail_no",
+    "is_cancelled",
+    "actual_qty",
+    "rate",
+    "qty_after_transaction",
+    "valuation_rate",
+    "stock_value",
+    "stock_value_difference",
+)
+
+
+class NegativeStockError(frappe.ValidationError):
+    pass
+
+
+def make_sl_entries(sl_entries, allow_negative_stock=True):
+    """Append one Stock Ledger Entry per movement and update the bins of the batch.
+
+    Each entry is a dict with ``item_code``, ``warehouse``, ``qty`` (signed),
+    ``rate``, ``posting_date``, ``voucher_type``, ``voucher_number`` and
+    ``voucher_detail_no``. An entry with ``rate_from_row`` comes in at the
+    rate the earlier entry at that index went out at, which is how both legs
+    of a transfer are posted in one batch. The bins of all (item_code,
+    warehouse) pairs are locked and read once, the valuation is updated
+    incrementally in memory (moving average, or FIFO for items whose Item
+    Group says so), and the ledger rows and bins are written back in bulk.
+    Returns the ledger rows in the order of ``sl_entries``.
+    """
+    if not sl_entries:
+        return []
+
+    keys = {(sle["item_code"], sle["warehouse"]) for sle in sl_entries}
+    validate_masters(keys)
+    bins = get_bins(keys, for_update=True)
+    # taken once the bins are locked, so versions of the same bin only ever increase
+    version = now()
+    valuation_methods = get_valuation_methods({key[0] for key in keys})
+    # decoded once per bin and encoded again after the batch
+    fifo_queues = {}
+
+    ledger_rows = []
+    for sle in sl_entries:
+        key = (sle["item_code"], sle["warehouse"])
+        bin = bins.get(key) or bins.setdefault(key, new_bin(*key))
+        qty, rate = flt(sle["qty"]), flt(sle["rate"])
+        if sle.get("rate_from_row") is not None:
+            source = ledger_rows[sle["rate_from_row"]]
+            if source["actual_qty"]:
+                rate = source["stock_value_difference"] / source["actual_qty"]
+        is_reversal = sle.get("stock_value_difference") is not None
+
+        previous_stock_value = bin["stock_value"]
+        if valuation_methods[key[0]] == FIFO:
+            queue = fifo_queues.get(key) or fifo_queues.setdefault(key, get_fifo_queue(bin))
+            update_fifo_valuation(
+                bin, queue, qty, rate, flt(sle["stock_value_difference"]) if is_reversal else None
+            )
+        elif is_reversal:
+            reverse_bin_valuation(bin, qty, flt(sle["stock_value_difference"]), sle.get("prior_valuation_rate"))
+        else:
+            update_bin_valuation(bin, qty, rate)
+        stock_value_difference = bin["stock_value"] - previous_stock_value
+        if not allow_negative_stock and bin["actual_qty"] < 0:
+            frappe.throw(
+                _("Stock levels cannot go negative for item {0} in warehouse {1}.").format(*key),
+                NegativeStockError,
+            )
+
+        ledger_rows.append({
+            "item_code": sle["item_code"],
+            "warehouse": sle["warehouse"],
+            "posting_date": sle["posting_date"],
+            "voucher_type": sle["voucher_type"],
+            "voucher_number": sle["voucher_number"],
+            "voucher_detail_no": sle.get("voucher_detail_no"),
+            "is_cancelled": cint(sle.get("is_cancelled")),
+            "actual_qty": qty,
+            # outgoing stock leaves at the rate it was valued at, incoming stock and reversals at their own rate
+            "rate": rate if qty >= 0 or is_reversal else stock_value_difference / qty,
+            "qty_after_transaction": bin["actual_qty"],
+            "valuation_rate": bin["valuation_rate"],
+            "stock_value": bin["stock_value"],
+            "stock_value_difference": stock_value_difference,
+        })
+
+    for key, queue in fifo_queues.items():
+        bins[key]["fifo_queue"] = queue.dumps()
+
+    insert_sl_entries(ledger_rows)
+    save_bins(list(bins.values()))
+    update_projection_after_commit(bins.values(), version)
+    update_item_valuation_rates({key[0] for key in keys})
+    qty_by_item = {}
+    for row in ledger_rows:
+        qty_by_item[row["item_code"]] = qty_by_item.get(row["item_code"], 0) + row["actual_qty"]
+    update_item_stock(qty_by_item)
+    clear_items_after_commit({key[0] for key in keys})
+
+    # postings (and cancellations, which keep the original date) into a closed day make its snapshots stale
+    earliest = {}
+    for row in ledger_rows:
+        key = (row["item_code"], row["warehouse"])
+        posting_date = getdate(row["posting_date"])
+        if key not in earliest or posting_date < earliest[key]:
+            earliest[key] = posting_date
+    invalidate_snapshots(earliest)
+    # and leave the balances of the later rows to be revalued in the background
+    queue_reposts(earliest)
+
+    return ledger_rows
+
+
+def reverse_sl_entries(voucher_type, voucher_number, allow_negative_stock=True):
+    """Cancel a voucher by appending the opposite of each of its ledger rows.
+
+    Each row is taken back by its exact quantity and value, so the valuation rate before
+    the voucher is restored. With ``allow_negative_stock`` off, every (item, warehouse)
+    of the voucher is checked before anything is written.
+    """
+    sl_entries = frappe.db.sql(
+        """
+        select item_code, warehouse, posting_date, voucher_detail_no, actual_qty, rate,
+            qty_after_transaction, stock_value, stock_value_difference
+        from `tabStock Ledger Entry`
+        where voucher_type = %s and voucher_number = %s and is_cancelled = 0
+        order by posting_date, creation
+        """,
+        (voucher_type, voucher_number),
+        as_dict=True,
+    )
+    if not sl_entries:
+        return []
+
+    if not allow_negative_stock:
+        validate_reversal_stock(sl_entries)
+
+    frappe.db.sql(
+        """
+        update `tabStock Ledger Entry` set is_cancelled = 1
+        where voucher_type = %s and voucher_number = %s
+        """,
+        (voucher_type, voucher_number),
+    )
+
+    return make_sl_entries(
+        [
+            {
+                "item_code": sle.item_code,
+                "warehouse": sle.warehouse,
+                "qty": -flt(sle.actual_qty),
+                "rate": sle.rate,
+                "stock_value_difference": -flt(sle.stock_value_difference),
+                "prior_valuation_rate": get_prior_valuation_rate(sle),
+                "posting_date": sle.posting_date,
+                "voucher_type": voucher_type,
+                "voucher_number": voucher_number,
+                "voucher_detail_no": sle.voucher_detail_no,
+                "is_cancelled": 1,
+            }
+            for sle in reversed(sl_entries)
+        ],
+        allow_negative_stock=allow_negative_stock,
+    )
+
+
+def validate_reversal_stock(sl_entries):
+    """Throw for every (item, warehouse) whose stock would end up negative once the voucher is reversed."""
+    reversed_qty = {}
+    for sle in sl_entries:
+        key = (sle.item_code, sle.warehouse)
+        reversed_qty[key] = reversed_qty.get(key, 0) - flt(sle.actual_qty)
+
+    bins = get_bins(reversed_qty, for_update=True)
+    negative = [
+        key for key, qty in reversed_qty.items() if flt((bins.get(key) or {}).get("actual_qty", 0) + qty, 9) < 0
+    ]
+    if negative:
+        frappe.throw(
+            _("Cancelling this voucher would make stock negative for: {0}").format(
+                ", ".join(_("item {0} in warehouse {1}").format(*key) for key in sorted(negative))
+            ),
+            NegativeStockError,
+        )
+
+
+def get_prior_valuation_rate(sle):
+    # the rate the bin had just before this row, recovered from the balances stored on it
+    prior_qty = flt(sle.qty_after_transaction) - flt(sle.actual_qty)
+    if flt(prior_qty, 9) > 0:
+        return (flt(sle.stock_value) - flt(sle.stock_value_difference)) / prior_qty
+
+
+def run_with_lock_retry(fn, *args, retries=POSTING_RETRIES, **kwargs):
+    """Run a whole unit of posting work, starting it over after a deadlock or lock timeout.
+
+    A deadlock rolls back the entire transaction, so this is meant for callers that own
+    their transaction (background jobs, scripts), not for ``on_submit`` itself.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except (frappe.QueryDeadlockError, frappe.QueryTimeoutError):
+            frappe.db.rollback()
+            if attempt == retries:
+                raise
+            time.sleep(random.uniform(0, POSTING_RETRY_DELAY * (2 ** attempt)))
+
+
+def enqueue_posting(doc, method):
+    """Post a submitted voucher from the ``long`` queue by calling ``doc.<method>()`` there."""
+    doc.db_set("posting_status", "Queued")
+    frappe.enqueue(
+        post_voucher,
+        queue="long",
+        timeout=POSTING_JOB_TIMEOUT,
+        job_id=f"post_voucher::{doc.doctype}::{doc.name}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        voucher_type=doc.doctype,
+        voucher_number=doc.name,
+        method=method,
+    )
+    frappe.msgprint(
+        _("The stock ledger of {0} {1} will be posted in the background.").format(_(doc.doctype), doc.name),
+        alert=True,
+    )
+
+
+def post_voucher(voucher_type, voucher_number, method):
+    """Background job that posts a queued voucher. Safe to run more than once for the same voucher."""
+    if frappe.db.get_value(voucher_type, voucher_number, "posting_status") == "Completed":
+        return
+
+    frappe.db.set_value(voucher_type, voucher_number, "posting_status", "Processing", update_modified=False)
+    frappe.db.commit()
+
+    try:
+        run_with_lock_retry(post_locked_voucher, voucher_type, voucher_number, method)
+        frappe.db.set_value(voucher_type, voucher_number, "posting_status", "Completed", update_modified=False)
+        frappe.db.commit()
+    except Exception:
+        frappe.db.rollback()
+        frappe.log_error(title=_("Stock posting failed for {0} {1}").format(voucher_type, voucher_number))
+        frappe.db.set_value(voucher_type, voucher_number, "posting_status", "Failed", update_modified=False)
+        frappe.db.commit()
+
+    notify_posting_status(voucher_type, voucher_number)
+
+
+def post_locked_voucher(voucher_type, voucher_number, method):
+    # the voucher row lock serialises reruns of the job, and the ledger check turns a rerun into a no-op
+    frappe.db.sql(f"select name from `tab{voucher_type}` where name = %s for update", voucher_number)
+    doc = frappe.get_doc(voucher_type, voucher_number)
+    if doc.docstatus == 1 and not is_voucher_posted(voucher_type, voucher_number):
+        getattr(doc, method)()
+
+
+def notify_posting_status(voucher_type, voucher_number):
+    # the open form reloads itself, and the user who submitted gets an alert wherever they are
+    message = {
+        "voucher_type": voucher_type,
+        "voucher_number": voucher_number,
+        "posting_status": frappe.db.get_value(voucher_type, voucher_number, "posting_status"),
+    }
+    frappe.publish_realtime("stock_posting_status", message, doctype=voucher_type, docname=voucher_number)
+    frappe.publish_realtime("stock_posting_status", message, user=frappe.session.user)
+
+
+def is_voucher_posted(voucher_type, voucher_number):
+    return bool(
+        frappe.db.exists(
+            "Stock Ledger Entry",
+            {"voucher_type": voucher_type, "voucher_number": voucher_number, "is_cancelled": 0},
+        )
+    )
+
+
+def validate_posting_finished(doc):
+    if doc.posting_status in ("Queued", "Processing"):
+        frappe.throw(
+            _("The stock ledger of {0} {1} is still being posted, try again once it has finished.").format(
+                _(doc.doctype), doc.name
+            )
+        )
+
+
+def update_bin_valuation(bin, qty, rate):
+    """Apply one movement to a bin using the moving-average method."""
+    if qty > 0:
+        stock_value = bin["stock_value"] + qty * rate
+        bin["actual_qty"] += qty
+        if bin["actual_qty"] > 0:
+            bin["valuation_rate"] = stock_value / bin["actual_qty"]
+        else:
+            bin["valuation_rate"] = rate
+    else:
+        # outgoing stock leaves at the current rate, falling back to the row rate for a new bin
+        bin["valuation_rate"] = bin["valuation_rate"] or rate
+        bin["actual_qty"] += qty
+
+    bin["stock_value"] = bin["actual_qty"] * bin["valuation_rate"]
+    return bin
+
+
+def reverse_bin_valuation(bin, qty, value_difference, prior_valuation_rate=None):
+    """Take back an earlier movement by its exact quantity and value."""
+    bin["actual_qty"] += qty
+    stock_value = bin["stock_value"] + value_difference
+    if flt(bin["actual_qty"], 9) > 0:
+        bin["valuation_rate"] = stock_value / bin["actual_qty"]
+    elif prior_valuation_rate:
+        bin["valuation_rate"] = prior_valuation_rate
+
+    bin["stock_value"] = bin["actual_qty"] * bin["valuation_rate"]
+    return bin
+
+
+def insert_sl_entries(ledger_rows):
+    # rows of one batch share a posting instant, so creation is spaced by a microsecond
+    # to keep (posting_date, creation) a strict order for running balances
+    timestamp, user = now_datetime(), frappe.session.user
+    names = make_sle_names(len(ledger_rows))
+
+    values = []
+    for idx, (name, row) in enumerate(zip(names, ledger_rows)):
+        row["name"] = name
+        created = timestamp + timedelta(microseconds=idx)
+        values.append((name, created, created, user, user, 0) + tuple(row[field] for field in SLE_FIELDS))
+
+    frappe.db.bulk_insert(
+        "Stock Ledger Entry",
+        fields=["name", "creation", "modified", "owner", "modified_by", "docstatus", *SLE_FIELDS],
+        values=values,
+    )
+
+
+def make_sle_names(count):
+    """Reserve ``count`` consecutive numbers of the SLE-.##### series in one round trip."""
+    current = frappe.db.sql(
+        "select `current` from `tabSeries` where name = %s for update", SLE_SERIES
+    )
+    if current:
+        start = cint(current[0][0])
+        frappe.db.sql(
+            "update `tabSeries` set `current` = `current` + %s where name = %s",
+            (count, SLE_SERIES),
+        )
+    else:
+        start = 0
+        frappe.db.sql(
+            "insert into `tabSeries` (name, `current`) values (%s, %s)", (SLE_SERIES, count)
+        )
+
+    return [f"{SLE_SERIES}{number:0{SLE_SERIES_DIGITS}d}" for number in range(start + 1, start + count + 1)]
+
+
+def validate_masters(keys):
+    """Check the items and warehouses of a batch through the master cache."""
+    items = get_items({key[0] for key in keys})
+    warehouses = get_warehouses({key[1] for key in keys})
+    for item_code, warehouse in sorted(keys):
+        if item_code not in items:
+            frappe.throw(_("Item {0} does not exist.").format(item_code))
+        if warehouse not in warehouses:
+            frappe.throw(_("Warehouse {0} does not exist.").format(warehouse))
+        if warehouses[warehouse].is_group:
+            frappe.throw(_("Warehouse {0} is a group warehouse, stock can only be posted to its children.").format(warehouse))
+
+
+def set_stock_qty(items):
+    """Convert the ``quantity`` of voucher rows in their ``uom`` to ``stock_qty`` in the stock UOM of the item."""
+    for item in items:
+        conversion_factor = get_conversion_factor(item.item_code, item.uom) if item.uom else 1.0
+        if not conversion_factor:
+            frappe.throw(
+                _("Row {0}: Item {1} has no conversion factor for UOM {2}.").format(item.idx, item.item_code, item.uom)
+            )
+        item.conversion_factor = conversion_factor
+        item.stock_qty = flt(item.quantity) * conversion_factor
+
+
+def validate_warehouse(item_code, warehouse, flow):
+    if not warehouse:
+        frappe.throw(_("Warehouse not specified for item code {0} in flow {1}").format(item_code, flow))
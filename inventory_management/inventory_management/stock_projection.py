@@ -0,0 +1,177 @@
+"""Redis projection of Bin.actual_qty for fast availability reads.
+
+Every item has one Redis hash mapping warehouse -> qty, plus ``<warehouse>|v`` holding the
+version (posting timestamp) of that qty. Postings write their final bin quantities after
+commit, and a write only lands if its version is newer than the stored one, so commits
+finishing out of order cannot leave an older quantity behind. Reads that miss fall back
+to Bin and fill the projection with an empty version, which any posting overrides.
+"""
+
+import frappe
+from frappe import _
+from frappe.utils import flt
+
+from inventory_management.inventory_management.master_cache import get_warehouses
+
+PROJECTION_KEY = "inventory_management:stock_projection"
+CHECK_CHUNK_SIZE = 500
+
+SET_IF_NEWER = """
+for i = 1, #ARGV, 3 do
+    local current = redis.call('HGET', KEYS[1], ARGV[i] .. '|v')
+    if not current or current < ARGV[i + 2] then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1], ARGV[i] .. '|v', ARGV[i + 2])
+    end
+end
+"""
+
+
+@frappe.whitelist()
+def get_available_qty(items, warehouses):
+    """Return ``{item_code: {warehouse: qty}}``; a group warehouse returns the total of the warehouses under it."""
+    frappe.has_permission("Bin", "read", throw=True)
+    items, warehouses = as_list(items), as_list(warehouses)
+
+    details = get_warehouses(warehouses)
+    leaves = {
+        warehouse: details[warehouse].leaves if details[warehouse].is_group else [warehouse]
+        for warehouse in warehouses
+        if warehouse in details
+    }
+    leaf_warehouses = sorted({leaf for warehouse_leaves in leaves.values() for leaf in warehouse_leaves})
+
+    quantities = read_projection(items, leaf_warehouses)
+    return {
+        item_code: {
+            warehouse: sum(quantities[(item_code, leaf)] for leaf in leaves.get(warehouse, []))
+            for warehouse in warehouses
+        }
+        for item_code in items
+    }
+
+
+def as_list(value):
+    # accepts a single name, a JSON list or a list
+    if isinstance(value, str):
+        value = frappe.parse_json(value) if value.startswith("[") else [value]
+    return list(value or [])
+
+
+def read_projection(items, warehouses):
+    """Return ``{(item_code, warehouse): qty}`` from Redis, reading the missing keys from Bin."""
+    if not items or not warehouses:
+        return {}
+
+    pipeline = frappe.cache.pipeline()
+    for item_code in items:
+        pipeline.hmget(get_projection_key(item_code), warehouses)
+
+    quantities, missing = {}, []
+    for item_code, values in zip(items, pipeline.execute()):
+        for warehouse, value in zip(warehouses, values):
+            if value is None:
+                missing.append((item_code, warehouse))
+            else:
+                quantities[(item_code, warehouse)] = flt(frappe.safe_decode(value))
+
+    if missing:
+        from_bins = get_bin_quantities(missing)
+        for key in missing:
+            quantities[key] = from_bins.get(key, 0.0)
+        # an empty version never overrides a quantity written by a posting
+        write_projection({key: (quantities[key], "") for key in missing})
+
+    return quantities
+
+
+def get_bin_quantities(keys):
+    return {
+        (item_code, warehouse): flt(actual_qty)
+        for item_code, warehouse, actual_qty in frappe.db.sql(
+            """
+            select item_code, warehouse, actual_qty from `tabBin`
+            where (item_code, warehouse) in ({keys})
+            """.format(keys=", ".join(["(%s, %s)"] * len(keys))),
+            [value for key in keys for value in key],
+        )
+    }
+
+
+def update_projection_after_commit(bins, version):
+    """Queue the final quantities of a posting's bins for the projection once the posting commits."""
+    values = {(bin["item_code"], bin["warehouse"]): (bin["actual_qty"], version) for bin in bins}
+    frappe.db.after_commit.add(lambda: write_projection(values))
+
+
+def write_projection(values):
+    by_item = {}
+    for (item_code, warehouse), (qty, version) in values.items():
+        by_item.setdefault(item_code, []).extend((warehouse, repr(flt(qty)), version))
+
+    set_if_newer = frappe.cache.register_script(SET_IF_NEWER)
+    pipeline = frappe.cache.pipeline()
+    for item_code, args in by_item.items():
+        set_if_newer(keys=[get_projection_key(item_code)], args=args, client=pipeline)
+    pipeline.execute()
+
+
+def get_projection_key(item_code):
+    return frappe.cache.make_key(f"{PROJECTION_KEY}:{item_code}")
+
+
+def check_projection(fix=False):
+    """Compare every projected quantity with the ledger and return the differences.
+
+    With ``fix`` the differing entries are dropped, so the next read loads them from Bin.
+    """
+    differences = []
+    item_codes = frappe.db.sql_list("select distinct item_code from `tabBin` order by item_code")
+    for start in range(0, len(item_codes), CHECK_CHUNK_SIZE):
+        chunk = item_codes[start : start + CHECK_CHUNK_SIZE]
+        ledger = {
+            (item_code, warehouse): flt(qty)
+            for item_code, warehouse, qty in frappe.db.sql(
+                """
+                select item_code, warehouse, sum(actual_qty)
+                from `tabStock Ledger Entry`
+                where item_code in ({items})
+                group by item_code, warehouse
+                """.format(items=", ".join(["%s"] * len(chunk))),
+                chunk,
+            )
+        }
+
+        pipeline = frappe.cache.pipeline()
+        for item_code in chunk:
+            pipeline.hgetall(get_projection_key(item_code))
+
+        for item_code, projected in zip(chunk, pipeline.execute()):
+            for field, value in projected.items():
+                warehouse = frappe.safe_decode(field)
+                if warehouse.endswith("|v"):
+                    continue
+                expected = ledger.get((item_code, warehouse), 0.0)
+                projected_qty = flt(frappe.safe_decode(value))
+                if flt(projected_qty, 6) != flt(expected, 6):
+                    differences.append(
+                        frappe._dict(
+                            item_code=item_code, warehouse=warehouse, projected_qty=projected_qty, ledger_qty=expected
+                        )
+                    )
+
+    if fix and differences:
+        pipeline = frappe.cache.pipeline()
+        for row in differences:
+            pipeline.hdel(get_projection_key(row.item_code), row.warehouse, f"{row.warehouse}|v")
+        pipeline.execute()
+
+    return differences
+
+
+@frappe.whitelist()
+def get_projection_differences():
+    frappe.only_for("System Manager")
+    differences = check_projection()
+    if not differences:
+        frappe.msgprint(_("The stock projection matches the ledger."))
+    return differences
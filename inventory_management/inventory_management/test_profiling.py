@@ -0,0 +1,83 @@
+# Copyright (c) 2024, Poorvi Solutions and Contributors
+# See license.txt
+
+import logging
+import os
+import tempfile
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import today
+
+from inventory_management.inventory_management.profiling import (
+	get_profile_log_path,
+	get_profile_summary,
+	read_profiles,
+)
+
+TEST_WAREHOUSE = "_Test Profiling Warehouse"
+
+
+class TestProfiling(FrappeTestCase):
+	def setUp(self):
+		# profiles go to a file of the test's own, never into the site's log
+		log_dir = tempfile.TemporaryDirectory()
+		self.addCleanup(log_dir.cleanup)
+		self.set_conf("stock_profile_log", os.path.join(log_dir.name, "stock_profile.jsonl"))
+		self.addCleanup(close_profile_logger)
+		self.set_conf("stock_profile_sample_rate", 1)
+
+		if not frappe.db.exists("Warehouse", TEST_WAREHOUSE):
+			frappe.get_doc({"doctype": "Warehouse", "warehouse_name": TEST_WAREHOUSE}).insert()
+		self.item_code = f"_Test Profiling Item {frappe.generate_hash(length=6)}"
+		frappe.get_doc({"doctype": "Item", "item_code": self.item_code, "item_name": self.item_code}).insert()
+
+	def set_conf(self, key, value):
+		self.addCleanup(frappe.conf.pop, key, None)
+		frappe.conf[key] = value
+
+	def test_sampled_submit_is_profiled(self):
+		timed = self.make_receipt()
+		self.set_conf("stock_profile_memory_sample_rate", 1)
+		traced = self.make_receipt()
+
+		profiles = {
+			profile["document"]: profile
+			for profile in read_profiles()
+			if profile["operation"] == "Stock Entry.on_submit"
+		}
+		self.assertEqual(set(profiles), {timed.name, traced.name})
+		for profile in profiles.values():
+			self.assertEqual(profile["rows"], 3)
+			self.assertGreater(profile["queries"], 0)
+			self.assertFalse(profile["failed"])
+		self.assertFalse(profiles[timed.name]["traced"])
+		self.assertIsNone(profiles[timed.name]["peak_memory"])
+		self.assertTrue(profiles[traced.name]["traced"])
+		self.assertGreater(profiles[traced.name]["peak_memory"], 0)
+
+		# the traced call only counts for memory, its timing is left out
+		summary = get_profile_summary("Stock Entry.on_submit")["Stock Entry.on_submit"]
+		self.assertEqual(summary["calls"], 1)
+		self.assertEqual(summary["p50"], profiles[timed.name]["seconds"])
+		self.assertEqual([call["document"] for call in summary["slowest"]], [timed.name])
+		self.assertEqual(summary["traced_calls"], 1)
+		self.assertEqual(summary["peak_memory"], profiles[traced.name]["peak_memory"])
+
+	def make_receipt(self):
+		return frappe.get_doc({
+			"doctype": "Stock Entry",
+			"stock_entry_type": "Receive",
+			"posting_date": today(),
+			"stock_entry_details": [
+				{"item_code": self.item_code, "to_warehouse": TEST_WAREHOUSE, "quantity": qty, "item_price": 10}
+				for qty in (1, 2, 3)
+			],
+		}).submit()
+
+
+def close_profile_logger():
+	logger = logging.getLogger(f"inventory_management.inventory_management.profiling.{get_profile_log_path()}")
+	for handler in list(logger.handlers):
+		logger.removeHandler(handler)
+		handler.close()
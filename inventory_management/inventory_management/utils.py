@@ -0,0 +1,36 @@
+import frappe
+from frappe.utils import now
+
+
+def bulk_update_by_name(doctype, updates, chunk_size=500, update_modified=True):
+    """Write ``{name: {field: value}}`` with one ``UPDATE ... CASE`` statement per field set and chunk."""
+    if not updates:
+        return
+
+    names = list(updates)
+    fields = sorted({field for values in updates.values() for field in values})
+    timestamp = now()
+
+    for start in range(0, len(names), chunk_size):
+        chunk = names[start : start + chunk_size]
+        assignments, values = [], []
+        for field in fields:
+            cases = []
+            for name in chunk:
+                if field in updates[name]:
+                    cases.append("when %s then %s")
+                    values.extend((name, updates[name][field]))
+            if cases:
+                assignments.append(f"`{field}` = case name {' '.join(cases)} else `{field}` end")
+        if update_modified:
+            assignments.append("modified = %s")
+            values.append(timestamp)
+
+        frappe.db.sql(
+            """update `tab{doctype}` set {assignments} where name in ({names})""".format(
+                doctype=doctype,
+                assignments=", ".join(assignments),
+                names=", ".join(["%s"] * len(chunk)),
+            ),
+            values + chunk,
+        )
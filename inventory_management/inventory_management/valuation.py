@@ -0,0 +1,210 @@
+"""FIFO valuation of bins, next to the default moving average of the posting engine.
+
+A FIFO bin keeps its stock as layers of (qty, rate), oldest first, stored on
+``Bin.fifo_queue`` as one base64 encoded ``array('d')`` of alternating qty and rate.
+Outgoing stock is taken from the oldest layers, so a movement only touches the layers it
+consumes, and the stock value of a FIFO bin is always the value of its layers. The method
+of an item comes from its Item Group.
+"""
+
+import base64
+from array import array
+
+import frappe
+from frappe.utils import flt
+
+from inventory_management.inventory_management.master_cache import get_items
+
+MOVING_AVERAGE = "Moving Average"
+FIFO = "FIFO"
+
+
+def get_valuation_methods(item_codes):
+    items = get_items(item_codes)
+    return {
+        item_code: get_item_group_method(items[item_code].item_group) if item_code in items else MOVING_AVERAGE
+        for item_code in item_codes
+    }
+
+
+def get_item_group_method(item_group):
+    if not item_group:
+        return MOVING_AVERAGE
+    return frappe.get_cached_value("Item Group", item_group, "valuation_method") or MOVING_AVERAGE
+
+
+class FifoQueue:
+    """Stock layers of one bin, oldest first, with outgoing stock taken from the front.
+
+    Consumed layers are skipped by moving ``head`` and only cut off once they make up half
+    of the array. When more goes out than there is, the queue keeps a single negative
+    layer, which the next receipt settles first.
+    """
+
+    def __init__(self, layers=()):
+        self.layers = array("d", layers)
+        self.head = 0
+
+    @classmethod
+    def loads(cls, data):
+        queue = cls()
+        if data:
+            queue.layers.frombytes(base64.b64decode(data))
+        return queue
+
+    def dumps(self):
+        return base64.b64encode(self.layers[self.head :].tobytes()).decode()
+
+    def __len__(self):
+        return (len(self.layers) - self.head) // 2
+
+    def get_qty(self):
+        return sum(self.layers[self.head :: 2])
+
+    def get_value(self):
+        layers = self.layers
+        return sum(layers[idx] * layers[idx + 1] for idx in range(self.head, len(layers), 2))
+
+    def is_negative(self):
+        return len(self) and self.layers[self.head] < 0
+
+    def add(self, qty, rate):
+        """Receive ``qty`` at ``rate`` and return the value added to the stock."""
+        layers, value = self.layers, 0.0
+        if self.is_negative():
+            # the receipt first pays back the stock that went out at the negative layer's rate
+            shortage, shortage_rate = -layers[self.head], layers[self.head + 1]
+            settled = min(shortage, qty)
+            value += settled * shortage_rate
+            qty -= settled
+            if flt(shortage - settled, 9) > 0:
+                layers[self.head] = settled - shortage
+                return value
+            self.head += 2
+
+        if flt(qty, 9) > 0:
+            if len(self) and layers[-1] == rate:
+                layers[-2] += qty
+            else:
+                layers.extend((qty, rate))
+            value += qty * rate
+
+        self.compact()
+        return value
+
+    def remove(self, qty, fallback_rate=0.0):
+        """Take ``qty`` from the oldest layers and return its value."""
+        layers, value, rate = self.layers, 0.0, fallback_rate
+        while flt(qty, 9) > 0 and self.head < len(layers) and layers[self.head] > 0:
+            layer_qty, rate = layers[self.head], layers[self.head + 1]
+            if flt(layer_qty - qty, 9) > 0:
+                layers[self.head] = layer_qty - qty
+                value += qty * rate
+                qty = 0.0
+            else:
+                value += layer_qty * rate
+                qty -= layer_qty
+                self.head += 2
+
+        if flt(qty, 9) > 0:
+            # out of stock: what is still missing goes out at the last known rate
+            if self.is_negative():
+                rate = layers[self.head + 1]
+                layers[self.head] -= qty
+            else:
+                layers.extend((-qty, rate))
+            value += qty * rate
+
+        self.compact()
+        return value
+
+    def put_back(self, qty, value):
+        """Return stock that went out, as the oldest layer, at the exact value it left with."""
+        if self.is_negative():
+            return self.add(qty, value / qty)
+
+        layer = (qty, value / qty)
+        if self.head >= 2:
+            self.head -= 2
+            self.layers[self.head : self.head + 2] = array("d", layer)
+        else:
+            self.layers[self.head : self.head] = array("d", layer)
+        return value
+
+    def take_back(self, qty, fallback_rate=0.0, value=None):
+        """Undo a receipt by taking ``qty`` from the newest layers, returning the value taken.
+
+        With ``value`` exactly that much is taken: what the layers gave up beyond (or short
+        of) it is left on the newest remaining layers, so the queue stays worth the bin.
+        """
+        target, value = value, self.take_back_layers(qty, fallback_rate)
+        if target is None or not flt(value - target, 9):
+            return value
+        self.revalue_newest(qty, value - target)
+        return target
+
+    def take_back_layers(self, qty, fallback_rate):
+        layers, value = self.layers, 0.0
+        while flt(qty, 9) > 0 and len(self) and layers[-2] > 0:
+            layer_qty, rate = layers[-2], layers[-1]
+            if flt(layer_qty - qty, 9) > 0:
+                layers[-2] = layer_qty - qty
+                value += qty * rate
+                qty = 0.0
+            else:
+                value += layer_qty * rate
+                qty -= layer_qty
+                del layers[-2:]
+
+        if flt(qty, 9) > 0:
+            value += self.remove(qty, fallback_rate)
+        return value
+
+    def revalue_newest(self, qty, difference):
+        """Add ``difference`` to the value of the newest layers that hold ``qty``, at one rate per unit."""
+        layers, start, covered = self.layers, len(self.layers), 0.0
+        while start > self.head and abs(covered) < qty:
+            start -= 2
+            covered += layers[start]
+        if not flt(covered, 9):
+            return
+        for idx in range(start, len(layers), 2):
+            layers[idx + 1] += difference / covered
+
+    def compact(self):
+        if self.head and self.head * 2 >= len(self.layers):
+            del self.layers[: self.head]
+            self.head = 0
+
+
+def get_fifo_queue(bin):
+    """Load the queue of a bin, starting it from the bin's balance when it does not match the stock."""
+    queue = FifoQueue.loads(bin.get("fifo_queue"))
+    if flt(queue.get_qty() - bin["actual_qty"], 6) != 0:
+        # the item group was switched to FIFO (or back and forth) while the bin held stock
+        queue = FifoQueue()
+        if flt(bin["actual_qty"], 9):
+            queue.layers.extend((bin["actual_qty"], bin["valuation_rate"]))
+    return queue
+
+
+def update_fifo_valuation(bin, queue, qty, rate, value_difference=None):
+    """Apply one movement to a FIFO bin; ``value_difference`` marks the reversal of an earlier one."""
+    if value_difference is not None:
+        if qty > 0:
+            bin["stock_value"] += queue.put_back(qty, value_difference)
+        else:
+            bin["stock_value"] -= queue.take_back(-qty, bin["valuation_rate"] or rate, -value_difference)
+    elif qty > 0:
+        bin["stock_value"] += queue.add(qty, rate)
+    elif qty < 0:
+        bin["stock_value"] -= queue.remove(-qty, bin["valuation_rate"] or rate)
+
+    bin["actual_qty"] += qty
+    if not len(queue):
+        bin["stock_value"] = 0.0
+    if flt(bin["actual_qty"], 9) > 0:
+        bin["valuation_rate"] = bin["stock_value"] / bin["actual_qty"]
+    elif len(queue):
+        bin["valuation_rate"] = queue.layers[-1]
+    return bin
@@ -0,0 +1,30 @@
+import frappe
+
+QUANTITY_COLUMNS = (
+    ("Stock Ledger Entry", "quantity"),
+    ("Stock Entry Details", "quantity"),
+)
+
+
+def execute():
+    # `quantity` used to be a Data (varchar) field. Normalise the stored strings before the
+    # model sync alters the column to decimal, so that the conversion cannot fail or truncate.
+    for doctype, fieldname in QUANTITY_COLUMNS:
+        if frappe.db.get_column_type(doctype, fieldname).lower().startswith("decimal"):
+            continue
+
+        table = f"`tab{doctype}`"
+        frappe.db.sql(
+            f"""
+            update {table}
+            set `{fieldname}` = nullif(replace(trim(`{fieldname}`), ',', ''), '')
+            """
+        )
+        frappe.db.sql(
+            f"""
+            update {table}
+            set `{fieldname}` = '0'
+            where `{fieldname}` is null
+                or `{fieldname}` not regexp '^[-+]?([0-9]+[.]?[0-9]*|[.][0-9]+)([eE][-+]?[0-9]+)?$'
+            """
+        )
@@ -0,0 +1,27 @@
+import frappe
+
+from inventory_management.inventory_management.doctype.bin.bin import rebuild_bins
+
+
+def execute():
+    # Before this patch each (item, warehouse) had a single ledger row holding the running
+    # balance in `quantity`. Keep those rows as the opening movement of their key.
+    frappe.db.sql(
+        """
+        update `tabStock Ledger Entry` sle
+        set
+            sle.actual_qty = cast(sle.quantity as decimal(21, 9)),
+            sle.qty_after_transaction = cast(sle.quantity as decimal(21, 9)),
+            sle.valuation_rate = sle.rate,
+            sle.stock_value = cast(sle.quantity as decimal(21, 9)) * sle.rate,
+            sle.stock_value_difference = cast(sle.quantity as decimal(21, 9)) * sle.rate,
+            sle.voucher_type = if(
+                exists(select name from `tabStock Reconciliation` sr where sr.name = sle.voucher_number),
+                'Stock Reconciliation',
+                'Stock Entry'
+            )
+        where ifnull(sle.voucher_type, '') = ''
+        """
+    )
+
+    rebuild_bins()
@@ -0,0 +1,5 @@
+from inventory_management.inventory_management.doctype.bin.bin import rebuild_item_stock
+
+
+def execute():
+    rebuild_item_stock()
@@ -0,0 +1,5 @@
+from inventory_management.inventory_management.doctype.warehouse.warehouse import rebuild_warehouse_tree
+
+
+def execute():
+    rebuild_warehouse_tree()
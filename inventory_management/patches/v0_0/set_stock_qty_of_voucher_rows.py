@@ -0,0 +1,13 @@
+import frappe
+
+
+def execute():
+    # rows of existing vouchers were posted as entered, which is one stock unit per unit
+    for doctype in ("Stock Entry Details", "Stock Reconciliation Details"):
+        frappe.db.sql(
+            f"""
+            update `tab{doctype}`
+            set conversion_factor = 1, stock_qty = quantity
+            where ifnull(stock_qty, 0) = 0
+            """
+        )